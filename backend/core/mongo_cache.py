@@ -0,0 +1,286 @@
+"""
+MongoDB Django Cache Backend
+============================
+
+Django cache stored in a collection of the MongoDB that mongoengine is
+already connected to, so every gunicorn worker on every node shares one
+cache without running Redis.
+
+    CACHES = {
+        'default': {
+            'BACKEND': 'core.mongo_cache.MongoCache',
+            'LOCATION': 'django_cache',  # collection name
+            'OPTIONS': {'OPERATION_TIMEOUT': 0.25, 'RETRY_AFTER': 10},
+        }
+    }
+
+Documents are ``{_id: key, v: value, exp: datetime | None}``. A TTL index
+on ``exp`` lets MongoDB purge expired entries; reads also filter on
+``exp`` because the TTL monitor only runs once a minute. Integers are
+stored natively so ``incr`` is a single atomic ``$inc``; everything else
+is pickled and zlib-compressed when large. Like django-redis, ``keys`` and
+``delete_pattern`` take glob patterns.
+"""
+import fnmatch
+import logging
+import pickle
+import re
+import threading
+import time
+import zlib
+from datetime import datetime, timezone
+
+import pymongo
+from bson.binary import Binary
+from django.core.cache.backends.base import DEFAULT_TIMEOUT, BaseCache
+from mongoengine.connection import get_db
+from pymongo import ReplaceOne
+from pymongo.errors import DuplicateKeyError, PyMongoError
+
+
+logger = logging.getLogger(__name__)
+
+# One-byte tag in front of binary values
+PICKLED = b'p'
+COMPRESSED = b'z'
+
+INT64_MIN, INT64_MAX = -2 ** 63, 2 ** 63 - 1
+
+
+class CacheUnavailable(Exception):
+    """MongoDB failed or the backend is backing off after a failure"""
+
+
+class MongoCache(BaseCache):
+    def __init__(self, collection, params):
+        super().__init__(params)
+        options = params.get('OPTIONS', {})
+        self._collection_name = collection or 'django_cache'
+        self._db_alias = options.get('DB_ALIAS', 'default')
+        self._operation_timeout = options.get('OPERATION_TIMEOUT', 0.25)
+        self._retry_after = options.get('RETRY_AFTER', 10)
+        self._compress_min = options.get('COMPRESS_MIN_LENGTH', 1024)
+        self._indexed = False
+        self._retry_at = 0
+        self._lock = threading.Lock()
+
+    @property
+    def _collection(self):
+        collection = get_db(self._db_alias)[self._collection_name]
+        if not self._indexed:
+            collection.create_index('exp', expireAfterSeconds=0)
+            self._indexed = True
+        return collection
+
+    def _run(self, operation):
+        """Run ``operation(collection)`` under the timeout; raises CacheUnavailable"""
+        if time.monotonic() < self._retry_at:
+            raise CacheUnavailable(self._collection_name)
+        try:
+            with pymongo.timeout(self._operation_timeout):
+                return operation(self._collection)
+        except DuplicateKeyError:
+            raise
+        except PyMongoError as e:
+            with self._lock:
+                self._retry_at = time.monotonic() + self._retry_after
+            logger.warning(f"Mongo cache unavailable: {e}")
+            raise CacheUnavailable(self._collection_name) from e
+
+    # Values
+
+    def _encode(self, value):
+        if type(value) is int and INT64_MIN <= value <= INT64_MAX:
+            return value
+        data = pickle.dumps(value, pickle.HIGHEST_PROTOCOL)
+        if len(data) >= self._compress_min:
+            compressed = zlib.compress(data, 1)
+            if len(compressed) < len(data):
+                return Binary(COMPRESSED + compressed)
+        return Binary(PICKLED + data)
+
+    @staticmethod
+    def _decode(stored):
+        if isinstance(stored, int):
+            return stored
+        stored = bytes(stored)
+        if stored[:1] == COMPRESSED:
+            return pickle.loads(zlib.decompress(stored[1:]))
+        return pickle.loads(stored[1:])
+
+    # Keys and expiry
+
+    def _key(self, key, version=None):
+        key = self.make_key(key, version=version)
+        self.validate_key(key)
+        return key
+
+    def _expiry(self, timeout=DEFAULT_TIMEOUT):
+        """Expiry datetime for ``timeout``, or None to keep the entry forever"""
+        expires_at = self.get_backend_timeout(timeout)
+        if expires_at is None:
+            return None
+        return datetime.fromtimestamp(expires_at, timezone.utc)
+
+    @staticmethod
+    def _live(key_filter):
+        return {**key_filter, '$or': [{'exp': None}, {'exp': {'$gt': datetime.now(timezone.utc)}}]}
+
+    # Cache API
+
+    def add(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        key = self._key(key, version)
+        exp = self._expiry(timeout)
+        now = datetime.now(timezone.utc)
+        try:
+            # Only replaces an entry that has already expired
+            self._run(lambda c: c.update_one(
+                {'_id': key, 'exp': {'$lte': now}},
+                {'$set': {'v': self._encode(value), 'exp': exp}},
+                upsert=True,
+            ))
+        except (DuplicateKeyError, CacheUnavailable):
+            return False
+        return True
+
+    def get(self, key, default=None, version=None):
+        key = self._key(key, version)
+        try:
+            doc = self._run(lambda c: c.find_one(self._live({'_id': key}), {'v': 1}))
+        except CacheUnavailable:
+            return default
+        if doc is None:
+            return default
+        return self._decode(doc['v'])
+
+    def set(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        key = self._key(key, version)
+        exp = self._expiry(timeout)
+        try:
+            if exp is not None and exp <= datetime.now(timezone.utc):
+                self._run(lambda c: c.delete_one({'_id': key}))
+            else:
+                self._run(lambda c: c.replace_one({'_id': key}, {'v': self._encode(value), 'exp': exp}, upsert=True))
+        except CacheUnavailable:
+            pass
+
+    def touch(self, key, timeout=DEFAULT_TIMEOUT, version=None):
+        key = self._key(key, version)
+        try:
+            result = self._run(lambda c: c.update_one(self._live({'_id': key}), {'$set': {'exp': self._expiry(timeout)}}))
+        except CacheUnavailable:
+            return False
+        return result.matched_count == 1
+
+    def delete(self, key, version=None):
+        key = self._key(key, version)
+        try:
+            return self._run(lambda c: c.delete_one({'_id': key})).deleted_count == 1
+        except CacheUnavailable:
+            return False
+
+    def has_key(self, key, version=None):
+        key = self._key(key, version)
+        try:
+            return self._run(lambda c: c.count_documents(self._live({'_id': key}), limit=1)) == 1
+        except CacheUnavailable:
+            return False
+
+    def incr(self, key, delta=1, version=None):
+        """
+        Atomic for integer values; raises ValueError for a missing key, and
+        while MongoDB is unavailable, when every key reads as missing.
+        """
+        key = self._key(key, version)
+        try:
+            return self._incr(key, delta)
+        except CacheUnavailable as e:
+            raise ValueError(f"Key '{key}' not found") from e
+
+    def _incr(self, key, delta):
+        doc = self._run(lambda c: c.find_one_and_update(
+            self._live({'_id': key, 'v': {'$type': 'number'}}),
+            {'$inc': {'v': delta}},
+            projection={'v': 1},
+            return_document=pymongo.ReturnDocument.AFTER,
+        ))
+        if doc is not None:
+            return doc['v']
+        # Not stored as a number: read-modify-write, like BaseCache.incr
+        doc = self._run(lambda c: c.find_one(self._live({'_id': key}), {'v': 1}))
+        if doc is None:
+            raise ValueError(f"Key '{key}' not found")
+        new_value = self._decode(doc['v']) + delta
+        self._run(lambda c: c.update_one({'_id': key}, {'$set': {'v': self._encode(new_value)}}))
+        return new_value
+
+    def get_many(self, keys, version=None):
+        key_map = {self._key(key, version): key for key in keys}
+        if not key_map:
+            return {}
+        try:
+            docs = self._run(lambda c: list(c.find(self._live({'_id': {'$in': list(key_map)}}), {'v': 1})))
+        except CacheUnavailable:
+            return {}
+        return {key_map[doc['_id']]: self._decode(doc['v']) for doc in docs}
+
+    def set_many(self, data, timeout=DEFAULT_TIMEOUT, version=None):
+        """One unordered bulk write; returns the keys that failed to insert"""
+        if not data:
+            return []
+        exp = self._expiry(timeout)
+        requests = [
+            ReplaceOne({'_id': self._key(key, version)}, {'v': self._encode(value), 'exp': exp}, upsert=True)
+            for key, value in data.items()
+        ]
+        try:
+            self._run(lambda c: c.bulk_write(requests, ordered=False))
+        except CacheUnavailable:
+            return list(data)
+        return []
+
+    def delete_many(self, keys, version=None):
+        keys = [self._key(key, version) for key in keys]
+        if keys:
+            try:
+                self._run(lambda c: c.delete_many({'_id': {'$in': keys}}))
+            except CacheUnavailable:
+                pass
+
+    def clear(self):
+        try:
+            self._run(lambda c: c.delete_many({}))
+        except CacheUnavailable:
+            pass
+
+    # Patterns and introspection
+
+    def _pattern_filter(self, pattern, version=None):
+        prefix = self.make_key('', version=version)
+        # Anchored on the literal prefix, so MongoDB can use the _id index
+        return prefix, {'_id': {'$regex': '^' + re.escape(prefix) + fnmatch.translate(pattern)}}
+
+    def keys(self, pattern, version=None):
+        """Unexpired keys matching the glob ``pattern``"""
+        prefix, key_filter = self._pattern_filter(pattern, version)
+        try:
+            docs = self._run(lambda c: list(c.find(self._live(key_filter), {'_id': 1})))
+        except CacheUnavailable:
+            return []
+        return [doc['_id'][len(prefix):] for doc in docs]
+
+    def delete_pattern(self, pattern, version=None):
+        """Delete keys matching the glob ``pattern``; returns how many"""
+        _, key_filter = self._pattern_filter(pattern, version)
+        try:
+            return self._run(lambda c: c.delete_many(key_filter)).deleted_count
+        except CacheUnavailable:
+            return 0
+
+    def get_stats(self):
+        """Document count and data size of the collection"""
+        try:
+            stats = self._run(lambda c: c.database.command('collStats', c.name))
+        except CacheUnavailable:
+            return None
+        return {'collection': self._collection_name, 'entries': stats.get('count'), 'bytes': stats.get('size')}
@@ -1,4 +1,105 @@
-from django.test import TestCase
+import unittest
+from datetime import datetime, timedelta, timezone
+from unittest import mock
 
-# Create your tests here.
+import mongoengine
+from django.test import SimpleTestCase
+from pymongo.errors import ServerSelectionTimeoutError
 
+from .mongo_cache import MongoCache
+
+try:
+    import mongomock
+except ImportError:  # Optional, only these tests use it
+    mongomock = None
+
+
+@unittest.skipUnless(mongomock, 'mongomock is not installed')
+class MongoCacheTests(SimpleTestCase):
+    alias = 'mongo-cache-tests'
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        mongoengine.connect('mongo_cache_tests', alias=cls.alias, host='mongodb://localhost',
+                            mongo_client_class=mongomock.MongoClient)
+
+    @classmethod
+    def tearDownClass(cls):
+        mongoengine.disconnect(alias=cls.alias)
+        super().tearDownClass()
+
+    def setUp(self):
+        self.cache = MongoCache('django_cache', {'OPTIONS': {'DB_ALIAS': self.alias}})
+        self.cache._collection.delete_many({})
+
+    def expire(self, key):
+        past = datetime.now(timezone.utc) - timedelta(seconds=1)
+        self.cache._collection.update_one({'_id': self.cache.make_key(key)}, {'$set': {'exp': past}})
+
+    def test_add_keeps_an_existing_key(self):
+        self.assertTrue(self.cache.add('key', 'first'))
+        self.assertFalse(self.cache.add('key', 'second'))
+        self.assertEqual(self.cache.get('key'), 'first')
+
+    def test_add_replaces_an_expired_key(self):
+        self.cache.set('key', 'old')
+        self.expire('key')
+
+        self.assertIsNone(self.cache.get('key'))
+        self.assertTrue(self.cache.add('key', 'new'))
+        self.assertEqual(self.cache.get('key'), 'new')
+
+    def test_incr_integer(self):
+        self.cache.set('count', 1)
+
+        self.assertEqual(self.cache.incr('count', 5), 6)
+        self.assertEqual(self.cache.decr('count'), 5)
+        self.assertEqual(self.cache.get('count'), 5)
+
+    def test_incr_pickled_number(self):
+        self.cache.set('ratio', 1.5)
+
+        self.assertEqual(self.cache.incr('ratio'), 2.5)
+        self.assertEqual(self.cache.get('ratio'), 2.5)
+
+    def test_incr_missing_or_expired_key_raises(self):
+        with self.assertRaises(ValueError):
+            self.cache.incr('missing')
+        self.cache.set('count', 1)
+        self.expire('count')
+        with self.assertRaises(ValueError):
+            self.cache.incr('count')
+
+    def test_incr_while_unavailable_raises_value_error(self):
+        self.cache.set('count', 1)
+        failure = ServerSelectionTimeoutError('no servers')
+        with mock.patch.object(mongomock.collection.Collection, 'find_one_and_update', side_effect=failure), \
+                self.assertLogs('core.mongo_cache', 'WARNING'):
+            with self.assertRaises(ValueError):
+                self.cache.incr('count')
+
+        # Backing off: reads miss and incr still raises ValueError, not CacheUnavailable
+        self.assertIsNone(self.cache.get('count'))
+        with self.assertRaises(ValueError):
+            self.cache.incr('count')
+
+    def test_zero_timeout_deletes(self):
+        self.cache.set('key', 'value')
+        self.cache.set('key', 'value', timeout=0)
+
+        self.assertFalse(self.cache.has_key('key'))
+        self.assertEqual(self.cache._collection.count_documents({}), 0)
+
+    def test_none_timeout_never_expires(self):
+        self.cache.set('key', 'value', timeout=None)
+
+        self.assertIsNone(self.cache._collection.find_one({})['exp'])
+        self.assertEqual(self.cache.get('key'), 'value')
+
+    def test_large_values_round_trip_compressed(self):
+        value = {'results': [f'movie {i}' for i in range(500)]}
+        self.cache.set('key', value)
+
+        self.assertEqual(bytes(self.cache._collection.find_one({})['v'])[:1], b'z')
+        self.assertEqual(self.cache.get('key'), value)
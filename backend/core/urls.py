@@ -9,5 +9,14 @@ urlpatterns = [
     # Configuration endpoints
     path('config/', views.ConfigView.as_view(), name='config'),
     path('tmdb-config/', views.TMDBConfigView.as_view(), name='tmdb_config'),
+    path('tmdb-stats/', views.TMDBStatsView.as_view(), name='tmdb_stats'),
+    
+    # TMDB cache administration (staff only)
+    path('tmdb-cache/stats/', views.TMDBCacheStatsView.as_view(), name='tmdb_cache_stats'),
+    path('tmdb-cache/keys/', views.TMDBCacheKeysView.as_view(), name='tmdb_cache_keys'),
+    path('tmdb-cache/purge/', views.TMDBCachePurgeView.as_view(), name='tmdb_cache_purge'),
+    
+    # Internal node-to-node endpoints
+    path('peer-cache/', views.PeerCacheView.as_view(), name='peer_cache'),
 ]
 
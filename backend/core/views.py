@@ -1,7 +1,13 @@
 from rest_framework.views import APIView
 from rest_framework.response import Response
-from rest_framework.permissions import AllowAny
+from rest_framework.permissions import AllowAny, IsAdminUser
+from rest_framework import status
 from django.conf import settings
+from django.http import HttpResponse
+from movies.middleware import response_cache
+from movies.peer_cache import TOKEN_HEADER
+from movies.tmdb_service import tmdb_service
+import json
 import os
 
 
@@ -44,3 +50,85 @@ class TMDBConfigView(APIView):
             'image_base_url': 'https://image.tmdb.org/t/p/',
             'configured': bool(settings.TMDB_API_KEY)
         })
+
+class TMDBStatsView(APIView):
+    permission_classes = [IsAdminUser]
+    
+    def get(self, request):
+        return Response({**tmdb_service.get_stats(), 'response_cache': response_cache.get_stats()})
+
+class TMDBCacheStatsView(APIView):
+    """Hits, misses and evictions per endpoint family and memory per tier, over all workers"""
+    permission_classes = [IsAdminUser]
+    
+    def get(self, request):
+        if tmdb_service.cache_admin is None:
+            return Response({'error': 'TMDB cache is disabled'}, status=status.HTTP_404_NOT_FOUND)
+        return Response(tmdb_service.cache_admin.cluster_stats())
+
+class TMDBCacheKeysView(APIView):
+    """Cached keys starting with ?prefix= (or matching the glob ?pattern=)"""
+    permission_classes = [IsAdminUser]
+    
+    def get(self, request):
+        if tmdb_service.cache is None:
+            return Response({'error': 'TMDB cache is disabled'}, status=status.HTTP_404_NOT_FOUND)
+        pattern = request.GET.get('pattern') or f"{request.GET.get('prefix', '')}*"
+        try:
+            limit = min(int(request.GET.get('limit', 200)), 1000)
+        except ValueError:
+            return Response({'error': 'limit must be a number'}, status=status.HTTP_400_BAD_REQUEST)
+        
+        keys = {}
+        for key, tier, fresh_until in tmdb_service.cache.keys(pattern):
+            item = keys.setdefault(key, {'key': key, 'tiers': [], 'fresh_until': None})
+            item['tiers'].append(tier)
+            if fresh_until is not None:
+                item['fresh_until'] = max(item['fresh_until'] or 0, fresh_until)
+        items = sorted(keys.values(), key=lambda item: item['key'])
+        return Response({
+            'pattern': pattern,
+            'count': len(items),
+            'keys': items[:limit],
+        })
+
+class TMDBCachePurgeView(APIView):
+    """Delete cached keys matching a glob, e.g. {"pattern": "movie/550*"}, on every worker"""
+    permission_classes = [IsAdminUser]
+    
+    def post(self, request):
+        if tmdb_service.cache_admin is None:
+            return Response({'error': 'TMDB cache is disabled'}, status=status.HTTP_404_NOT_FOUND)
+        pattern = str(request.data.get('pattern') or '').strip()
+        if not pattern:
+            return Response({'error': 'pattern is required'}, status=status.HTTP_400_BAD_REQUEST)
+        result = tmdb_service.cache_admin.purge(pattern, requested_by=str(request.user))
+        return Response({'pattern': pattern, **result})
+
+class PeerCacheView(APIView):
+    """Internal: serves this node's TMDB cache entries to the other backend nodes"""
+    authentication_classes = []
+    permission_classes = [AllowAny]  # Checked against TMDB_PEER_SECRET instead
+    
+    def get(self, request):
+        peers = tmdb_service.peers
+        if peers is None:
+            return Response({'error': 'Peer cache is disabled'}, status=status.HTTP_404_NOT_FOUND)
+        if not peers.check_token(request.headers.get(TOKEN_HEADER)):
+            return Response({'error': 'Invalid peer token'}, status=status.HTTP_403_FORBIDDEN)
+        
+        endpoint = request.GET.get('endpoint', '')
+        try:
+            params = json.loads(request.GET.get('params') or '{}')
+        except ValueError:
+            params = None
+        if not peers.valid_request(endpoint, params):
+            return Response({'error': 'Invalid endpoint or params'}, status=status.HTTP_400_BAD_REQUEST)
+        
+        entry = tmdb_service.get_for_peer(endpoint, params or None)
+        if entry is None:
+            return Response({'error': 'Failed to fetch data from TMDB'}, status=status.HTTP_503_SERVICE_UNAVAILABLE)
+        response = HttpResponse(entry.value, content_type='application/json')
+        response['X-Cache-Fresh-Until'] = repr(entry.fresh_until)
+        response['X-Cache-Expires-At'] = repr(entry.expires_at)
+        return response
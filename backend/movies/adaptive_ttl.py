@@ -0,0 +1,122 @@
+"""
+Adaptive TTLs
+Each body refreshed from TMDB is hashed and compared with the previous body
+for the same key: unchanged content stretches that key's TTL, changed
+content shrinks it, always within the family's bounds. Keys seen for the
+first time start from what their family has learned so far. Families
+without bounds (search, other) keep the fixed TTLs from movies/cache.py.
+"""
+import hashlib
+import math
+import threading
+from collections import OrderedDict
+
+from django.conf import settings
+
+from .cache import CHANGE_FEED_FAMILIES, DAY, HOUR, MINUTE, endpoint_family
+
+
+# (min, max) fresh seconds per family; settings.TMDB_ADAPTIVE_TTL_BOUNDS
+# overrides these, None keeps a family on its fixed TTL. The upper bounds on
+# lists keep a changed home page row from showing for long.
+DEFAULT_BOUNDS = {
+    'genres': (DAY, 14 * DAY),
+    'details': (HOUR, 2 * DAY),
+    'credits': (HOUR, 2 * DAY),
+    'videos': (HOUR, 2 * DAY),
+    'similar': (30 * MINUTE, 12 * HOUR),
+    'trending': (5 * MINUTE, HOUR),
+    'lists': (15 * MINUTE, 3 * HOUR),
+    'discover': (15 * MINUTE, 3 * HOUR),
+}
+
+GROW = 1.5
+SHRINK = 0.5
+# Weight of each observation in the family's starting TTL (moving average in log space)
+FAMILY_WEIGHT = 0.1
+
+
+class FamilyTTL:
+    """Bounds and learned starting TTL for one endpoint family"""
+
+    def __init__(self, base, low, high):
+        self.low = low
+        self.high = high
+        self.log_ttl = math.log(self.clamp(base))
+        self.changed = 0
+        self.unchanged = 0
+
+    def clamp(self, ttl):
+        return min(max(ttl, self.low), self.high)
+
+    @property
+    def ttl(self):
+        return self.clamp(math.exp(self.log_ttl))
+
+    def learn(self, ttl):
+        self.log_ttl += FAMILY_WEIGHT * (math.log(ttl) - self.log_ttl)
+
+
+class AdaptiveTTL:
+    """Per-key TTLs adjusted by how often TMDB content actually changes"""
+
+    def __init__(self, cache, bounds=None, max_keys=None):
+        limits = dict(DEFAULT_BOUNDS)
+        limits.update(bounds or getattr(settings, 'TMDB_ADAPTIVE_TTL_BOUNDS', {}))
+        if getattr(settings, 'TMDB_CHANGE_FEED_ENABLED', False):
+            # The change feed already invalidates these as soon as they change
+            for family in CHANGE_FEED_FAMILIES:
+                limits.pop(family, None)
+        self.cache = cache
+        self.families = {
+            family: FamilyTTL(cache.ttls.get(family, cache.ttls['other']), *bounds)
+            for family, bounds in limits.items() if bounds
+        }
+        self.max_keys = max_keys or getattr(settings, 'TMDB_ADAPTIVE_TTL_MAX_KEYS', 10000)
+        self._keys = OrderedDict()  # key -> (family, content hash, ttl)
+        self._lock = threading.Lock()
+
+    def ttl_for(self, key, endpoint, body):
+        """Fresh seconds for ``body``, just loaded from TMDB for ``key``"""
+        name = endpoint_family(endpoint)
+        family = self.families.get(name)
+        if family is None:
+            return self.cache.ttl_for(endpoint)
+        content_hash = hashlib.blake2b(body, digest_size=8).digest()
+        with self._lock:
+            previous = self._keys.pop(key, None)
+            if previous is None:
+                ttl = family.ttl
+            else:
+                _, previous_hash, ttl = previous
+                if previous_hash == content_hash:
+                    ttl *= GROW
+                    family.unchanged += 1
+                else:
+                    ttl *= SHRINK
+                    family.changed += 1
+                ttl = family.clamp(ttl)
+                family.learn(ttl)
+            self._keys[key] = (name, content_hash, ttl)
+            if len(self._keys) > self.max_keys:
+                self._keys.popitem(last=False)
+        return round(ttl)
+
+    def get_stats(self):
+        with self._lock:
+            key_ttls = {}
+            for name, _, ttl in self._keys.values():
+                key_ttls.setdefault(name, []).append(ttl)
+            return {
+                name: {
+                    'ttl': round(family.ttl),
+                    'default_ttl': self.cache.ttls.get(name, self.cache.ttls['other']),
+                    'bounds': [family.low, family.high],
+                    'keys': len(key_ttls.get(name, [])),
+                    'key_ttl_min': round(min(key_ttls[name])) if name in key_ttls else None,
+                    'key_ttl_max': round(max(key_ttls[name])) if name in key_ttls else None,
+                    'changed': family.changed,
+                    'unchanged': family.unchanged,
+                }
+                for name, family in self.families.items()
+            }
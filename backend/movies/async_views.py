@@ -0,0 +1,142 @@
+"""
+Async movie views
+Served instead of the APIView classes in views.py when the project runs
+under ASGI (settings.MOVIES_ASYNC_VIEWS), so a worker never blocks a
+thread on a TMDB round trip. Responses match the sync views.
+"""
+from asgiref.sync import sync_to_async
+from django.http import JsonResponse
+from rest_framework import status
+
+from . import fieldsets
+from .enrichment import enricher
+from .scroll import InvalidCursor
+from .tmdb_async import async_tmdb_service as tmdb_service
+
+
+def _json(data, status_code=status.HTTP_200_OK):
+    return JsonResponse(data, status=status_code, safe=False,
+                        json_dumps_params={'ensure_ascii': False, 'separators': (',', ':')})
+
+
+async def _list_page(request, method, **kwargs):
+    """A page of a TMDB list: from its scroll snapshot for ?cursor=, else ?page= (page 1 gets a cursor)"""
+    cursor = request.GET.get('cursor')
+    if cursor and tmdb_service.scroll is not None:
+        return await sync_to_async(tmdb_service.scroll.page, thread_sensitive=False)(cursor)
+    page = request.GET.get('page', 1)
+    data = await getattr(tmdb_service, method)(page=page, **kwargs)
+    if data and str(page) == '1' and tmdb_service.scroll is not None:
+        data = await sync_to_async(tmdb_service.scroll.first_page, thread_sensitive=False)(method, kwargs, data)
+    return data
+
+
+async def _movie_list(request, fetch, error_message, error_status=status.HTTP_503_SERVICE_UNAVAILABLE):
+    try:
+        data = await fetch
+        if data:
+            await enricher.load_genres_async(tmdb_service)
+            return _json(fieldsets.select_fields(request, enricher.list_page(data, load_genres=False)))
+        return _json({'error': error_message}, error_status)
+    except InvalidCursor as e:
+        return _json({'error': str(e)}, status.HTTP_400_BAD_REQUEST)
+    except Exception as e:
+        return _json({'error': str(e)}, status.HTTP_500_INTERNAL_SERVER_ERROR)
+
+
+async def search_movies(request):
+    query = request.GET.get('query', '')
+    page = request.GET.get('page', 1)
+
+    if not query:
+        return _json({'error': 'Query parameter is required'}, status.HTTP_400_BAD_REQUEST)
+
+    return await _movie_list(request, tmdb_service.search_movies(query, page), 'Failed to fetch data from TMDB')
+
+
+async def trending_movies(request):
+    time_window = request.GET.get('time_window', 'day')  # day or week
+    return await _movie_list(request, _list_page(request, 'get_trending_movies', time_window=time_window),
+                             'Failed to fetch trending movies')
+
+
+async def popular_movies(request):
+    return await _movie_list(request, _list_page(request, 'get_popular_movies'), 'Failed to fetch popular movies')
+
+
+async def top_rated_movies(request):
+    return await _movie_list(request, _list_page(request, 'get_top_rated_movies'),
+                             'Failed to fetch top rated movies')
+
+
+async def now_playing_movies(request):
+    return await _movie_list(request, _list_page(request, 'get_now_playing_movies'),
+                             'Failed to fetch now playing movies')
+
+
+async def upcoming_movies(request):
+    return await _movie_list(request, _list_page(request, 'get_upcoming_movies'),
+                             'Failed to fetch upcoming movies')
+
+
+async def movie_detail(request, movie_id):
+    try:
+        data = await tmdb_service.get_movie_details(movie_id)
+        if data:
+            return _json(fieldsets.select_fields(request, enricher.details(data), fieldsets.DOCUMENT))
+        return _json({'error': 'Movie not found'}, status.HTTP_404_NOT_FOUND)
+    except Exception as e:
+        return _json({'error': str(e)}, status.HTTP_500_INTERNAL_SERVER_ERROR)
+
+
+async def movie_credits(request, movie_id):
+    try:
+        data = await tmdb_service.get_movie_credits(movie_id)
+        if data:
+            return _json(fieldsets.select_fields(request, enricher.credits(data), fieldsets.CREDITS))
+        return _json({'error': 'Credits not found'}, status.HTTP_404_NOT_FOUND)
+    except Exception as e:
+        return _json({'error': str(e)}, status.HTTP_500_INTERNAL_SERVER_ERROR)
+
+
+async def movie_videos(request, movie_id):
+    try:
+        data = await tmdb_service.get_movie_videos(movie_id)
+        if data:
+            return _json(fieldsets.select_fields(request, data))
+        return _json({'error': 'Videos not found'}, status.HTTP_404_NOT_FOUND)
+    except Exception as e:
+        return _json({'error': str(e)}, status.HTTP_500_INTERNAL_SERVER_ERROR)
+
+
+async def similar_movies(request, movie_id):
+    page = request.GET.get('page', 1)
+    return await _movie_list(request, tmdb_service.get_similar_movies(movie_id, page), 'Similar movies not found',
+                             status.HTTP_404_NOT_FOUND)
+
+
+async def movie_page(request, movie_id):
+    try:
+        data = await tmdb_service.get_movie_page(movie_id)
+        if data:
+            await enricher.load_genres_async(tmdb_service)
+            enricher.movie_page(data, load_genres=False)
+            return _json(fieldsets.select_fields(request, data, fieldsets.DOCUMENT))
+        return _json({'error': 'Movie not found'}, status.HTTP_404_NOT_FOUND)
+    except Exception as e:
+        return _json({'error': str(e)}, status.HTTP_500_INTERNAL_SERVER_ERROR)
+
+
+async def genres(request):
+    try:
+        data = await tmdb_service.get_genres()
+        if data:
+            return _json(fieldsets.select_fields(request, data, fieldsets.GENRES))
+        return _json({'error': 'Failed to fetch genres'}, status.HTTP_503_SERVICE_UNAVAILABLE)
+    except Exception as e:
+        return _json({'error': str(e)}, status.HTTP_500_INTERNAL_SERVER_ERROR)
+
+
+async def movies_by_genre(request, genre_id):
+    return await _movie_list(request, _list_page(request, 'get_movies_by_genre', genre_id=genre_id),
+                             'Failed to fetch movies by genre')
@@ -0,0 +1,416 @@
+"""
+TMDB response cache
+A bounded in-process LRU (L1) and a node-wide shared-memory tier in front
+of the Django cache framework (L2). Values are the raw JSON bodies returned
+by TMDB so every caller parses its own copy and can enrich it without
+touching the cache.
+"""
+import fnmatch
+import hashlib
+import logging
+import re
+import threading
+import time
+from collections import OrderedDict, namedtuple
+from urllib.parse import urlencode
+
+from django.conf import settings
+from django.core.cache import caches
+
+from .shm_cache import SharedMemoryCache
+
+
+logger = logging.getLogger(__name__)
+
+KEY_PREFIX = 'tmdb:'
+
+MINUTE = 60
+HOUR = 60 * MINUTE
+DAY = 24 * HOUR
+
+# Seconds each endpoint family stays fresh; override with settings.TMDB_CACHE_TTLS
+DEFAULT_TTLS = {
+    'genres': 3 * DAY,
+    'details': 6 * HOUR,
+    'credits': 6 * HOUR,
+    'videos': 6 * HOUR,
+    'similar': HOUR,
+    'trending': 10 * MINUTE,
+    'lists': 30 * MINUTE,
+    'discover': 30 * MINUTE,
+    'search': 5 * MINUTE,
+    'other': 10 * MINUTE,
+}
+
+# Families the change feed (movies/change_feed.py) invalidates when a movie
+# changes on TMDB; while it runs they stay fresh for settings.TMDB_CHANGE_FEED_TTL
+CHANGE_FEED_FAMILIES = ('details', 'credits', 'videos')
+
+# Extra seconds an expired entry may still be served while it is refreshed
+# in the background (stale-while-revalidate); override with
+# settings.TMDB_CACHE_STALE_TTLS. Families without a grace period never
+# serve stale data.
+DEFAULT_STALE_TTLS = {
+    'trending': HOUR,
+    'lists': 6 * HOUR,
+}
+
+_FAMILY_PATTERNS = [
+    (re.compile(r'^genre/movie/list$'), 'genres'),
+    (re.compile(r'^trending/'), 'trending'),
+    (re.compile(r'^movie/(popular|top_rated|now_playing|upcoming)$'), 'lists'),
+    (re.compile(r'^discover/'), 'discover'),
+    (re.compile(r'^search/'), 'search'),
+    (re.compile(r'^movie/\d+$'), 'details'),
+    (re.compile(r'^movie/\d+/credits$'), 'credits'),
+    (re.compile(r'^movie/\d+/videos$'), 'videos'),
+    (re.compile(r'^movie/\d+/similar$'), 'similar'),
+]
+
+
+def endpoint_family(endpoint):
+    """Group an endpoint into the family used for TTLs and statistics"""
+    endpoint = endpoint.strip('/')
+    for pattern, family in _FAMILY_PATTERNS:
+        if pattern.match(endpoint):
+            return family
+    return 'other'
+
+
+def key_family(key):
+    """Endpoint family of a key made by make_cache_key"""
+    return endpoint_family(key[len(KEY_PREFIX):].split('?', 1)[0])
+
+
+def key_pattern(pattern):
+    """Glob over cache keys for an endpoint pattern such as ``movie/550*``"""
+    pattern = pattern.strip().lstrip('/')
+    return pattern if pattern.startswith(KEY_PREFIX) else f"{KEY_PREFIX}{pattern}"
+
+
+def canonical_params(params):
+    """Sorted, stringified params without credentials or empty values"""
+    canonical = []
+    for name, value in (params or {}).items():
+        if name == 'api_key' or value is None:
+            continue
+        if isinstance(value, bool):
+            value = 'true' if value else 'false'
+        canonical.append((str(name), str(value)))
+    return sorted(canonical)
+
+
+def make_cache_key(endpoint, params=None):
+    """Cache key for an endpoint plus its canonicalized params"""
+    key = f"{KEY_PREFIX}{endpoint.strip('/')}"
+    query = urlencode(canonical_params(params))
+    if query:
+        # Keep keys readable for operators but within memcached-style limits
+        if len(query) > 150:
+            query = 'h=' + hashlib.sha1(query.encode()).hexdigest()
+        key = f"{key}?{query}"
+    return key
+
+
+class CacheEntry(namedtuple('CacheEntry', ['value', 'fresh_until', 'expires_at'])):
+    """A cached body with its soft (fresh_until) and hard (expires_at) deadlines"""
+    __slots__ = ()
+
+    @property
+    def is_fresh(self):
+        return time.time() < self.fresh_until
+
+
+class LRUCache:
+    """Bounded, thread-safe LRU mapping with per-entry expiry"""
+
+    def __init__(self, max_entries=2048, on_evict=None):
+        self.max_entries = max_entries
+        self.on_evict = on_evict
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key, allow_expired=False):
+        # Expired entries stay until LRU eviction so they can back an outage
+        now = time.time()
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                return None
+            if entry.expires_at <= now and not allow_expired:
+                return None
+            self._data.move_to_end(key)
+            return entry
+
+    def set(self, key, entry):
+        evicted = []
+        with self._lock:
+            self._data[key] = entry
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_entries:
+                evicted.append(self._data.popitem(last=False)[0])
+        if self.on_evict is not None:
+            for evicted_key in evicted:
+                self.on_evict(evicted_key)
+
+    def delete(self, key):
+        with self._lock:
+            return self._data.pop(key, None) is not None
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def items(self):
+        """Snapshot of (key, entry) pairs, most recently used last"""
+        with self._lock:
+            return list(self._data.items())
+
+    def __len__(self):
+        return len(self._data)
+
+
+class TMDBResponseCache:
+    """L1 in-process LRU and node shared memory, backed by the Django cache (L2)"""
+
+    def __init__(self, max_entries=None, ttls=None, stale_ttls=None, alias=None, shm=None):
+        self.l1 = LRUCache(max_entries or getattr(settings, 'TMDB_CACHE_L1_MAX_ENTRIES', 2048),
+                           on_evict=self._record_eviction)
+        if shm is None and getattr(settings, 'TMDB_SHM_CACHE_ENABLED', True):
+            shm = SharedMemoryCache()
+        # With shared memory on, L1 only keeps outage fallbacks and entries too large for it
+        self.shm = shm if shm is not None and shm.available else None
+        if self.shm is not None:
+            self.shm.on_evict = self._record_eviction
+        self.family_counts = {}
+        self._counts_lock = threading.Lock()
+        self.ttls = dict(DEFAULT_TTLS)
+        if getattr(settings, 'TMDB_CHANGE_FEED_ENABLED', False):
+            self.ttls.update(dict.fromkeys(CHANGE_FEED_FAMILIES, getattr(settings, 'TMDB_CHANGE_FEED_TTL', 3 * DAY)))
+        self.ttls.update(ttls or getattr(settings, 'TMDB_CACHE_TTLS', {}))
+        self.stale_ttls = dict(DEFAULT_STALE_TTLS)
+        self.stale_ttls.update(stale_ttls or getattr(settings, 'TMDB_CACHE_STALE_TTLS', {}))
+        self.alias = alias or getattr(settings, 'TMDB_CACHE_ALIAS', 'default')
+        self.created = time.monotonic()
+        self.first_hit_seconds = None
+
+    @property
+    def l2(self):
+        return caches[self.alias]
+
+    def ttl_for(self, endpoint):
+        return self.ttls.get(endpoint_family(endpoint), self.ttls['other'])
+
+    def stale_ttl_for(self, endpoint):
+        return self.stale_ttls.get(endpoint_family(endpoint), 0)
+
+    def _local(self, key, allow_expired=False):
+        """Best entry for ``key`` from the process (L1) and node (shared memory) tiers"""
+        entry = self.l1.get(key, allow_expired)
+        if self.shm is not None and (entry is None or not entry.is_fresh):
+            shared = self.shm.get(key, allow_expired)
+            if shared is not None and (entry is None or shared[1] > entry.fresh_until):
+                entry = CacheEntry(*shared)
+        return entry
+
+    def set_local(self, key, entry):
+        """Store ``entry`` on this node only (shared memory, else L1)"""
+        if self.shm is None or not self.shm.set(key, *entry):
+            self.l1.set(key, entry)
+
+    def version(self, key):
+        """Identifies the fresh local entry for ``key`` (its fresh_until), or None"""
+        versions = []
+        entry = self.l1.get(key)
+        if entry is not None:
+            versions.append(entry.fresh_until)
+        if self.shm is not None:
+            peeked = self.shm.peek(key)
+            if peeked is not None:
+                versions.append(peeked[0])
+        version = max(versions, default=None)
+        return version if version is not None and version > time.time() else None
+
+    def restore(self, key, entry):
+        """Put ``entry`` on this node unless a fresher copy is already there"""
+        local = self._local(key)
+        if local is None or local.fresh_until < entry.fresh_until:
+            self.set_local(key, entry)
+
+    def _count(self, key, counter):
+        family = key_family(key)
+        with self._counts_lock:
+            counts = self.family_counts.get(family)
+            if counts is None:
+                counts = self.family_counts[family] = {'hits': 0, 'misses': 0, 'evictions': 0}
+            counts[counter] += 1
+
+    def _record_hit(self, key):
+        if self.first_hit_seconds is None:
+            self.first_hit_seconds = time.monotonic() - self.created
+        self._count(key, 'hits')
+
+    def _record_eviction(self, key):
+        self._count(key, 'evictions')
+
+    def lookup_local(self, key):
+        """Fresh entry for ``key`` from this node's tiers, without touching L2"""
+        entry = self._local(key)
+        if entry is not None and entry.is_fresh:
+            self._record_hit(key)
+            return entry
+        return None
+
+    def lookup(self, key):
+        """Return the CacheEntry for ``key`` (fresh or within its stale grace) or None"""
+        entry = self._lookup(key)
+        if entry is not None:
+            self._record_hit(key)
+        else:
+            self._count(key, 'misses')
+        return entry
+
+    def _lookup(self, key):
+        local = self._local(key)
+        if local is not None and local.is_fresh:
+            return local
+
+        # Another worker may already have refreshed a stale local entry
+        try:
+            envelope = self.l2.get(key)
+        except Exception as e:
+            logger.warning(f"TMDB cache L2 read failed: {e}")
+            return local
+        if not envelope:
+            return local
+
+        entry = CacheEntry(envelope['v'], envelope.get('fresh', envelope['exp']), envelope['exp'])
+        if entry.expires_at <= time.time():
+            return local
+        if local is not None and local.fresh_until >= entry.fresh_until:
+            return local
+        self.set_local(key, entry)
+        return entry
+
+    def lookup_expired(self, key):
+        """Return the local entry for ``key`` even past its hard TTL, for outages"""
+        return self._local(key, allow_expired=True)
+
+    def set_fallback(self, key, value):
+        """Keep ``value`` in L1 for lookup_expired only, e.g. a copy loaded from a durable store"""
+        self.l1.set(key, CacheEntry(value, 0, 0))
+
+    def get(self, key):
+        """Return the cached body bytes if still fresh, otherwise None"""
+        entry = self.lookup(key)
+        if entry is None or not entry.is_fresh:
+            return None
+        return entry.value
+
+    def set(self, key, value, ttl, stale_ttl=0):
+        """Store body bytes fresh for ``ttl`` seconds and servable for ``stale_ttl`` more"""
+        now = time.time()
+        entry = CacheEntry(value, now + ttl, now + ttl + stale_ttl)
+        self.set_local(key, entry)
+        try:
+            self.l2.set(key, {'v': value, 'fresh': entry.fresh_until, 'exp': entry.expires_at},
+                        timeout=ttl + stale_ttl)
+        except Exception as e:
+            logger.warning(f"TMDB cache L2 write failed: {e}")
+
+    def delete(self, key):
+        self.l1.delete(key)
+        if self.shm is not None:
+            self.shm.delete(key)
+        try:
+            self.l2.delete(key)
+        except Exception as e:
+            logger.warning(f"TMDB cache L2 delete failed: {e}")
+
+    def delete_local(self, keys):
+        """Drop this node's copies (L1 and shared memory) of ``keys``; returns how many"""
+        deleted = 0
+        for key in keys:
+            deleted += self.l1.delete(key)
+            if self.shm is not None:
+                deleted += self.shm.delete(key)
+        return deleted
+
+    def delete_many(self, keys):
+        keys = list(keys)
+        self.delete_local(keys)
+        try:
+            self.l2.delete_many(keys)
+        except Exception as e:
+            logger.warning(f"TMDB cache L2 delete failed: {e}")
+
+    def local_items(self):
+        """Yield (key, CacheEntry) for the unexpired entries held on this node"""
+        seen = set()
+        if self.shm is not None:
+            for key, value, fresh_until, expires_at in self.shm.items():
+                seen.add(key)
+                yield key, CacheEntry(value, fresh_until, expires_at)
+        now = time.time()
+        for key, entry in self.l1.items():
+            if key not in seen and entry.expires_at > now:
+                yield key, entry
+
+    def keys(self, pattern):
+        """Yield (key, tier, fresh_until) for every cached key matching ``pattern`` (see key_pattern)"""
+        pattern = key_pattern(pattern)
+        for key, entry in self.l1.items():
+            if fnmatch.fnmatchcase(key, pattern):
+                yield key, 'l1', entry.fresh_until
+        if self.shm is not None:
+            for key, fresh_until, _ in self.shm.keys():
+                if fnmatch.fnmatchcase(key, pattern):
+                    yield key, 'shared_memory', fresh_until
+        if hasattr(self.l2, 'keys'):
+            try:
+                for key in self.l2.keys(pattern):
+                    yield key, 'l2', None
+            except Exception as e:
+                logger.warning(f"TMDB cache L2 key listing failed: {e}")
+
+    def purge_local(self, pattern):
+        """Delete this node's entries matching ``pattern``; returns how many"""
+        pattern = key_pattern(pattern)
+        purged = 0
+        for key, _ in self.l1.items():
+            if fnmatch.fnmatchcase(key, pattern):
+                purged += self.l1.delete(key)
+        if self.shm is not None:
+            for key, _, _ in list(self.shm.keys()):
+                if fnmatch.fnmatchcase(key, pattern):
+                    purged += self.shm.delete(key)
+        return purged
+
+    def purge(self, pattern):
+        """Delete entries matching ``pattern`` here and in L2; L2 is None when it cannot match patterns"""
+        purged = {'local': self.purge_local(pattern), 'l2': None}
+        if hasattr(self.l2, 'delete_pattern'):
+            try:
+                purged['l2'] = self.l2.delete_pattern(key_pattern(pattern))
+            except Exception as e:
+                logger.warning(f"TMDB cache L2 purge failed: {e}")
+        return purged
+
+    def get_stats(self):
+        """Per-family counters and the memory held by this process and node"""
+        l1_entries = self.l1.items()
+        with self._counts_lock:
+            families = {family: dict(counts) for family, counts in self.family_counts.items()}
+        return {
+            'families': families,
+            'memory': {
+                'l1': {'entries': len(l1_entries), 'bytes': sum(len(entry.value) for _, entry in l1_entries)},
+                'shared_memory': self.shm.get_memory() if self.shm is not None else None,
+            },
+        }
+
+    def clear_local(self):
+        """Drop this node's copies (L1 and shared memory); L2 is untouched"""
+        self.l1.clear()
+        if self.shm is not None:
+            self.shm.clear()
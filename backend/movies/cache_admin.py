@@ -0,0 +1,197 @@
+"""
+TMDB cache administration across workers
+Every web worker publishes its cache counters to MongoDB at intervals and
+replays purges requested on any other worker, so the staff endpoints under
+/api/core/tmdb-cache/ see and control the cache of every process without a
+restart. L2 and the MongoDB stores are shared, so a purge reaches them
+directly; the replay covers each worker's in-process L1 and the shared
+memory of every node.
+"""
+import logging
+import os
+import socket
+import threading
+from datetime import datetime, timedelta, timezone
+
+from django.conf import settings
+
+from .cache import key_pattern
+from .mongo_models import TMDBCachePurge, TMDBCacheWorker
+from .mongo_store import MongoStoreGuard, StoreUnavailable
+
+
+logger = logging.getLogger(__name__)
+
+# Purges are read back this far behind the newest one applied, so one
+# recorded by a worker whose clock is behind is still seen
+PURGE_LOOKBACK = timedelta(minutes=5)
+
+
+class CacheAdmin:
+    """Publishes this worker's cache stats and applies purges from other workers"""
+
+    def __init__(self, cache, movie_store=None, last_good=None, interval=None):
+        self.cache = cache
+        self.movie_store = movie_store
+        self.last_good = last_good
+        self.interval = interval or getattr(settings, 'TMDB_CACHE_ADMIN_INTERVAL', 10)
+        self.node = getattr(settings, 'TMDB_PEER_SELF', '') or socket.gethostname()
+        self.guard = MongoStoreGuard('Cache admin')
+        self._started_pid = None
+        self._stop = threading.Event()
+        self._purges_after = None
+        self._applied_purges = {}  # ID -> created_at of the purges within the lookback
+        self.purges_applied = 0
+
+    @property
+    def worker_id(self):
+        return f"{socket.gethostname()}:{os.getpid()}"
+
+    def start(self):
+        """Publish and replay purges every interval (once per process)"""
+        if self._started_pid == os.getpid():
+            return
+        self._started_pid = os.getpid()
+        # Purges from before this process started cannot be in its memory
+        self._purges_after = datetime.now(timezone.utc)
+        threading.Thread(target=self._run, name='tmdb-cache-admin', daemon=True).start()
+
+    def _run(self):
+        while True:
+            self.sync()
+            if self._stop.wait(self.interval):
+                return
+
+    def sync(self):
+        self.publish()
+        self.apply_purges()
+
+    def publish(self):
+        try:
+            with self.guard.call():
+                TMDBCacheWorker.objects(worker=self.worker_id).update_one(
+                    upsert=True,
+                    set__node=self.node,
+                    set__stats=self.cache.get_stats(),
+                    set__seen_at=datetime.now(timezone.utc),
+                )
+        except StoreUnavailable:
+            return False
+        return True
+
+    def apply_purges(self):
+        """Apply purges other workers recorded since the last call; returns how many"""
+        if self._purges_after is None:
+            return 0
+        try:
+            with self.guard.call():
+                purges = list(TMDBCachePurge.objects(
+                    created_at__gte=self._purges_after - PURGE_LOOKBACK, origin__ne=self.worker_id,
+                ).order_by('created_at'))
+        except StoreUnavailable:
+            return 0
+        applied = 0
+        for purge in purges:
+            if purge.id in self._applied_purges:
+                continue
+            if purge.keys:
+                self.cache.delete_local(purge.keys)
+            else:
+                self.cache.purge_local(purge.pattern)
+            created_at = self._aware(purge.created_at)
+            self._applied_purges[purge.id] = created_at
+            self._purges_after = max(self._purges_after, created_at)
+            applied += 1
+        since = self._purges_after - PURGE_LOOKBACK
+        self._applied_purges = {
+            purge_id: created_at for purge_id, created_at in self._applied_purges.items() if created_at >= since
+        }
+        self.purges_applied += applied
+        return applied
+
+    @staticmethod
+    def _aware(value):
+        return value if value.tzinfo else value.replace(tzinfo=timezone.utc)
+
+    def _broadcast(self, requested_by, **target):
+        """Record a purge for every other worker to replay; False if MongoDB is unavailable"""
+        try:
+            with self.guard.call():
+                TMDBCachePurge(
+                    origin=self.worker_id,
+                    requested_by=requested_by,
+                    created_at=datetime.now(timezone.utc),
+                    **target,
+                ).save()
+        except StoreUnavailable:
+            return False
+        return True
+
+    def purge(self, pattern, requested_by=''):
+        """Delete matching entries here and in L2, and have every other worker do the same"""
+        result = self.cache.purge(pattern)
+        # The durable copies would otherwise be served again on the next load
+        if self.movie_store is not None:
+            result['movie_store'] = self.movie_store.expire_matching(key_pattern(pattern))
+        if self.last_good is not None:
+            result['last_known_good'] = self.last_good.delete_matching(key_pattern(pattern))
+        result['broadcast'] = self._broadcast(requested_by, pattern=pattern)
+        logger.info(f"TMDB cache purge {pattern!r} by {requested_by or 'unknown'}: {result}")
+        return result
+
+    def invalidate(self, keys, requested_by=''):
+        """Delete exact ``keys`` here and in L2, and have every other worker drop its copies"""
+        keys = list(keys)
+        if not keys:
+            return True
+        self.cache.delete_many(keys)
+        return self._broadcast(requested_by, keys=keys)
+
+    def workers(self):
+        """Documents of the workers that published within the last few intervals"""
+        since = datetime.now(timezone.utc) - timedelta(seconds=3 * self.interval)
+        try:
+            with self.guard.call():
+                return list(TMDBCacheWorker.objects(seen_at__gte=since))
+        except StoreUnavailable:
+            return []
+
+    def cluster_stats(self):
+        """Counters per endpoint family and memory per tier, summed over live workers"""
+        self.publish()
+        workers = self.workers()
+        if not any(worker.worker == self.worker_id for worker in workers):
+            # MongoDB is unavailable: report this worker alone
+            workers = [TMDBCacheWorker(worker=self.worker_id, node=self.node, stats=self.cache.get_stats())]
+
+        families = {}
+        l1 = {'entries': 0, 'bytes': 0}
+        shared_memory = {}
+        for worker in workers:
+            for family, counts in worker.stats.get('families', {}).items():
+                totals = families.setdefault(family, {'hits': 0, 'misses': 0, 'evictions': 0})
+                for counter, value in counts.items():
+                    totals[counter] = totals.get(counter, 0) + value
+            memory = worker.stats.get('memory', {})
+            for field in l1:
+                l1[field] += (memory.get('l1') or {}).get(field, 0)
+            if memory.get('shared_memory') is not None:
+                # One segment per node, seen the same by all of its workers
+                shared_memory[worker.node] = memory['shared_memory']
+        for totals in families.values():
+            lookups = totals['hits'] + totals['misses']
+            totals['hit_rate'] = round(totals['hits'] / lookups, 3) if lookups else None
+
+        l2 = self.cache.l2
+        return {
+            'families': families,
+            'memory': {
+                'l1': l1,
+                'shared_memory': shared_memory,
+                'l2': l2.get_stats() if hasattr(l2, 'get_stats') else None,
+            },
+            'workers': [
+                {'worker': worker.worker, 'node': worker.node, 'seen_at': worker.seen_at}
+                for worker in workers
+            ],
+        }
@@ -0,0 +1,170 @@
+"""
+TMDB change feed
+Polls TMDB's movie/changes feed and invalidates exactly the cached entries
+of the movies it lists: details, credits, videos and the combined movie
+page. They are dropped from every tier, on every worker through the cache
+admin's purge broadcast, and the ones this process held are reloaded right
+away. With the feed running, those families are cached for days
+(settings.TMDB_CHANGE_FEED_TTL) instead of hours.
+
+Run `manage.py sync_tmdb_changes` on one host; the broadcast reaches the rest.
+"""
+import json
+import logging
+import threading
+import time
+from datetime import datetime, timedelta, timezone
+
+from django.conf import settings
+
+from .cache import make_cache_key
+from .dispatch import PREFETCH
+
+
+logger = logging.getLogger(__name__)
+
+CHANGES_ENDPOINT = 'movie/changes'
+# TMDB accepts at most 14 days per query
+MAX_WINDOW_DAYS = 14
+
+
+def movie_endpoints(movie_id):
+    """(endpoint, params) of every cached response built from one movie"""
+    return [
+        (f'movie/{movie_id}', None),
+        (f'movie/{movie_id}/credits', None),
+        (f'movie/{movie_id}/videos', None),
+        (f'movie/{movie_id}', {'append_to_response': 'credits,videos,similar'}),
+    ]
+
+
+def changed_ids(page):
+    """Movie IDs listed on one movie/changes page"""
+    return {int(item['id']) for item in page.get('results', []) if item.get('id') is not None}
+
+
+class ChangeFeed:
+    """Applies movie/changes to the TMDB response cache and the movie store"""
+
+    def __init__(self, service, refresh=None, max_pages=None):
+        self.service = service
+        self.refresh = getattr(settings, 'TMDB_CHANGE_FEED_REFRESH', True) if refresh is None else refresh
+        self.max_pages = max_pages or getattr(settings, 'TMDB_CHANGE_FEED_MAX_PAGES', 50)
+        # First day the next poll asks for, and the IDs already applied for it
+        self.cursor = None
+        self._applied_today = set()
+        self.polls = 0
+        self.failed_polls = 0
+        self.changed = 0
+        self.refreshed = 0
+        self.dropped = 0
+        self.last_polled_at = None
+
+    def _fetch_ids(self, start, end):
+        """Changed movie IDs between two dates, or None if TMDB could not answer"""
+        ids = set()
+        page = total_pages = 1
+        with self.service.priority(PREFETCH):
+            while page <= min(total_pages, self.max_pages):
+                body = self.service._fetch(CHANGES_ENDPOINT, {
+                    'start_date': start.isoformat(),
+                    'end_date': end.isoformat(),
+                    'page': page,
+                })
+                if body is None:
+                    return None
+                data = json.loads(body)
+                ids |= changed_ids(data)
+                total_pages = data.get('total_pages') or 1
+                page += 1
+        if total_pages > self.max_pages:
+            logger.warning(f"TMDB change feed has {total_pages} pages; only {self.max_pages} were read")
+        return ids
+
+    def poll(self, today=None):
+        """Apply the changes since the last poll; returns how many movies changed, or None"""
+        today = today or datetime.now(timezone.utc).date()
+        start = max(self.cursor or today - timedelta(days=1), today - timedelta(days=MAX_WINDOW_DAYS - 1))
+        # The feed lists IDs per day without change times. Today's IDs are
+        # applied once each; a day that has ended is applied in full once more,
+        # which catches movies that changed again after they were first applied.
+        closed = self._fetch_ids(start, today - timedelta(days=1)) if start < today else set()
+        current = self._fetch_ids(today, today) if closed is not None else None
+        self.polls += 1
+        if current is None:
+            self.failed_polls += 1
+            return None
+        applied = self._applied_today if self.cursor == today else set()
+        ids = closed | (current - applied)
+        self.cursor = today
+        self._applied_today = applied | current
+        self.last_polled_at = time.time()
+        return self.apply(ids)
+
+    def replay(self, pages):
+        """Apply recorded movie/changes pages, e.g. in development or tests"""
+        ids = set()
+        for page in pages:
+            ids |= changed_ids(page)
+        return self.apply(ids)
+
+    def apply(self, movie_ids):
+        """Invalidate the cached responses of ``movie_ids``; returns how many movies"""
+        movie_ids = set(movie_ids)
+        cache = self.service.cache
+        if not movie_ids:
+            return 0
+        if self.service.movie_store is not None:
+            # Keep the stored copies for outages but stop serving them as fresh
+            self.service.movie_store.expire(movie_ids)
+        if cache is None:
+            return len(movie_ids)
+
+        keys, reload = [], []
+        for movie_id in movie_ids:
+            for endpoint, params in movie_endpoints(movie_id):
+                key = make_cache_key(endpoint, params)
+                keys.append(key)
+                if self.refresh and cache.lookup_expired(key) is not None:
+                    reload.append((key, endpoint, params))
+        # Through the purge broadcast so every worker's L1, and every node's
+        # shared memory, drops its copy too
+        if self.service.cache_admin is not None:
+            self.service.cache_admin.invalidate(keys, requested_by='change feed')
+        else:
+            cache.delete_many(keys)
+
+        refreshed = 0
+        with self.service.priority(PREFETCH), self.service.refreshing():
+            for key, endpoint, params in reload:
+                if self.service._load(key, endpoint, params) is not None:
+                    refreshed += 1
+        dropped = len(keys) - refreshed
+        self.changed += len(movie_ids)
+        self.refreshed += refreshed
+        self.dropped += dropped
+        logger.info(f"TMDB change feed: {len(movie_ids)} movies changed, "
+                    f"{refreshed} entries reloaded, {dropped} dropped")
+        return len(movie_ids)
+
+    def run_forever(self, interval=None, stop_event=None):
+        interval = interval or getattr(settings, 'TMDB_CHANGE_FEED_INTERVAL', 600)
+        stop_event = stop_event or threading.Event()
+        while not stop_event.is_set():
+            try:
+                self.poll()
+            except Exception as e:
+                logger.warning(f"TMDB change feed poll failed: {e}")
+            stop_event.wait(interval)
+
+    def get_stats(self):
+        return {
+            'cursor': self.cursor.isoformat() if self.cursor else None,
+            'applied_today': len(self._applied_today),
+            'polls': self.polls,
+            'failed_polls': self.failed_polls,
+            'changed_movies': self.changed,
+            'refreshed_entries': self.refreshed,
+            'dropped_entries': self.dropped,
+            'last_polled_at': self.last_polled_at,
+        }
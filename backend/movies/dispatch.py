@@ -0,0 +1,226 @@
+"""
+Priority dispatch of TMDB calls
+User-facing requests, background prefetches and bulk jobs share one
+upstream budget. Each lane has its own concurrency cap, lower lanes yield
+to waiting higher lanes, and only interactive calls may use the last
+tokens of the shared rate limit.
+
+Sync callers wait on a threading.Condition; async callers wait on their
+event loop and never hold a worker thread. Both share the lane counters,
+but the async path is sized by TMDB_ASYNC_MAX_CONNECTIONS (its httpx pool)
+rather than the sync connection pool.
+"""
+import asyncio
+import contextvars
+import threading
+import time
+import weakref
+from contextlib import contextmanager
+
+from django.conf import settings
+
+
+INTERACTIVE = 'interactive'
+PREFETCH = 'prefetch'
+BULK = 'bulk'
+
+LANES = (INTERACTIVE, PREFETCH, BULK)
+
+# cap: concurrent upstream calls (None: the whole pool; the async path applies
+# it to its own pool), queue_wait: seconds
+# to wait for a slot, token_wait: seconds to wait for a rate-limit token
+# (None: TMDB_RATE_LIMIT_MAX_WAIT),
+# token_reserve: share of the burst this lane must leave for higher lanes
+DEFAULT_LANES = {
+    INTERACTIVE: {'cap': None, 'queue_wait': 5.0, 'token_wait': None, 'token_reserve': 0.0},
+    PREFETCH: {'cap': 4, 'queue_wait': 30.0, 'token_wait': 2.0, 'token_reserve': 0.25},
+    BULK: {'cap': 2, 'queue_wait': 300.0, 'token_wait': 10.0, 'token_reserve': 0.5},
+}
+
+_current_lane = contextvars.ContextVar('tmdb_lane', default=INTERACTIVE)
+
+
+def current_lane():
+    return _current_lane.get()
+
+
+@contextmanager
+def priority(lane):
+    """Run the enclosed TMDB calls in ``lane``"""
+    if lane not in LANES:
+        raise ValueError(f"Unknown TMDB priority lane: {lane}")
+    token = _current_lane.set(lane)
+    try:
+        yield
+    finally:
+        _current_lane.reset(token)
+
+
+class _LoopWaiters:
+    """Async callers waiting for a slot on one event loop"""
+
+    def __init__(self):
+        self.count = 0
+        self.event = asyncio.Event()
+
+    def wake(self):
+        # Waiters hold the old event; a fresh one is armed for the next round
+        self.event.set()
+        self.event = asyncio.Event()
+
+
+class PriorityDispatcher:
+    """Admission control for upstream calls across the priority lanes"""
+
+    def __init__(self, capacity=None, lanes=None, async_capacity=None):
+        self.capacity = capacity or getattr(settings, 'TMDB_HTTP_POOL_SIZE', 10)
+        self.async_capacity = async_capacity or getattr(settings, 'TMDB_ASYNC_MAX_CONNECTIONS', 100)
+        self.lanes = {lane: dict(config) for lane, config in DEFAULT_LANES.items()}
+        for lane, overrides in (lanes or getattr(settings, 'TMDB_PRIORITY_LANES', {})).items():
+            self.lanes[lane].update(overrides)
+        for config in self.lanes.values():
+            config['async_cap'] = min(config['cap'] or self.async_capacity, self.async_capacity)
+            config['cap'] = min(config['cap'] or self.capacity, self.capacity)
+            if config['token_wait'] is None:
+                config['token_wait'] = getattr(settings, 'TMDB_RATE_LIMIT_MAX_WAIT', 0.5)
+
+        self._cond = threading.Condition()
+        self._in_flight = {lane: 0 for lane in LANES}
+        self._async_in_flight = {lane: 0 for lane in LANES}
+        self._loops = weakref.WeakKeyDictionary()  # event loop -> _LoopWaiters
+        self._waiting = {lane: 0 for lane in LANES}
+        self._dispatched = {lane: 0 for lane in LANES}
+        self._timed_out = {lane: 0 for lane in LANES}
+        self._wait_seconds = {lane: 0.0 for lane in LANES}
+
+    def config(self, lane):
+        return self.lanes[lane]
+
+    def _can_run(self, lane, asynchronous=False):
+        if asynchronous:
+            in_flight, capacity, cap = self._async_in_flight, self.async_capacity, self.lanes[lane]['async_cap']
+        else:
+            in_flight, capacity, cap = self._in_flight, self.capacity, self.lanes[lane]['cap']
+        if in_flight[lane] >= cap:
+            return False
+        if sum(in_flight.values()) >= capacity:
+            return False
+        higher = LANES[:LANES.index(lane)]
+        return not any(self._waiting[other] for other in higher)
+
+    def _start(self, lane, started, asynchronous=False):
+        # Caller holds self._cond
+        (self._async_in_flight if asynchronous else self._in_flight)[lane] += 1
+        self._dispatched[lane] += 1
+        self._wait_seconds[lane] += time.monotonic() - started
+
+    def _changed(self):
+        """Wake every waiter after a slot or the waiting counts changed; caller holds self._cond"""
+        self._cond.notify_all()
+        waiting_loops = [(loop, waiters) for loop, waiters in self._loops.items() if waiters.count]
+        if not waiting_loops:
+            return
+        try:
+            current = asyncio.get_running_loop()
+        except RuntimeError:
+            current = None
+        for loop, waiters in waiting_loops:
+            if loop is current:
+                waiters.wake()
+            else:
+                try:
+                    loop.call_soon_threadsafe(waiters.wake)
+                except RuntimeError:  # Loop closed
+                    pass
+
+    def acquire(self, lane, timeout=None):
+        """Block until ``lane`` may start an upstream call; False on timeout"""
+        timeout = self.lanes[lane]['queue_wait'] if timeout is None else timeout
+        started = time.monotonic()
+        with self._cond:
+            if not self._can_run(lane):
+                self._waiting[lane] += 1
+                try:
+                    ok = self._cond.wait_for(lambda: self._can_run(lane), timeout)
+                finally:
+                    self._waiting[lane] -= 1
+                    self._changed()
+                if not ok:
+                    self._timed_out[lane] += 1
+                    return False
+            self._start(lane, started)
+            return True
+
+    def release(self, lane):
+        with self._cond:
+            self._in_flight[lane] -= 1
+            self._changed()
+
+    async def acquire_async(self, lane, timeout=None):
+        """Wait on the event loop until ``lane`` may start an upstream call; False on timeout"""
+        timeout = self.lanes[lane]['queue_wait'] if timeout is None else timeout
+        started = time.monotonic()
+        loop = asyncio.get_running_loop()
+        with self._cond:
+            if self._can_run(lane, asynchronous=True):
+                self._start(lane, started, asynchronous=True)
+                return True
+            waiters = self._loops.get(loop)
+            if waiters is None:
+                waiters = self._loops[loop] = _LoopWaiters()
+            waiters.count += 1
+            self._waiting[lane] += 1
+        try:
+            while True:
+                # Wakes for this loop run on it, so none is missed between the check and here
+                event = waiters.event
+                remaining = started + timeout - time.monotonic()
+                if remaining <= 0:
+                    with self._cond:
+                        self._timed_out[lane] += 1
+                    return False
+                try:
+                    await asyncio.wait_for(event.wait(), remaining)
+                except asyncio.TimeoutError:
+                    pass
+                with self._cond:
+                    if self._can_run(lane, asynchronous=True):
+                        self._start(lane, started, asynchronous=True)
+                        return True
+        finally:
+            with self._cond:
+                waiters.count -= 1
+                self._waiting[lane] -= 1
+                self._changed()
+
+    def release_async(self, lane):
+        with self._cond:
+            self._async_in_flight[lane] -= 1
+            self._changed()
+
+    @contextmanager
+    def slot(self, lane, timeout=None):
+        """Context manager form of acquire/release; yields whether a slot was granted"""
+        acquired = self.acquire(lane, timeout)
+        try:
+            yield acquired
+        finally:
+            if acquired:
+                self.release(lane)
+
+    def get_stats(self):
+        with self._cond:
+            return {
+                lane: {
+                    'cap': self.lanes[lane]['cap'],
+                    'async_cap': self.lanes[lane]['async_cap'],
+                    'in_flight': self._in_flight[lane] + self._async_in_flight[lane],
+                    'async_in_flight': self._async_in_flight[lane],
+                    'waiting': self._waiting[lane],
+                    'dispatched': self._dispatched[lane],
+                    'timed_out': self._timed_out[lane],
+                    'avg_wait_ms': round(1000 * self._wait_seconds[lane] / self._dispatched[lane], 1)
+                    if self._dispatched[lane] else 0,
+                }
+                for lane in LANES
+            }
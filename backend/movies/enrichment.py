@@ -0,0 +1,118 @@
+"""
+Response enrichment
+One pass over a TMDB payload before a view returns it: image URLs are
+built from prefixes computed once, and list items get genre names next to
+their genre_ids from a genre map loaded once per process, so clients no
+longer need /api/movies/genres/ to label them. Used by the sync and async
+views alike.
+"""
+import logging
+import threading
+import time
+
+from .tmdb_service import tmdb_service
+
+
+logger = logging.getLogger(__name__)
+
+POSTER_SIZE = 'w500'
+BACKDROP_SIZE = 'w1280'
+PROFILE_SIZE = 'w500'
+# Seconds before retrying a genre map that could not be loaded
+GENRES_RETRY_AFTER = 60
+# Distinct genre_ids combinations whose name lists are kept
+MAX_GENRE_COMBINATIONS = 4096
+
+
+class Enricher:
+    """Adds image URLs and genre names to TMDB payloads in place"""
+
+    def __init__(self, service):
+        self.service = service
+        self.poster_prefix = f"{service.image_base_url}{POSTER_SIZE}"
+        self.backdrop_prefix = f"{service.image_base_url}{BACKDROP_SIZE}"
+        self.profile_prefix = f"{service.image_base_url}{PROFILE_SIZE}"
+        self.genre_names = None
+        self._names_by_ids = {}  # tuple(genre_ids) -> names, shared by every movie with those genres
+        self._genres_retry_at = 0
+        self._lock = threading.Lock()
+
+    # Genre map
+
+    def _needs_genres(self):
+        return self.genre_names is None and time.monotonic() >= self._genres_retry_at
+
+    def set_genres(self, data):
+        if data and data.get('genres'):
+            self.genre_names = {genre['id']: genre['name'] for genre in data['genres']}
+            self._names_by_ids = {}
+        else:
+            logger.warning("Genre names unavailable; list items are returned without them for now")
+            self._genres_retry_at = time.monotonic() + GENRES_RETRY_AFTER
+
+    def load_genres(self):
+        if self._needs_genres():
+            with self._lock:
+                if self._needs_genres():
+                    self.set_genres(self.service.get_genres())
+
+    async def load_genres_async(self, service):
+        """Load the genre map through an async service, without blocking the event loop"""
+        if self._needs_genres():
+            self.set_genres(await service.get_genres())
+
+    # Payloads
+
+    def movies(self, movies):
+        poster_prefix, backdrop_prefix = self.poster_prefix, self.backdrop_prefix
+        genre_names, names_by_ids = self.genre_names, self._names_by_ids
+        for movie in movies:
+            path = movie.get('poster_path')
+            movie['poster_url'] = poster_prefix + path if path else None
+            path = movie.get('backdrop_path')
+            movie['backdrop_url'] = backdrop_prefix + path if path else None
+            genre_ids = movie.get('genre_ids')
+            if genre_names is not None and genre_ids is not None:
+                ids = tuple(genre_ids)
+                names = names_by_ids.get(ids)
+                if names is None:
+                    if len(names_by_ids) >= MAX_GENRE_COMBINATIONS:
+                        names_by_ids.clear()
+                    names = names_by_ids[ids] = [genre_names[genre_id] for genre_id in ids if genre_id in genre_names]
+                movie['genre_names'] = names
+        return movies
+
+    def people(self, people):
+        profile_prefix = self.profile_prefix
+        for person in people:
+            path = person.get('profile_path')
+            person['profile_url'] = profile_prefix + path if path else None
+        return people
+
+    def list_page(self, data, load_genres=True):
+        """A page of movies: search, lists, genres and similar movies"""
+        if load_genres:
+            self.load_genres()
+        self.movies(data.get('results', []))
+        return data
+
+    def details(self, data):
+        """A single movie; its genres already carry names"""
+        self.movies([data])
+        return data
+
+    def credits(self, data):
+        self.people(data.get('cast', []))
+        self.people(data.get('crew', []))
+        return data
+
+    def movie_page(self, data, load_genres=True):
+        """Details with credits, videos and similar movies appended"""
+        self.details(data)
+        self.credits(data.get('credits') or {})
+        self.list_page(data.get('similar') or {}, load_genres)
+        return data
+
+
+# Global instance, so the genre map is loaded once per process
+enricher = Enricher(tmdb_service)
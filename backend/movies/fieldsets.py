@@ -0,0 +1,73 @@
+"""
+Sparse fieldsets
+?fields= trims a movie response to the fields a client renders before it is
+serialised, e.g. ?fields=card on list pages or ?fields=id,title,runtime on
+/api/movies/<id>/. Names are comma separated and may mix presets with plain
+TMDB or enriched field names; unknown names are ignored. The projection
+applies to each item of a list (results, cast and crew, genres) or to the
+document itself, and the paging envelope (page, totals, cursor) is kept.
+"""
+from functools import lru_cache
+
+
+PRESETS = {
+    # What a movie card shows, plus what the client ranks search results by
+    'card': (
+        'id', 'title', 'poster_path', 'poster_url', 'release_date', 'vote_average',
+        'original_language', 'overview', 'popularity', 'genre_names',
+    ),
+    'detail': (
+        'id', 'title', 'tagline', 'overview', 'poster_path', 'poster_url', 'backdrop_path',
+        'backdrop_url', 'release_date', 'runtime', 'genres', 'vote_average', 'vote_count',
+        'original_language', 'status', 'imdb_id', 'homepage',
+    ),
+    'person': ('id', 'name', 'character', 'job', 'department', 'profile_path', 'profile_url'),
+    'video': ('id', 'key', 'name', 'site', 'type', 'official'),
+}
+
+# Where the projected items are in each response shape; empty for the document itself
+RESULTS = ('results',)
+CREDITS = ('cast', 'crew')
+GENRES = ('genres',)
+DOCUMENT = ()
+
+
+@lru_cache(maxsize=256)
+def parse(value):
+    """The field names requested by a ?fields= value, presets expanded; None for no projection"""
+    fields = set()
+    for name in value.split(','):
+        name = name.strip()
+        fields.update(PRESETS.get(name, (name,) if name else ()))
+    return frozenset(fields) or None
+
+
+def _select(item, fields):
+    if not isinstance(item, dict):
+        return item
+    return {key: value for key, value in item.items() if key in fields}
+
+
+def project(data, fields, items=RESULTS):
+    """
+    A copy of ``data`` keeping only ``fields`` on its items; cached payloads
+    are left untouched. If no field matches, e.g. ?fields=crad, ``data`` is
+    returned whole rather than as empty items.
+    """
+    if not items:
+        return _select(data, fields) or data
+    projected = dict(data)
+    matched = False
+    for key in items:
+        if isinstance(data.get(key), list):
+            projected[key] = [_select(item, fields) for item in data[key]]
+            matched = matched or any(projected[key])
+    return projected if matched else data
+
+
+def select_fields(request, data, items=RESULTS):
+    """``data`` projected to the request's ?fields=, or as is when there is none"""
+    fields = parse(request.GET.get('fields', ''))
+    if fields is None or not isinstance(data, dict):
+        return data
+    return project(data, fields, items)
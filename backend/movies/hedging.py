@@ -0,0 +1,101 @@
+"""
+Hedged TMDB requests
+If a GET has not answered by a high percentile of recent latency for its
+endpoint family, a second identical request is sent and whichever answers
+first wins. This trims the tail without doubling upstream load.
+"""
+import threading
+from collections import deque
+
+from django.conf import settings
+
+
+class LatencyTracker:
+    """Sliding window of recent upstream latencies per endpoint family"""
+
+    def __init__(self, window=200):
+        self.window = window
+        self._samples = {}
+        self._lock = threading.Lock()
+
+    def record(self, family, seconds):
+        with self._lock:
+            samples = self._samples.get(family)
+            if samples is None:
+                samples = self._samples[family] = deque(maxlen=self.window)
+            samples.append(seconds)
+
+    def percentile(self, family, percentile, min_samples=1):
+        with self._lock:
+            samples = sorted(self._samples.get(family, ()))
+        if len(samples) < min_samples:
+            return None
+        index = min(int(len(samples) * percentile / 100), len(samples) - 1)
+        return samples[index]
+
+    def get_stats(self):
+        with self._lock:
+            families = list(self._samples)
+        return {
+            family: {
+                'p50_ms': round(1000 * self.percentile(family, 50), 1),
+                'p95_ms': round(1000 * self.percentile(family, 95), 1),
+                'p99_ms': round(1000 * self.percentile(family, 99), 1),
+            }
+            for family in families
+        }
+
+
+class HedgePolicy:
+    """When to send a hedge, and counters for how often hedges fire and win"""
+
+    def __init__(self, enabled=None, percentile=None, min_samples=None, min_delay=None):
+        self.enabled = enabled if enabled is not None else getattr(settings, 'TMDB_HEDGE_ENABLED', False)
+        self.percentile = percentile or getattr(settings, 'TMDB_HEDGE_PERCENTILE', 95)
+        self.min_samples = min_samples or getattr(settings, 'TMDB_HEDGE_MIN_SAMPLES', 20)
+        self.min_delay = min_delay or getattr(settings, 'TMDB_HEDGE_MIN_DELAY', 0.05)
+        self.latency = LatencyTracker()
+        self._lock = threading.Lock()
+        self.requests = 0
+        self.fired = 0
+        self.won = 0
+        self.skipped = 0
+
+    def delay_for(self, family):
+        """Seconds to wait before hedging, or None to send a single request"""
+        if not self.enabled:
+            return None
+        threshold = self.latency.percentile(family, self.percentile, self.min_samples)
+        if threshold is None:
+            return None
+        return max(threshold, self.min_delay)
+
+    def record_request(self):
+        with self._lock:
+            self.requests += 1
+
+    def record_fired(self):
+        with self._lock:
+            self.fired += 1
+
+    def record_won(self):
+        with self._lock:
+            self.won += 1
+
+    def record_skipped(self):
+        """A hedge was due but the rate limiter had no spare token"""
+        with self._lock:
+            self.skipped += 1
+
+    def get_stats(self):
+        with self._lock:
+            stats = {
+                'enabled': self.enabled,
+                'percentile': self.percentile,
+                'hedgeable_requests': self.requests,
+                'fired': self.fired,
+                'won': self.won,
+                'skipped_rate_limited': self.skipped,
+            }
+        stats['latency'] = self.latency.get_stats()
+        return stats
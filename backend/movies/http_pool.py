@@ -0,0 +1,150 @@
+"""
+Shared HTTP connection pool for TMDB
+Keeps one keep-alive session per process so views and background jobs reuse
+TCP/TLS connections to api.themoviedb.org instead of handshaking every call.
+"""
+import os
+import threading
+
+import requests
+from django.conf import settings
+from requests.adapters import HTTPAdapter
+from urllib3.connectionpool import HTTPConnectionPool, HTTPSConnectionPool
+
+
+class PoolStats:
+    """Thread-safe counters for connection checkouts"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.requests = 0
+        self.connections_opened = 0
+
+    def record_checkout(self):
+        with self._lock:
+            self.requests += 1
+
+    def record_new_connection(self):
+        with self._lock:
+            self.connections_opened += 1
+
+    def as_dict(self):
+        with self._lock:
+            return {
+                'requests': self.requests,
+                'connections_opened': self.connections_opened,
+                'connections_reused': max(self.requests - self.connections_opened, 0),
+            }
+
+
+def _counting_pool_class(base, stats):
+    """Build a urllib3 pool class that reports checkouts and new sockets to ``stats``"""
+
+    class CountingPool(base):
+        def _get_conn(self, timeout=None):
+            stats.record_checkout()
+            return super()._get_conn(timeout=timeout)
+
+        def _new_conn(self):
+            stats.record_new_connection()
+            return super()._new_conn()
+
+    CountingPool.__name__ = f"Counting{base.__name__}"
+    return CountingPool
+
+
+class PooledHTTPAdapter(HTTPAdapter):
+    """HTTPAdapter whose connection pools keep statistics"""
+
+    def __init__(self, stats, **kwargs):
+        self.stats = stats
+        super().__init__(**kwargs)
+
+    def init_poolmanager(self, *args, **kwargs):
+        super().init_poolmanager(*args, **kwargs)
+        self.poolmanager.pool_classes_by_scheme = {
+            'http': _counting_pool_class(HTTPConnectionPool, self.stats),
+            'https': _counting_pool_class(HTTPSConnectionPool, self.stats),
+        }
+
+
+class TMDBConnectionPool:
+    """
+    Process-wide pooled session.
+    The session is rebuilt after a fork so gunicorn workers never share
+    sockets inherited from the master process.
+    """
+
+    def __init__(self, pool_size=None, connect_timeout=None, read_timeout=None):
+        self.pool_size = pool_size or getattr(settings, 'TMDB_HTTP_POOL_SIZE', 10)
+        self.connect_timeout = connect_timeout or getattr(settings, 'TMDB_HTTP_CONNECT_TIMEOUT', 3.05)
+        self.read_timeout = read_timeout or getattr(settings, 'TMDB_HTTP_READ_TIMEOUT', 10)
+        self.stats = PoolStats()
+        self._lock = threading.Lock()
+        self._session = None
+        self._pid = None
+
+    @property
+    def timeout(self):
+        return (self.connect_timeout, self.read_timeout)
+
+    def _build_session(self):
+        session = requests.Session()
+        adapter = PooledHTTPAdapter(
+            self.stats,
+            pool_connections=1,
+            pool_maxsize=self.pool_size,
+            pool_block=False,
+        )
+        session.mount('https://', adapter)
+        session.mount('http://', adapter)
+        session.headers.update({
+            'Accept': 'application/json',
+            'Connection': 'keep-alive',
+        })
+        return session
+
+    @property
+    def session(self):
+        pid = os.getpid()
+        if self._session is None or self._pid != pid:
+            with self._lock:
+                if self._session is None or self._pid != pid:
+                    self.stats = PoolStats()
+                    self._session = self._build_session()
+                    self._pid = pid
+        return self._session
+
+    def get(self, url, params=None, timeout=None):
+        """Issue a GET through the pooled session"""
+        return self.session.get(url, params=params, timeout=timeout or self.timeout)
+
+    def close(self):
+        with self._lock:
+            if self._session is not None:
+                self._session.close()
+            self._session = None
+
+    def get_stats(self):
+        stats = self.stats.as_dict()
+        stats.update({
+            'pool_size': self.pool_size,
+            'connect_timeout': self.connect_timeout,
+            'read_timeout': self.read_timeout,
+            'pid': os.getpid(),
+        })
+        return stats
+
+
+_shared_pool = None
+_shared_pool_lock = threading.Lock()
+
+
+def get_connection_pool():
+    """Return the connection pool shared by every TMDBService in this process"""
+    global _shared_pool
+    if _shared_pool is None:
+        with _shared_pool_lock:
+            if _shared_pool is None:
+                _shared_pool = TMDBConnectionPool()
+    return _shared_pool
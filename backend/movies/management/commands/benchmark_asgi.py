@@ -0,0 +1,140 @@
+"""
+Compare WSGI (sync views on a thread pool) against ASGI (async views on one
+event loop) for the movie list endpoint, using a local stub TMDB upstream
+with a fixed latency.
+
+    python manage.py benchmark_asgi --latency-ms 150 --requests 400 --threads 8 --concurrency 200
+"""
+import asyncio
+import json
+import statistics
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from django.core.management.base import BaseCommand
+from django.test import RequestFactory
+
+from movies import async_views, views
+from movies.rate_limit import SharedRateLimiter
+from movies.tmdb_async import async_tmdb_service
+from movies.tmdb_service import tmdb_service
+
+
+def _stub_page(page):
+    return json.dumps({
+        'page': page,
+        'results': [
+            {'id': page * 100 + i, 'title': f'Movie {i}', 'poster_path': f'/{i}.jpg',
+             'backdrop_path': f'/{i}b.jpg', 'genre_ids': [28, 18]}
+            for i in range(20)
+        ],
+        'total_pages': 500,
+        'total_results': 10000,
+    }).encode()
+
+
+class StubTMDBServer(ThreadingHTTPServer):
+    daemon_threads = True
+    request_queue_size = 1024
+
+    def __init__(self, latency):
+        self.latency = latency
+        super().__init__(('127.0.0.1', 0), StubTMDBHandler)
+
+
+class StubTMDBHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def do_GET(self):
+        time.sleep(self.server.latency)
+        body = _stub_page(1)
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+class Command(BaseCommand):
+    help = 'Benchmark WSGI vs ASGI movie views against a local stub TMDB upstream'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--latency-ms', type=float, default=150, help='Stub upstream latency')
+        parser.add_argument('--requests', type=int, default=400, help='Requests per run')
+        parser.add_argument('--threads', type=int, default=8, help='WSGI worker threads')
+        parser.add_argument('--concurrency', type=int, default=200, help='ASGI concurrent requests')
+        parser.add_argument('--rate-limit', type=float, default=10000,
+                            help='Upstream calls per second allowed by the benchmark\'s own token bucket')
+
+    def handle(self, *args, **options):
+        server = StubTMDBServer(options['latency_ms'] / 1000)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        upstream = f"http://127.0.0.1:{server.server_port}/3"
+
+        # A bucket of its own, so the run neither drains nor is limited by the production quota
+        limiter = SharedRateLimiter(name='benchmark', rate=options['rate_limit'],
+                                    capacity=options['rate_limit'], max_wait=1.0)
+        saved = [(service, service.base_url, service.api_key, service.cache, service.rate_limiter)
+                 for service in (tmdb_service, async_tmdb_service)]
+        for service in (tmdb_service, async_tmdb_service):
+            # Every request must reach the upstream to measure I/O concurrency
+            service.base_url, service.api_key, service.cache = upstream, 'benchmark', None
+            service.rate_limiter = limiter
+
+        try:
+            wsgi = self._run_wsgi(options['requests'], options['threads'])
+            asgi = asyncio.run(self._run_asgi(options['requests'], options['concurrency']))
+        finally:
+            for service, base_url, api_key, cache, rate_limiter in saved:
+                service.base_url, service.api_key, service.cache = base_url, api_key, cache
+                service.rate_limiter = rate_limiter
+            server.shutdown()
+
+        self.stdout.write(f"Upstream latency: {options['latency_ms']:.0f} ms, {options['requests']} requests per run")
+        self._report(f"WSGI ({options['threads']} threads)", *wsgi)
+        self._report(f"ASGI ({options['concurrency']} concurrent)", *asgi)
+        self.stdout.write(f"ASGI/WSGI throughput: {asgi[0] / wsgi[0]:.1f}x")
+
+    def _run_wsgi(self, total, threads):
+        factory = RequestFactory()
+        view = views.PopularMoviesView.as_view()
+
+        def call(page):
+            started = time.perf_counter()
+            response = view(factory.get('/api/movies/popular/', {'page': page}))
+            response.render()
+            assert response.status_code == 200, response.status_code
+            return time.perf_counter() - started
+
+        started = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=threads) as executor:
+            latencies = list(executor.map(call, range(1, total + 1)))
+        return total / (time.perf_counter() - started), latencies
+
+    async def _run_asgi(self, total, concurrency):
+        factory = RequestFactory()
+        semaphore = asyncio.Semaphore(concurrency)
+
+        async def call(page):
+            async with semaphore:
+                started = time.perf_counter()
+                response = await async_views.popular_movies(factory.get('/api/movies/popular/', {'page': page}))
+                assert response.status_code == 200, response.status_code
+                return time.perf_counter() - started
+
+        started = time.perf_counter()
+        latencies = await asyncio.gather(*(call(page) for page in range(1, total + 1)))
+        elapsed = time.perf_counter() - started
+        await async_tmdb_service.aclose()
+        return total / elapsed, latencies
+
+    def _report(self, label, throughput, latencies):
+        latencies = sorted(latencies)
+        p50 = statistics.median(latencies) * 1000
+        p99 = latencies[int(len(latencies) * 0.99) - 1] * 1000
+        self.stdout.write(f"{label}: {throughput:.1f} req/s, p50 {p50:.0f} ms, p99 {p99:.0f} ms")
@@ -0,0 +1,96 @@
+"""
+Measure time to the first cache hit after a restart, with and without the
+TMDB cache snapshot, against a local stub TMDB upstream.
+
+    python manage.py benchmark_cold_start --latency-ms 300 --pages 2
+
+Each "restart" is a fresh TMDBService with empty process, shared-memory and
+L2 tiers; the home page requests are then replayed in order.
+"""
+import os
+import tempfile
+import threading
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from movies.cache import TMDBResponseCache
+from movies.shm_cache import SharedMemoryCache
+from movies.snapshot import CacheSnapshot
+from movies.tmdb_service import TMDBService
+
+from .benchmark_asgi import StubTMDBServer
+
+
+class Command(BaseCommand):
+    help = 'Benchmark time to first cache hit after a restart, with and without a cache snapshot'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--latency-ms', type=float, default=300, help='Stub upstream latency')
+        parser.add_argument('--pages', type=int, default=2, help='Pages per home page list')
+
+    def handle(self, *args, **options):
+        server = StubTMDBServer(options['latency_ms'] / 1000)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        upstream = f"http://127.0.0.1:{server.server_port}/3"
+        calls = [('get_genres', {})] + [
+            (method, {'page': page})
+            for method in ('get_trending_movies', 'get_popular_movies', 'get_top_rated_movies')
+            for page in range(1, options['pages'] + 1)
+        ]
+
+        with tempfile.TemporaryDirectory() as directory:
+            snapshot_path = os.path.join(directory, 'tmdb_cache.snapshot')
+            try:
+                warm = self._service('warm', upstream, directory)
+                self._replay(warm, calls)
+                saved = CacheSnapshot(warm.cache, path=snapshot_path).save()
+
+                empty = self._measure(self._service('empty', upstream, directory), calls)
+                restored = self._measure(self._service('restored', upstream, directory), calls,
+                                         CacheSnapshot(None, path=snapshot_path))
+            finally:
+                server.shutdown()
+
+        self.stdout.write(f"Upstream latency: {options['latency_ms']:.0f} ms, {len(calls)} home page requests, "
+                          f"snapshot of {saved} entries")
+        self._report('Empty cache', *empty)
+        self._report('Snapshot restored', *restored)
+
+    def _service(self, label, upstream, directory):
+        # A private L2 per run, so nothing survives a "restart" except the snapshot
+        alias = f"cold_start_{label}"
+        settings.CACHES[alias] = {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache', 'LOCATION': alias}
+        cache = TMDBResponseCache(alias=alias, shm=SharedMemoryCache(path=os.path.join(directory, label), size_mb=8))
+        service = TMDBService(cache=cache)
+        service.base_url, service.api_key = upstream, 'benchmark'
+        service.movie_store = service.last_good = service.peers = None
+        return service
+
+    def _replay(self, service, calls):
+        for method, kwargs in calls:
+            assert getattr(service, method)(**kwargs) is not None
+
+    def _measure(self, service, calls, snapshot=None):
+        started = time.perf_counter()
+        load_ms = None
+        if snapshot is not None:
+            snapshot.cache = service.cache
+            snapshot.load()
+            load_ms = 1000 * snapshot.load_seconds
+        first_request_ms = first_hit_ms = None
+        for method, kwargs in calls:
+            getattr(service, method)(**kwargs)
+            elapsed_ms = 1000 * (time.perf_counter() - started)
+            if first_request_ms is None:
+                first_request_ms = elapsed_ms
+            if first_hit_ms is None and service.cache.first_hit_seconds is not None:
+                first_hit_ms = elapsed_ms
+        return load_ms, first_request_ms, first_hit_ms, 1000 * (time.perf_counter() - started)
+
+    def _report(self, label, load_ms, first_request_ms, first_hit_ms, total_ms):
+        load = f"load {load_ms:.1f} ms, " if load_ms is not None else ''
+        first_hit = f"{first_hit_ms:.1f} ms" if first_hit_ms is not None else 'never'
+        self.stdout.write(f"{label}: {load}first response {first_request_ms:.1f} ms, "
+                          f"first cache hit {first_hit}, all home page requests {total_ms:.1f} ms")
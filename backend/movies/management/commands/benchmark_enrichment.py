@@ -0,0 +1,63 @@
+"""
+Measure the cost of enriching one 20-item page of movies, before (the
+per-view loop calling get_full_image_url twice per movie) and after (the
+shared Enricher, with image URLs only and with genre names as well).
+
+    python manage.py benchmark_enrichment --iterations 20000
+"""
+import timeit
+
+from django.core.management.base import BaseCommand
+
+from movies.enrichment import Enricher
+from movies.tmdb_service import tmdb_service
+
+
+GENRES = {'genres': [{'id': 28, 'name': 'Action'}, {'id': 18, 'name': 'Drama'}, {'id': 35, 'name': 'Comedy'}]}
+
+
+def _page():
+    return {
+        'page': 1,
+        'results': [
+            {'id': i, 'title': f'Movie {i}', 'poster_path': f'/{i}.jpg',
+             'backdrop_path': f'/{i}b.jpg' if i % 5 else None, 'genre_ids': [28, 18, 35][:1 + i % 3]}
+            for i in range(20)
+        ],
+    }
+
+
+def _legacy(data):
+    # The loop each list view used to run
+    for movie in data.get('results', []):
+        movie['poster_url'] = tmdb_service.get_full_image_url(movie.get('poster_path'))
+        movie['backdrop_url'] = tmdb_service.get_full_image_url(movie.get('backdrop_path'), 'w1280')
+
+
+class Command(BaseCommand):
+    help = 'Benchmark enriching a 20-item movie page: per-view loop versus the shared Enricher'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--iterations', type=int, default=20000)
+        parser.add_argument('--repeat', type=int, default=5, help='Best of this many runs')
+
+    def handle(self, *args, **options):
+        urls_only = Enricher(tmdb_service)
+        enricher = Enricher(tmdb_service)
+        enricher.set_genres(GENRES)
+        page = _page()
+        runs = {
+            'Before (get_full_image_url loop)': lambda: _legacy(page),
+            'After (Enricher, image URLs only)': lambda: urls_only.list_page(page, load_genres=False),
+            'After (Enricher, with genre names)': lambda: enricher.list_page(page, load_genres=False),
+        }
+        results = {}
+        for label, run in runs.items():
+            best = min(timeit.repeat(run, number=options['iterations'], repeat=options['repeat']))
+            results[label] = 1e6 * best / options['iterations']
+            self.stdout.write(f"{label}: {results[label]:.2f} µs per page")
+        before, urls, full = results.values()
+        self.stdout.write(self.style.SUCCESS(
+            f"Image URLs alone take {urls / before:.0%} of the old loop's time; "
+            f"with genre names {full / before:.0%}"
+        ))
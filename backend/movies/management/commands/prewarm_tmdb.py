@@ -0,0 +1,58 @@
+"""
+Keep the home page and genre lists warm in the TMDB response cache.
+
+    python manage.py prewarm_tmdb                      # run as a worker
+    python manage.py prewarm_tmdb --once               # one pass, e.g. from cron
+    python manage.py prewarm_tmdb --only trending,genres
+
+Targets and intervals come from settings.TMDB_PREWARM_TARGETS. The worker
+writes to the shared (L2) cache, so it needs a CACHES backend the web
+processes can read.
+"""
+import time
+
+from django.conf import settings
+from django.core.cache import caches
+from django.core.cache.backends.locmem import LocMemCache
+from django.core.management.base import BaseCommand
+
+from movies.prewarm import PrewarmScheduler
+from movies.tmdb_service import tmdb_service
+
+
+class Command(BaseCommand):
+    help = 'Refresh frequently requested TMDB lists into the response cache on a schedule'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--once', action='store_true', help='Warm every target once and exit')
+        parser.add_argument('--only', default='', help='Comma-separated target names to warm')
+
+    def handle(self, *args, **options):
+        if tmdb_service.cache is None:
+            self.stderr.write('TMDB_CACHE_ENABLED is off; nothing to prewarm')
+            return
+        alias = getattr(settings, 'TMDB_CACHE_ALIAS', 'default')
+        if isinstance(caches[alias], LocMemCache):
+            self.stderr.write(self.style.WARNING(
+                f"Cache '{alias}' is process-local; web workers will not see the warmed entries"
+            ))
+
+        only = {name.strip() for name in options['only'].split(',') if name.strip()}
+        scheduler = PrewarmScheduler(tmdb_service, only=only)
+        if not scheduler.targets:
+            self.stderr.write('No prewarm targets configured')
+            return
+
+        if options['once']:
+            started = time.monotonic()
+            for target in scheduler.targets:
+                warmed, failed, stale = scheduler.run_target(target)
+                self.stdout.write(f"{target.name}: {warmed} warmed, {failed} failed ({stale} served stale)")
+            self.stdout.write(self.style.SUCCESS(f"Prewarm finished in {time.monotonic() - started:.1f}s"))
+            return
+
+        self.stdout.write(f"Prewarming {', '.join(t.name for t in scheduler.targets)} (Ctrl+C to stop)")
+        try:
+            scheduler.run_forever()
+        except KeyboardInterrupt:
+            pass
@@ -0,0 +1,63 @@
+"""
+Invalidate cached movies that changed on TMDB.
+
+    python manage.py sync_tmdb_changes                   # run as a worker, on one host
+    python manage.py sync_tmdb_changes --once            # one poll, e.g. from cron
+    python manage.py sync_tmdb_changes --replay changes.json
+
+--replay applies a recorded movie/changes response (one page or a list of
+pages) without calling TMDB. Set TMDB_CHANGE_FEED_ENABLED alongside the
+worker so movie details are cached for TMDB_CHANGE_FEED_TTL.
+"""
+import json
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from movies.change_feed import ChangeFeed
+from movies.tmdb_service import tmdb_service
+
+
+class Command(BaseCommand):
+    help = "Invalidate cached movie details, credits and videos listed in TMDB's movie/changes feed"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--once', action='store_true', help='Poll once and exit')
+        parser.add_argument('--replay', metavar='FILE', help='Apply a recorded movie/changes response and exit')
+        parser.add_argument('--no-refresh', action='store_true', help='Only drop changed entries, never reload them')
+
+    def handle(self, *args, **options):
+        feed = ChangeFeed(tmdb_service, refresh=False if options['no_refresh'] else None)
+
+        if options['replay']:
+            try:
+                with open(options['replay']) as f:
+                    pages = json.load(f)
+            except (OSError, ValueError) as e:
+                raise CommandError(f"Cannot read {options['replay']}: {e}")
+            changed = feed.replay(pages if isinstance(pages, list) else [pages])
+            self.stdout.write(self._summary(feed, changed))
+            return
+
+        if not getattr(settings, 'TMDB_CHANGE_FEED_ENABLED', False):
+            self.stderr.write(self.style.WARNING(
+                'TMDB_CHANGE_FEED_ENABLED is off: web workers keep the default detail TTLs'
+            ))
+
+        if options['once']:
+            changed = feed.poll()
+            if changed is None:
+                raise CommandError('TMDB change feed could not be read')
+            self.stdout.write(self._summary(feed, changed))
+            return
+
+        self.stdout.write('Following the TMDB change feed (Ctrl+C to stop)')
+        try:
+            feed.run_forever()
+        except KeyboardInterrupt:
+            pass
+
+    def _summary(self, feed, changed):
+        return self.style.SUCCESS(
+            f"{changed} movies changed: {feed.refreshed} entries reloaded, {feed.dropped} dropped"
+        )
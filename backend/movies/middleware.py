@@ -0,0 +1,278 @@
+"""
+Response cache for the public movie endpoints
+Anonymous GETs under settings.MOVIES_RESPONSE_CACHE_PREFIXES are answered
+from the final response bytes, stored plain and pre-compressed (gzip and,
+when the brotli package is installed, br), so a hit runs neither the view
+nor the renderer. Each stored response remembers which TMDB cache entries
+it was built from and their versions; it is dropped as soon as one of them
+is refreshed, deleted or stops being fresh.
+
+Every 200 under those prefixes carries a strong ETag, the hash of its plain
+body (suffixed per content coding), and If-None-Match is answered with 304.
+Cached responses are public for up to MOVIES_HTTP_MAX_AGE seconds, never
+past the freshness of their TMDB entries, so browsers and CDNs absorb repeat
+requests; anything else must be revalidated.
+"""
+import asyncio
+import gzip
+import hashlib
+import threading
+import time
+from collections import namedtuple
+from urllib.parse import urlencode
+
+from django.conf import settings
+from django.http import HttpResponse, HttpResponseNotModified
+from django.utils.cache import patch_vary_headers
+
+from .cache import CacheEntry, LRUCache
+from .tmdb_service import TMDBService, tmdb_service
+
+try:
+    import brotli
+except ImportError:  # Optional: gzip only
+    brotli = None
+
+
+MIN_COMPRESS_LENGTH = 256
+# Set per response by the cache itself, never copied from the stored one
+SKIPPED_HEADERS = {'content-length', 'content-encoding', 'set-cookie', 'vary', 'etag', 'cache-control'}
+
+
+class StoredResponse(namedtuple('StoredResponse', [
+        'headers', 'vary', 'identity', 'gzip', 'br', 'dependencies', 'etag', 'fresh_until'])):
+    __slots__ = ()
+
+
+def content_hash(body):
+    return hashlib.blake2b(body, digest_size=16).hexdigest()
+
+
+def etag_for(content, encoding=None):
+    """Strong ETag of one representation: the plain body's hash, plus the coding if compressed"""
+    return f'"{content}-{encoding}"' if encoding else f'"{content}"'
+
+
+def etag_matches(request, content):
+    """Whether If-None-Match names any representation of ``content`` (weak comparison, as for GET)"""
+    header = request.META.get('HTTP_IF_NONE_MATCH')
+    if not header:
+        return False
+    if header.strip() == '*':
+        return True
+    for tag in header.split(','):
+        tag = tag.strip()
+        if tag.startswith('W/'):
+            tag = tag[2:]
+        if tag.strip('"').split('-')[0] == content:
+            return True
+    return False
+
+
+def accepted_encodings(header):
+    """Content codings the client accepts (q > 0) from an Accept-Encoding header"""
+    encodings = set()
+    for part in header.split(','):
+        coding, _, params = part.strip().partition(';')
+        q = params.strip()
+        if q.startswith('q='):
+            try:
+                if float(q[2:]) <= 0:
+                    continue
+            except ValueError:
+                continue
+        if coding:
+            encodings.add(coding.strip().lower())
+    return encodings
+
+
+class ResponseCache:
+    """Per-process store of rendered responses, validated against the TMDB cache"""
+
+    def __init__(self, max_entries=None, prefixes=None, max_age=None, http_max_age=None):
+        self.enabled = getattr(settings, 'MOVIES_RESPONSE_CACHE_ENABLED', True)
+        self.entries = LRUCache(max_entries or getattr(settings, 'MOVIES_RESPONSE_CACHE_MAX_ENTRIES', 512))
+        self.prefixes = tuple(prefixes or getattr(settings, 'MOVIES_RESPONSE_CACHE_PREFIXES', ['/api/movies/']))
+        self.max_age = max_age or getattr(settings, 'MOVIES_RESPONSE_CACHE_MAX_AGE', 3600)
+        self.http_max_age = http_max_age if http_max_age is not None else getattr(settings, 'MOVIES_HTTP_MAX_AGE', 60)
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.stored = 0
+        self.invalidated = 0
+        self.uncacheable = 0
+        self.not_modified = 0
+
+    def _count(self, counter):
+        with self._lock:
+            setattr(self, counter, getattr(self, counter) + 1)
+
+    def applies(self, request):
+        """Whether ``request`` is a GET for a movie endpoint, which gets ETags at least"""
+        return request.method == 'GET' and request.path.startswith(self.prefixes)
+
+    def accepts(self, request):
+        """Whether ``request`` may be answered from, and stored in, the cache"""
+        return (self.enabled and tmdb_service.cache is not None
+                and self.applies(request)
+                and 'HTTP_AUTHORIZATION' not in request.META
+                and 'text/html' not in request.META.get('HTTP_ACCEPT', ''))
+
+    @staticmethod
+    def key_for(request):
+        """Canonical URL: the path plus the query parameters in sorted order"""
+        query = urlencode(sorted((key, sorted(values)) for key, values in request.GET.lists()), doseq=True)
+        return f"{request.path}?{query}"
+
+    def get(self, key):
+        entry = self.entries.get(key)
+        if entry is None:
+            self._count('misses')
+            return None
+        stored = entry.value
+        cache = tmdb_service.cache
+        if any(cache.version(dependency) != version for dependency, version in stored.dependencies):
+            self.entries.delete(key)
+            self._count('invalidated')
+            self._count('misses')
+            return None
+        self._count('hits')
+        return stored
+
+    def store(self, key, response, dependencies):
+        """Keep a rendered 200 built only from fresh TMDB entries; returns the StoredResponse or None"""
+        if (response.status_code != 200 or response.streaming or response.cookies
+                or response.has_header('Content-Encoding')
+                or not response.get('Content-Type', '').startswith('application/json')
+                or not dependencies or any(version is None for _, version in dependencies)):
+            self._count('uncacheable')
+            return None
+        body = response.content
+        compress = len(body) >= MIN_COMPRESS_LENGTH
+        vary = response.get('Vary', '')
+        stored = StoredResponse(
+            headers=[(name, value) for name, value in response.items() if name.lower() not in SKIPPED_HEADERS],
+            vary=[field.strip() for field in vary.split(',') if field.strip()],
+            identity=body,
+            gzip=gzip.compress(body, 6, mtime=0) if compress else None,
+            br=brotli.compress(body, quality=5) if compress and brotli is not None else None,
+            dependencies=tuple(dict(dependencies).items()),
+            etag=content_hash(body),
+            fresh_until=min(version for _, version in dependencies),
+        )
+        now = time.time()
+        self.entries.set(key, CacheEntry(stored, now + self.max_age, now + self.max_age))
+        self._count('stored')
+        return stored
+
+    def respond(self, request, stored, status):
+        """HttpResponse for ``stored`` in the best encoding ``request`` accepts, or 304 if the client has it"""
+        encodings = accepted_encodings(request.META.get('HTTP_ACCEPT_ENCODING', ''))
+        if stored.br is not None and 'br' in encodings:
+            body, encoding = stored.br, 'br'
+        elif stored.gzip is not None and 'gzip' in encodings:
+            body, encoding = stored.gzip, 'gzip'
+        else:
+            body, encoding = stored.identity, None
+        if etag_matches(request, stored.etag):
+            self._count('not_modified')
+            response = HttpResponseNotModified()
+        else:
+            response = HttpResponse(body)
+            for name, value in stored.headers:
+                response[name] = value
+            if encoding:
+                response['Content-Encoding'] = encoding
+            response['Content-Length'] = str(len(body))
+        max_age = max(0, min(self.http_max_age, int(stored.fresh_until - time.time())))
+        response['ETag'] = etag_for(stored.etag, encoding)
+        response['Cache-Control'] = f'public, max-age={max_age}'
+        response['X-Response-Cache'] = status
+        patch_vary_headers(response, stored.vary + ['Accept-Encoding'])
+        return response
+
+    def conditional(self, request, response):
+        """ETag a 200 the cache does not keep, and answer 304 if the client already has it"""
+        if (response.status_code != 200 or response.streaming
+                or response.has_header('ETag') or response.has_header('Content-Encoding')):
+            return response
+        etag = content_hash(response.content)
+        if etag_matches(request, etag):
+            self._count('not_modified')
+            not_modified = HttpResponseNotModified()
+            for name in ('Vary', 'Content-Location', 'Expires'):
+                if response.has_header(name):
+                    not_modified[name] = response[name]
+            response = not_modified
+        response['ETag'] = etag_for(etag)
+        if not response.has_header('Cache-Control'):
+            response['Cache-Control'] = 'private, no-cache' if 'HTTP_AUTHORIZATION' in request.META else 'no-cache'
+        return response
+
+    def clear(self):
+        self.entries.clear()
+
+    def get_stats(self):
+        with self._lock:
+            return {
+                'enabled': self.enabled,
+                'entries': len(self.entries),
+                'hits': self.hits,
+                'misses': self.misses,
+                'stored': self.stored,
+                'invalidated': self.invalidated,
+                'uncacheable': self.uncacheable,
+                'not_modified': self.not_modified,
+                'brotli': brotli is not None,
+            }
+
+
+response_cache = ResponseCache()
+
+
+class ResponseCacheMiddleware:
+    """Serves cached movie responses; works under both WSGI and ASGI"""
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if asyncio.iscoroutinefunction(get_response):
+            # Lets Django call us as a coroutine function, as MiddlewareMixin does
+            self._is_coroutine = asyncio.coroutines._is_coroutine
+
+    def __call__(self, request):
+        if asyncio.iscoroutinefunction(self.get_response):
+            return self.__acall__(request)
+        if not response_cache.applies(request):
+            return self.get_response(request)
+        if not response_cache.accepts(request):
+            return response_cache.conditional(request, self.get_response(request))
+        key = response_cache.key_for(request)
+        stored = response_cache.get(key)
+        if stored is not None:
+            return response_cache.respond(request, stored, 'HIT')
+        with TMDBService.track_dependencies() as dependencies:
+            response = self.get_response(request)
+        return self._store(request, key, response, dependencies)
+
+    async def __acall__(self, request):
+        if not response_cache.applies(request):
+            return await self.get_response(request)
+        if not response_cache.accepts(request):
+            return response_cache.conditional(request, await self.get_response(request))
+        key = response_cache.key_for(request)
+        stored = response_cache.get(key)
+        if stored is not None:
+            return response_cache.respond(request, stored, 'HIT')
+        with TMDBService.track_dependencies() as dependencies:
+            response = await self.get_response(request)
+        return self._store(request, key, response, dependencies)
+
+    @staticmethod
+    def _store(request, key, response, dependencies):
+        stored = response_cache.store(key, response, dependencies)
+        if stored is None:
+            return response_cache.conditional(request, response)
+        # Answer this client from the stored copy too, so it gets the compressed variant
+        return response_cache.respond(request, stored, 'MISS')
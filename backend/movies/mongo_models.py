@@ -0,0 +1,94 @@
+"""
+MongoEngine Models for Movies
+=============================
+
+Shared state for the TMDB client that every gunicorn worker on every node
+must see, stored in the same MongoDB as the rest of the app.
+"""
+
+from mongoengine import (Document, StringField, FloatField, DateTimeField, IntField, ListField,
+                         DictField, BooleanField, BinaryField)
+
+
+class TMDBRateLimitBucket(Document):
+    """Token bucket shared by all workers calling TMDB"""
+    name = StringField(primary_key=True)
+    tokens = FloatField()
+    updated_at = DateTimeField()
+    
+    meta = {
+        'collection': 'tmdb_rate_limits',
+    }
+
+
+class TMDBMovieDocument(Document):
+    """TMDB movie details persisted so repeat detail lookups skip the API"""
+    movie_id = IntField(required=True, unique=True)  # TMDB movie ID
+    title = StringField(default='')
+    overview = StringField(default='')
+    poster_path = StringField()
+    backdrop_path = StringField()
+    release_date = StringField(default='')
+    vote_average = FloatField(default=0)
+    vote_count = IntField(default=0)
+    runtime = IntField()
+    genres = ListField(DictField())
+    popularity = FloatField(default=0)
+    adult = BooleanField(default=False)
+    
+    # Raw TMDB response body, served as-is
+    data = BinaryField()
+    
+    # Cache metadata
+    cached_at = DateTimeField()
+    updated_at = DateTimeField()
+    refresh_after = DateTimeField()
+    
+    meta = {
+        'collection': 'movie_cache',
+        'indexes': ['movie_id', 'refresh_after', '-popularity'],
+    }
+    
+    def __str__(self):
+        return self.title
+
+
+class TMDBLastKnownGood(Document):
+    """Last successful TMDB response per cache key, served during outages"""
+    key = StringField(primary_key=True)  # TMDB response cache key
+    endpoint = StringField()
+    data = BinaryField()
+    content_hash = StringField()
+    saved_at = DateTimeField()
+    
+    meta = {
+        'collection': 'tmdb_last_known_good',
+        'indexes': ['saved_at'],
+    }
+
+
+class TMDBCacheWorker(Document):
+    """TMDB cache counters each web worker publishes for the cache admin API"""
+    worker = StringField(primary_key=True)  # host:pid
+    node = StringField()
+    stats = DictField()
+    seen_at = DateTimeField()
+    
+    meta = {
+        'collection': 'tmdb_cache_workers',
+        'indexes': [{'fields': ['seen_at'], 'expireAfterSeconds': 3600}],
+    }
+
+
+class TMDBCachePurge(Document):
+    """A purge requested on one worker, replayed by every other worker"""
+    pattern = StringField(default='')  # Glob over cache keys
+    keys = ListField(StringField())  # Or exact cache keys, e.g. from the change feed
+    origin = StringField()  # Worker that already applied it
+    requested_by = StringField(default='')
+    created_at = DateTimeField()
+    
+    meta = {
+        'collection': 'tmdb_cache_purges',
+        'indexes': [{'fields': ['created_at'], 'expireAfterSeconds': 24 * 3600}],
+    }
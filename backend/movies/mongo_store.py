@@ -0,0 +1,335 @@
+"""
+MongoDB-backed stores for TMDB data
+Persistent tiers behind the response cache. Every store call runs under a
+short timeout and the store is skipped for a while after an error, so a
+MongoDB outage never adds latency to movie requests.
+"""
+import fnmatch
+import hashlib
+import logging
+import os
+import threading
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+from datetime import datetime, timedelta, timezone
+
+import pymongo
+from django.conf import settings
+from pymongo.errors import PyMongoError
+
+from .cache import KEY_PREFIX, endpoint_family
+from .mongo_models import TMDBLastKnownGood, TMDBMovieDocument
+
+
+logger = logging.getLogger(__name__)
+
+
+class StoreUnavailable(Exception):
+    """The store is backing off after an error"""
+
+
+class MongoStoreGuard:
+    """Short timeouts plus a back-off window after MongoDB errors"""
+
+    def __init__(self, name, timeout=None, backoff=None):
+        self.name = name
+        self.timeout = timeout or getattr(settings, 'TMDB_STORE_TIMEOUT', 0.25)
+        self.backoff = backoff or getattr(settings, 'TMDB_STORE_BACKOFF', 30)
+        self._retry_at = 0
+        self._lock = threading.Lock()
+        self.errors = 0
+
+    @property
+    def available(self):
+        return time.monotonic() >= self._retry_at
+
+    @contextmanager
+    def call(self):
+        """Run a store operation; raises StoreUnavailable while backing off or on error"""
+        if not self.available:
+            raise StoreUnavailable(self.name)
+        try:
+            with pymongo.timeout(self.timeout):
+                yield
+        except PyMongoError as e:
+            with self._lock:
+                self.errors += 1
+                self._retry_at = time.monotonic() + self.backoff
+            logger.warning(f"{self.name} store unavailable: {e}")
+            raise StoreUnavailable(self.name) from e
+
+    def get_stats(self):
+        return {
+            'available': self.available,
+            'errors': self.errors,
+        }
+
+
+class StoreWriter:
+    """
+    Runs durable store writes on their own thread, off the request path and
+    apart from the stale-while-revalidate refresh pool. At most one write
+    per key is pending and a newer one replaces it, so the last body wins;
+    when the queue is full, writes are dropped rather than waited for.
+    """
+
+    def __init__(self, max_pending=None):
+        self.max_pending = max_pending or getattr(settings, 'TMDB_STORE_WRITE_MAX_PENDING', 500)
+        self._pending = OrderedDict()
+        self._condition = threading.Condition()
+        self._pid = None
+        self.queued = 0
+        self.replaced = 0
+        self.dropped = 0
+        self.written = 0
+        self.failed = 0
+
+    def submit(self, key, func, *args):
+        """Queue ``func(*args)`` as the write for ``key``; returns False if the queue is full"""
+        with self._condition:
+            if key in self._pending:
+                self.replaced += 1
+            elif len(self._pending) >= self.max_pending:
+                self.dropped += 1
+                return False
+            else:
+                self.queued += 1
+            self._pending[key] = (func, args)
+            if self._pid != os.getpid():
+                # First write in this process (threads are not inherited across fork)
+                self._pid = os.getpid()
+                threading.Thread(target=self._run, name='tmdb-store-writer', daemon=True).start()
+            self._condition.notify()
+        return True
+
+    def _run(self):
+        while True:
+            with self._condition:
+                while not self._pending:
+                    self._condition.wait()
+                key, (func, args) = self._pending.popitem(last=False)
+            self._write(key, func, args)
+
+    def _write(self, key, func, args):
+        try:
+            func(*args)
+        except Exception as e:
+            with self._condition:
+                self.failed += 1
+            logger.warning(f"TMDB store write {key} failed: {e}")
+        else:
+            with self._condition:
+                self.written += 1
+
+    def drain(self):
+        """Run every pending write in the calling thread, e.g. before shutdown"""
+        while True:
+            with self._condition:
+                if not self._pending:
+                    return
+                key, (func, args) = self._pending.popitem(last=False)
+            self._write(key, func, args)
+
+    def get_stats(self):
+        with self._condition:
+            return {
+                'pending': len(self._pending),
+                'queued': self.queued,
+                'replaced': self.replaced,
+                'dropped': self.dropped,
+                'written': self.written,
+                'failed': self.failed,
+            }
+
+
+class MovieStore:
+    """Read-through store of TMDB movie detail documents"""
+
+    def __init__(self, refresh_after=None):
+        self.refresh_after = refresh_after or getattr(settings, 'TMDB_MOVIE_STORE_REFRESH_AFTER', 24 * 60 * 60)
+        self.guard = MongoStoreGuard('Movie')
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.stale_hits = 0
+        self.misses = 0
+        self.writes = 0
+
+    def _count(self, counter):
+        with self._lock:
+            setattr(self, counter, getattr(self, counter) + 1)
+
+    def get(self, movie_id):
+        """Return (body, is_fresh) for a stored movie, or (None, False)"""
+        try:
+            with self.guard.call():
+                doc = TMDBMovieDocument.objects(movie_id=int(movie_id)).only('data', 'refresh_after').first()
+        except StoreUnavailable:
+            return None, False
+        if doc is None or not doc.data:
+            self._count('misses')
+            return None, False
+        refresh_after = doc.refresh_after
+        if refresh_after is not None and refresh_after.tzinfo is None:
+            refresh_after = refresh_after.replace(tzinfo=timezone.utc)
+        is_fresh = refresh_after is None or refresh_after > datetime.now(timezone.utc)
+        self._count('hits' if is_fresh else 'stale_hits')
+        return doc.data, is_fresh
+
+    def save(self, movie_id, body, details):
+        """Upsert the raw TMDB body plus the fields worth querying"""
+        now = datetime.now(timezone.utc)
+        try:
+            with self.guard.call():
+                TMDBMovieDocument.objects(movie_id=int(movie_id)).update_one(
+                    upsert=True,
+                    set__title=details.get('title') or '',
+                    set__overview=details.get('overview') or '',
+                    set__poster_path=details.get('poster_path'),
+                    set__backdrop_path=details.get('backdrop_path'),
+                    set__release_date=details.get('release_date') or '',
+                    set__vote_average=details.get('vote_average') or 0,
+                    set__vote_count=details.get('vote_count') or 0,
+                    set__runtime=details.get('runtime'),
+                    set__genres=details.get('genres') or [],
+                    set__popularity=details.get('popularity') or 0,
+                    set__adult=bool(details.get('adult')),
+                    set__data=body,
+                    set__updated_at=now,
+                    set__refresh_after=now + timedelta(seconds=self.refresh_after),
+                    set_on_insert__cached_at=now,
+                )
+        except StoreUnavailable:
+            return False
+        self._count('writes')
+        return True
+
+    def delete(self, movie_id):
+        try:
+            with self.guard.call():
+                TMDBMovieDocument.objects(movie_id=int(movie_id)).delete()
+        except StoreUnavailable:
+            return False
+        return True
+
+    def expire(self, movie_ids):
+        """Mark stored movies for reloading from TMDB, keeping the copies for outages"""
+        if not movie_ids:
+            return 0
+        try:
+            with self.guard.call():
+                return TMDBMovieDocument.objects(movie_id__in=[int(movie_id) for movie_id in movie_ids]).update(
+                    set__refresh_after=datetime.now(timezone.utc),
+                )
+        except StoreUnavailable:
+            return 0
+
+    def expire_matching(self, key_glob):
+        """Mark stored movies whose details cache key matches ``key_glob`` for reloading"""
+        key = {'$concat': [f"{KEY_PREFIX}movie/", {'$toString': '$movie_id'}]}
+        try:
+            with self.guard.call():
+                return TMDBMovieDocument.objects(__raw__={
+                    '$expr': {'$regexMatch': {'input': key, 'regex': fnmatch.translate(key_glob)}},
+                }).update(set__refresh_after=datetime.now(timezone.utc))
+        except StoreUnavailable:
+            return 0
+
+    def get_stats(self):
+        with self._lock:
+            stats = {
+                'hits': self.hits,
+                'stale_hits': self.stale_hits,
+                'misses': self.misses,
+                'writes': self.writes,
+                'refresh_after_seconds': self.refresh_after,
+            }
+        stats.update(self.guard.get_stats())
+        return stats
+
+
+class LastKnownGoodStore:
+    """Durable copy of the last successful response for each cache key"""
+
+    # Search results are too many and too short-lived to be worth keeping
+    SKIP_FAMILIES = {'search'}
+
+    def __init__(self, max_tracked=4096):
+        self.guard = MongoStoreGuard('Last-known-good')
+        self.max_tracked = max_tracked
+        self._saved_hashes = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.writes = 0
+        self.unchanged = 0
+
+    def _count(self, counter):
+        with self._lock:
+            setattr(self, counter, getattr(self, counter) + 1)
+
+    def accepts(self, endpoint):
+        return endpoint_family(endpoint) not in self.SKIP_FAMILIES
+
+    def delete_matching(self, key_glob):
+        """Drop the stored bodies whose cache key matches ``key_glob``; returns how many"""
+        regex = fnmatch.translate(key_glob)
+        try:
+            with self.guard.call():
+                deleted = TMDBLastKnownGood.objects(__raw__={'_id': {'$regex': regex}}).delete()
+        except StoreUnavailable:
+            return 0
+        with self._lock:
+            for key in [key for key in self._saved_hashes if fnmatch.fnmatchcase(key, key_glob)]:
+                del self._saved_hashes[key]
+        return deleted
+
+    def get(self, key):
+        """Stored body for ``key``, or None"""
+        try:
+            with self.guard.call():
+                doc = TMDBLastKnownGood.objects(key=key).only('data').first()
+        except StoreUnavailable:
+            return None
+        if doc is None or not doc.data:
+            self._count('misses')
+            return None
+        self._count('hits')
+        return doc.data
+
+    def save(self, key, endpoint, body):
+        """Upsert ``body`` unless this process already stored identical bytes"""
+        content_hash = hashlib.blake2b(body, digest_size=16).hexdigest()
+        with self._lock:
+            if self._saved_hashes.get(key) == content_hash:
+                self.unchanged += 1
+                return True
+        try:
+            with self.guard.call():
+                TMDBLastKnownGood.objects(key=key).update_one(
+                    upsert=True,
+                    set__endpoint=endpoint,
+                    set__data=body,
+                    set__content_hash=content_hash,
+                    set__saved_at=datetime.now(timezone.utc),
+                )
+        except StoreUnavailable:
+            return False
+        with self._lock:
+            self.writes += 1
+            self._saved_hashes[key] = content_hash
+            self._saved_hashes.move_to_end(key)
+            while len(self._saved_hashes) > self.max_tracked:
+                self._saved_hashes.popitem(last=False)
+        return True
+
+    def get_stats(self):
+        with self._lock:
+            stats = {
+                'hits': self.hits,
+                'misses': self.misses,
+                'writes': self.writes,
+                'unchanged': self.unchanged,
+            }
+        stats.update(self.guard.get_stats())
+        return stats
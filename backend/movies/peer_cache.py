@@ -0,0 +1,166 @@
+"""
+Peer cache across backend nodes
+Each TMDB cache key has one owner node, picked by consistent hashing over
+settings.TMDB_PEER_NODES. Other nodes ask the owner over HTTP
+(/api/core/peer-cache/) instead of calling TMDB themselves and keep a
+short-lived local replica of what they get, so the cluster holds about one
+copy per key and fetches it from TMDB once.
+"""
+import bisect
+import contextvars
+import hashlib
+import hmac
+import json
+import logging
+import re
+import threading
+import time
+from contextlib import contextmanager
+
+import requests
+from django.conf import settings
+from requests.adapters import HTTPAdapter
+
+from .cache import CacheEntry
+
+
+logger = logging.getLogger(__name__)
+
+PEER_PATH = '/api/core/peer-cache/'
+TOKEN_HEADER = 'X-Peer-Token'
+
+ENDPOINT_RE = re.compile(r'[a-z0-9_]+(/[a-z0-9_]+)*')
+
+_serving_peer = contextvars.ContextVar('tmdb_serving_peer', default=False)
+
+
+def _point(value):
+    return int.from_bytes(hashlib.blake2b(value.encode(), digest_size=8).digest(), 'big')
+
+
+class HashRing:
+    """Consistent hash ring with virtual nodes"""
+
+    def __init__(self, nodes, vnodes=100):
+        self.nodes = sorted(set(nodes))
+        self._points = []
+        self._owners = []
+        for point, node in sorted((_point(f"{node}#{i}"), node) for node in self.nodes for i in range(vnodes)):
+            self._points.append(point)
+            self._owners.append(node)
+
+    def owner(self, key):
+        if not self._points:
+            return None
+        index = bisect.bisect(self._points, _point(key)) % len(self._points)
+        return self._owners[index]
+
+
+class PeerCache:
+    """Routes cache misses to the owning node and replicates hot keys locally"""
+
+    def __init__(self, nodes=None, self_url=None, secret=None, timeout=None, replica_ttl=None, retry_after=None):
+        nodes = nodes if nodes is not None else getattr(settings, 'TMDB_PEER_NODES', [])
+        self.nodes = [node.rstrip('/') for node in nodes]
+        self.self_url = (self_url or getattr(settings, 'TMDB_PEER_SELF', '')).rstrip('/')
+        self.secret = secret or getattr(settings, 'TMDB_PEER_SECRET', '')
+        self.timeout = timeout or getattr(settings, 'TMDB_PEER_TIMEOUT', (0.2, 2.0))
+        self.replica_ttl = replica_ttl or getattr(settings, 'TMDB_PEER_REPLICA_TTL', 30)
+        self.retry_after = retry_after or getattr(settings, 'TMDB_PEER_RETRY_AFTER', 10)
+        self.ring = HashRing(self.nodes, getattr(settings, 'TMDB_PEER_VNODES', 100))
+        self.session = requests.Session()
+        self.session.mount('http://', HTTPAdapter(pool_maxsize=getattr(settings, 'TMDB_HTTP_POOL_SIZE', 10)))
+        self.session.mount('https://', HTTPAdapter(pool_maxsize=getattr(settings, 'TMDB_HTTP_POOL_SIZE', 10)))
+        self._down_until = {}
+        self._lock = threading.Lock()
+        self.forwarded = 0
+        self.peer_hits = 0
+        self.peer_failures = 0
+        self.owned = 0
+        self.served = 0
+
+    @property
+    def configured(self):
+        return bool(self.self_url in self.nodes and self.secret)
+
+    def _count(self, counter):
+        with self._lock:
+            setattr(self, counter, getattr(self, counter) + 1)
+
+    def owner_for(self, key):
+        """Base URL of the node owning ``key``; None when this node should load it"""
+        if _serving_peer.get():
+            return None
+        owner = self.ring.owner(key)
+        if owner is None or owner == self.self_url:
+            self._count('owned')
+            return None
+        if self._down_until.get(owner, 0) > time.monotonic():
+            return None
+        return owner
+
+    def fetch(self, owner, endpoint, params=None):
+        """CacheEntry from ``owner`` for ``endpoint``, or None if it could not answer"""
+        self._count('forwarded')
+        try:
+            response = self.session.get(
+                f"{owner}{PEER_PATH}",
+                params={'endpoint': endpoint, 'params': json.dumps(params or {}, sort_keys=True)},
+                headers={TOKEN_HEADER: self.secret},
+                timeout=self.timeout,
+            )
+        except requests.exceptions.RequestException as e:
+            self._peer_failed(owner, e)
+            return None
+        if response.status_code != 200:
+            # 503: the owner has nothing for us either; not a reason to mark it down
+            if response.status_code != 503:
+                self._peer_failed(owner, response.status_code)
+            return None
+        self._count('peer_hits')
+        fresh_until = float(response.headers.get('X-Cache-Fresh-Until', 0))
+        expires_at = float(response.headers.get('X-Cache-Expires-At', 0))
+        # Replicate only briefly so the owner's refreshes reach us quickly
+        now = time.time()
+        return CacheEntry(response.content, min(fresh_until, now + self.replica_ttl),
+                          min(expires_at, now + self.replica_ttl))
+
+    def _peer_failed(self, owner, error):
+        logger.warning(f"Peer cache {owner} failed: {error}")
+        with self._lock:
+            self.peer_failures += 1
+            self._down_until[owner] = time.monotonic() + self.retry_after
+
+    @staticmethod
+    def valid_request(endpoint, params):
+        """Whether a peer asked for a plausible TMDB endpoint with flat parameters"""
+        return (bool(ENDPOINT_RE.fullmatch(endpoint)) and isinstance(params, dict)
+                and all(isinstance(value, (str, int, float, bool)) for value in params.values()))
+
+    def check_token(self, token):
+        return bool(self.secret) and hmac.compare_digest(token or '', self.secret)
+
+    @contextmanager
+    def serving(self):
+        """Answer a peer: load locally, never forward again"""
+        self._count('served')
+        token = _serving_peer.set(True)
+        try:
+            yield
+        finally:
+            _serving_peer.reset(token)
+
+    def get_stats(self):
+        now = time.monotonic()
+        with self._lock:
+            return {
+                'self': self.self_url,
+                'nodes': self.nodes,
+                'down': [node for node, until in self._down_until.items() if until > now],
+                'owned_lookups': self.owned,
+                'forwarded': self.forwarded,
+                'peer_hits': self.peer_hits,
+                'peer_failures': self.peer_failures,
+                'served_to_peers': self.served,
+                'replica_ttl': self.replica_ttl,
+            }
@@ -0,0 +1,140 @@
+"""
+Cache prewarming
+Reloads the pages every visitor asks for (home page rows, genres, the first
+pages of each genre) on a schedule, ahead of their cache expiry, so user
+requests are answered from the TMDB response cache.
+"""
+import logging
+import threading
+import time
+
+from django.conf import settings
+
+from .dispatch import PREFETCH
+
+
+logger = logging.getLogger(__name__)
+
+# method: TMDBService method, kwargs: fixed arguments, pages: page numbers to
+# warm (omit for unpaged calls), per_genre: call once per TMDB genre ID,
+# interval: seconds between refreshes (keep it below the family's cache TTL).
+# settings.TMDB_PREWARM_TARGETS adds targets or overrides these; None drops one.
+DEFAULT_TARGETS = {
+    'trending': {'method': 'get_trending_movies', 'kwargs': {'time_window': 'day'}, 'pages': [1, 2], 'interval': 5 * 60},
+    'popular': {'method': 'get_popular_movies', 'pages': [1, 2], 'interval': 15 * 60},
+    'top_rated': {'method': 'get_top_rated_movies', 'pages': [1, 2], 'interval': 15 * 60},
+    'genres': {'method': 'get_genres', 'interval': 12 * 60 * 60},
+    'genre_movies': {'method': 'get_movies_by_genre', 'per_genre': True, 'pages': [1], 'interval': 15 * 60},
+}
+
+
+class PrewarmTarget:
+    """One configured group of cache keys and when it is next due"""
+
+    def __init__(self, name, method, interval, kwargs=None, pages=None, per_genre=False):
+        self.name = name
+        self.method = method
+        self.interval = interval
+        self.kwargs = kwargs or {}
+        self.pages = pages
+        self.per_genre = per_genre
+        self.next_run = 0.0
+        self.runs = 0
+        self.warmed = 0
+        self.failed = 0
+        self.stale = 0  # Failures answered from the last-known-good copy (also in failed)
+        self.last_duration = None
+
+    def calls(self, genre_ids):
+        """Keyword arguments for each call this target makes"""
+        base = [dict(self.kwargs, genre_id=genre_id) for genre_id in genre_ids] if self.per_genre else [self.kwargs]
+        if self.pages is None:
+            return base
+        return [dict(kwargs, page=page) for kwargs in base for page in self.pages]
+
+    def get_stats(self):
+        return {
+            'method': self.method,
+            'interval': self.interval,
+            'runs': self.runs,
+            'warmed': self.warmed,
+            'failed': self.failed,
+            'stale': self.stale,
+            'last_duration_ms': round(1000 * self.last_duration, 1) if self.last_duration is not None else None,
+        }
+
+
+class PrewarmScheduler:
+    """Runs due prewarm targets through the service in the prefetch lane"""
+
+    def __init__(self, service, targets=None, only=None):
+        if targets is None:
+            targets = {name: dict(config) for name, config in DEFAULT_TARGETS.items()}
+            for name, overrides in getattr(settings, 'TMDB_PREWARM_TARGETS', {}).items():
+                if overrides is None:
+                    targets.pop(name, None)
+                else:
+                    targets.setdefault(name, {}).update(overrides)
+        self.service = service
+        self.targets = [
+            PrewarmTarget(name, **config)
+            for name, config in targets.items()
+            if not only or name in only
+        ]
+
+    def _genre_ids(self):
+        data = self.service.get_genres() or {}
+        return [genre['id'] for genre in data.get('genres', [])]
+
+    def run_target(self, target):
+        started = time.monotonic()
+        method = getattr(self.service, target.method)
+        warmed = failed = stale = 0
+        with self.service.priority(PREFETCH), self.service.refreshing():
+            genre_ids = self._genre_ids() if target.per_genre else ()
+            for kwargs in target.calls(genre_ids):
+                try:
+                    data = method(**kwargs)
+                except Exception as e:
+                    logger.warning(f"Prewarm {target.name} {kwargs} failed: {e}")
+                    data = None
+                # A last-known-good fallback means TMDB could not be reached
+                is_stale = isinstance(data, dict) and data.get('stale') is True
+                ok = data is not None and not is_stale
+                warmed += ok
+                failed += not ok
+                stale += is_stale
+        if stale:
+            logger.warning(f"Prewarm {target.name}: {stale} calls fell back to the last-known-good copy")
+        target.runs += 1
+        target.warmed += warmed
+        target.failed += failed
+        target.stale += stale
+        target.last_duration = time.monotonic() - started
+        target.next_run = started + target.interval
+        return warmed, failed, stale
+
+    def run_due(self, now=None):
+        """Run every target whose interval has elapsed; returns the names run"""
+        now = time.monotonic() if now is None else now
+        due = [target for target in self.targets if target.next_run <= now]
+        for target in due:
+            self.run_target(target)
+        return [target.name for target in due]
+
+    def seconds_until_due(self):
+        if not self.targets:
+            return None
+        return max(min(target.next_run for target in self.targets) - time.monotonic(), 0.0)
+
+    def run_forever(self, stop_event=None):
+        stop_event = stop_event or threading.Event()
+        while not stop_event.is_set():
+            self.run_due()
+            wait = self.seconds_until_due()
+            if wait is None:
+                return
+            stop_event.wait(wait)
+
+    def get_stats(self):
+        return {target.name: target.get_stats() for target in self.targets}
@@ -0,0 +1,178 @@
+"""
+TMDB rate limiting
+A token bucket kept in MongoDB so every worker on every node draws from the
+same upstream budget. Refill and take happen in one atomic update that
+uses the database clock, so node clock skew does not matter. If MongoDB is
+unreachable the limiter falls back to an in-process bucket.
+"""
+import asyncio
+import threading
+import time
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from pymongo import ReturnDocument
+
+from .mongo_models import TMDBRateLimitBucket
+from .mongo_store import MongoStoreGuard, StoreUnavailable
+
+
+class LocalTokenBucket:
+    """In-process token bucket used when the shared store is unavailable"""
+
+    def __init__(self, rate, capacity):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated_at = time.monotonic()
+        self._lock = threading.Lock()
+
+    def take(self, count=1, reserve=0):
+        """Return (granted, tokens_left); ``reserve`` tokens must remain afterwards"""
+        with self._lock:
+            now = time.monotonic()
+            self.tokens = min(self.capacity, self.tokens + (now - self.updated_at) * self.rate)
+            self.updated_at = now
+            if self.tokens >= count + reserve:
+                self.tokens -= count
+                return True, self.tokens
+            return False, self.tokens
+
+    def drain(self, seconds):
+        with self._lock:
+            self.tokens = -seconds * self.rate
+            self.updated_at = time.monotonic()
+
+
+class SharedRateLimiter:
+    """Token bucket in MongoDB in front of every TMDB request"""
+
+    def __init__(self, name='tmdb', rate=None, capacity=None, max_wait=None):
+        self.name = name
+        self.rate = rate or getattr(settings, 'TMDB_RATE_LIMIT_PER_SECOND', 35)
+        self.capacity = capacity or getattr(settings, 'TMDB_RATE_LIMIT_BURST', 40)
+        self.max_wait = max_wait if max_wait is not None else getattr(settings, 'TMDB_RATE_LIMIT_MAX_WAIT', 0.5)
+        self.guard = MongoStoreGuard('TMDB rate limit',
+                                     timeout=getattr(settings, 'TMDB_RATE_LIMIT_STORE_TIMEOUT', 0.25))
+        self.local = LocalTokenBucket(self.rate, self.capacity)
+        self._lock = threading.Lock()
+        self.granted = 0
+        self.queued = 0
+        self.rejected = 0
+        self.upstream_throttled = 0
+
+    def _refill_pipeline(self, count, reserve):
+        elapsed = {'$divide': [{'$subtract': ['$$NOW', {'$ifNull': ['$updated_at', '$$NOW']}]}, 1000]}
+        refilled = {'$min': [self.capacity, {'$add': [
+            {'$ifNull': ['$tokens', self.capacity]},
+            {'$multiply': [elapsed, self.rate]},
+        ]}]}
+        return [
+            {'$set': {'refilled': refilled}},
+            {'$set': {
+                'granted': {'$gte': ['$refilled', count + reserve]},
+                'tokens': {'$cond': [{'$gte': ['$refilled', count + reserve]},
+                                     {'$subtract': ['$refilled', count]},
+                                     '$refilled']},
+                'updated_at': '$$NOW',
+            }},
+            {'$project': {'refilled': 0}},
+        ]
+
+    def _take_shared(self, count, reserve):
+        with self.guard.call():
+            doc = TMDBRateLimitBucket._get_collection().find_one_and_update(
+                {'_id': self.name},
+                self._refill_pipeline(count, reserve),
+                upsert=True,
+                return_document=ReturnDocument.AFTER,
+            )
+        return doc['granted'], doc['tokens']
+
+    def _take(self, count=1, reserve=0):
+        """Take from the shared bucket, or the local one while the store is down"""
+        try:
+            return self._take_shared(count, reserve)
+        except StoreUnavailable:
+            return self.local.take(count, reserve)
+
+    async def _take_async(self, count=1, reserve=0):
+        # Only the shared bucket does I/O; the local one is taken on the event loop
+        if not self.guard.available:
+            return self.local.take(count, reserve)
+        return await sync_to_async(self._take, thread_sensitive=False)(count, reserve)
+
+    def _decide(self, granted, tokens, reserve, deadline, waited):
+        """(result, None) once the caller is done, else (None, seconds to wait before taking again)"""
+        if granted:
+            with self._lock:
+                self.granted += 1
+                if waited:
+                    self.queued += 1
+            return True, None
+        wait = (1 + reserve - tokens) / self.rate
+        if time.monotonic() + wait > deadline:
+            with self._lock:
+                self.rejected += 1
+            return False, None
+        return None, wait
+
+    def acquire(self, max_wait=None, reserve=0.0):
+        """
+        Wait up to ``max_wait`` seconds for a token; returns False if over budget.
+        ``reserve`` is the share of the burst that must be left for higher-priority callers.
+        """
+        max_wait = self.max_wait if max_wait is None else max_wait
+        reserve = reserve * self.capacity
+        deadline = time.monotonic() + max_wait
+        waited = False
+        while True:
+            granted, tokens = self._take(1, reserve)
+            result, wait = self._decide(granted, tokens, reserve, deadline, waited)
+            if result is not None:
+                return result
+            waited = True
+            time.sleep(wait)
+
+    async def acquire_async(self, max_wait=None, reserve=0.0):
+        """acquire() for the event loop: waits with asyncio.sleep, never in a worker thread"""
+        max_wait = self.max_wait if max_wait is None else max_wait
+        reserve = reserve * self.capacity
+        deadline = time.monotonic() + max_wait
+        waited = False
+        while True:
+            granted, tokens = await self._take_async(1, reserve)
+            result, wait = self._decide(granted, tokens, reserve, deadline, waited)
+            if result is not None:
+                return result
+            waited = True
+            await asyncio.sleep(wait)
+
+    def throttled(self, retry_after=None):
+        """TMDB answered 429: push every worker's bucket into debt for ``retry_after`` seconds"""
+        seconds = retry_after if retry_after is not None else 1.0
+        with self._lock:
+            self.upstream_throttled += 1
+        self.local.drain(seconds)
+        try:
+            with self.guard.call():
+                TMDBRateLimitBucket._get_collection().update_one(
+                    {'_id': self.name},
+                    [{'$set': {'tokens': -seconds * self.rate, 'updated_at': '$$NOW'}}],
+                    upsert=True,
+                )
+        except StoreUnavailable:
+            pass
+
+    def get_stats(self):
+        with self._lock:
+            return {
+                'backend': 'mongo' if self.guard.available else 'local',
+                'rate_per_second': self.rate,
+                'burst': self.capacity,
+                'granted': self.granted,
+                'queued': self.queued,
+                'rejected': self.rejected,
+                'store_errors': self.guard.errors,
+                'upstream_throttled': self.upstream_throttled,
+            }
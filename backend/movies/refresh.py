@@ -0,0 +1,82 @@
+"""
+Background refresh of cached TMDB responses
+A small bounded worker pool used for stale-while-revalidate, so user
+requests never wait on a refresh of data that is already cached.
+"""
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+
+
+logger = logging.getLogger(__name__)
+
+
+class RefreshScheduler:
+    """Runs at most one refresh per key on a bounded thread pool"""
+
+    def __init__(self, max_workers=None, max_pending=None):
+        self.max_workers = max_workers or getattr(settings, 'TMDB_REFRESH_WORKERS', 2)
+        self.max_pending = max_pending or getattr(settings, 'TMDB_REFRESH_MAX_PENDING', 100)
+        self._executor = None
+        self._lock = threading.Lock()
+        self._in_flight = set()
+        self.scheduled = 0
+        self.deduplicated = 0
+        self.dropped = 0
+        self.failed = 0
+
+    @property
+    def executor(self):
+        if self._executor is None:
+            with self._lock:
+                if self._executor is None:
+                    self._executor = ThreadPoolExecutor(
+                        max_workers=self.max_workers,
+                        thread_name_prefix='tmdb-refresh',
+                    )
+        return self._executor
+
+    def schedule(self, key, func, *args, **kwargs):
+        """Queue ``func`` unless a refresh for ``key`` is already pending; returns True if queued"""
+        with self._lock:
+            if key in self._in_flight:
+                self.deduplicated += 1
+                return False
+            if len(self._in_flight) >= self.max_pending:
+                self.dropped += 1
+                return False
+            self._in_flight.add(key)
+            self.scheduled += 1
+
+        try:
+            self.executor.submit(self._run, key, func, args, kwargs)
+        except RuntimeError:
+            # Interpreter shutting down
+            with self._lock:
+                self._in_flight.discard(key)
+            return False
+        return True
+
+    def _run(self, key, func, args, kwargs):
+        try:
+            func(*args, **kwargs)
+        except Exception as e:
+            with self._lock:
+                self.failed += 1
+            logger.warning(f"TMDB background refresh of {key} failed: {e}")
+        finally:
+            with self._lock:
+                self._in_flight.discard(key)
+
+    def get_stats(self):
+        with self._lock:
+            return {
+                'workers': self.max_workers,
+                'pending': len(self._in_flight),
+                'scheduled': self.scheduled,
+                'deduplicated': self.deduplicated,
+                'dropped': self.dropped,
+                'failed': self.failed,
+            }
@@ -0,0 +1,160 @@
+"""
+Failure handling for TMDB calls
+Bounded retries with jittered backoff, a circuit breaker that fails fast
+while TMDB is unhealthy, and a per-request deadline budget.
+"""
+import random
+import threading
+import time
+
+from django.conf import settings
+
+
+# An attempt with less of the budget left than this would only time out
+MIN_ATTEMPT_SECONDS = 0.05
+
+
+class Deadline:
+    """Total time budget for one logical upstream request"""
+
+    def __init__(self, seconds):
+        self.expires_at = time.monotonic() + seconds
+
+    def remaining(self):
+        return max(self.expires_at - time.monotonic(), 0.0)
+
+    @property
+    def expired(self):
+        return self.remaining() <= 0
+
+    def allows_attempt(self):
+        """Whether enough of the budget is left to start another upstream attempt"""
+        return self.remaining() >= MIN_ATTEMPT_SECONDS
+
+
+class RetryPolicy:
+    """Which failures to retry and how long to wait between attempts"""
+
+    RETRYABLE_STATUS = {429, 500, 502, 503, 504}
+
+    def __init__(self, attempts=None, backoff_base=None, backoff_max=None):
+        self.attempts = attempts if attempts is not None else getattr(settings, 'TMDB_RETRY_ATTEMPTS', 2)
+        self.backoff_base = backoff_base or getattr(settings, 'TMDB_RETRY_BACKOFF_BASE', 0.2)
+        self.backoff_max = backoff_max or getattr(settings, 'TMDB_RETRY_BACKOFF_MAX', 2.0)
+        self._lock = threading.Lock()
+        self.retries = 0
+        self.exhausted = 0
+
+    def record_retry(self):
+        with self._lock:
+            self.retries += 1
+
+    def record_exhausted(self):
+        with self._lock:
+            self.exhausted += 1
+
+    def is_retryable_status(self, status_code):
+        return status_code in self.RETRYABLE_STATUS
+
+    def backoff(self, attempt, retry_after=None):
+        """Full-jitter exponential backoff, honouring an upstream Retry-After"""
+        if retry_after is not None:
+            return min(retry_after, self.backoff_max)
+        return random.uniform(0, min(self.backoff_max, self.backoff_base * (2 ** attempt)))
+
+    def get_stats(self):
+        with self._lock:
+            return {
+                'attempts': self.attempts,
+                'retries': self.retries,
+                'exhausted': self.exhausted,
+            }
+
+
+def parse_retry_after(value):
+    """Seconds from a Retry-After header, or None"""
+    try:
+        return max(float(value), 0.0)
+    except (TypeError, ValueError):
+        return None
+
+
+class CircuitBreaker:
+    """
+    Classic three-state breaker.
+    Opens after ``failure_threshold`` consecutive failed requests, rejects
+    calls for ``recovery_timeout`` seconds, then lets a single probe through
+    (half-open) and closes again if it succeeds.
+    """
+
+    CLOSED = 'closed'
+    OPEN = 'open'
+    HALF_OPEN = 'half_open'
+
+    def __init__(self, failure_threshold=None, recovery_timeout=None):
+        self.failure_threshold = failure_threshold or getattr(settings, 'TMDB_CIRCUIT_FAILURE_THRESHOLD', 5)
+        self.recovery_timeout = recovery_timeout or getattr(settings, 'TMDB_CIRCUIT_RECOVERY_TIMEOUT', 30)
+        self._lock = threading.Lock()
+        self.state = self.CLOSED
+        self.consecutive_failures = 0
+        self.opened_at = None
+        self._probe_in_flight = False
+        self.trips = 0
+        self.rejected = 0
+        self.successes = 0
+        self.failures = 0
+
+    def allow_request(self):
+        with self._lock:
+            if self.state == self.CLOSED:
+                return True
+            if self.state == self.OPEN and time.monotonic() - self.opened_at >= self.recovery_timeout:
+                self.state = self.HALF_OPEN
+                self._probe_in_flight = False
+            if self.state == self.HALF_OPEN and not self._probe_in_flight:
+                self._probe_in_flight = True
+                return True
+            self.rejected += 1
+            return False
+
+    def release_probe(self):
+        """The request let through as the half-open probe never reached TMDB; let the next one probe"""
+        with self._lock:
+            if self.state == self.HALF_OPEN:
+                self._probe_in_flight = False
+
+    def record_success(self):
+        with self._lock:
+            self.successes += 1
+            self.consecutive_failures = 0
+            self.state = self.CLOSED
+            self._probe_in_flight = False
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            self.consecutive_failures += 1
+            if self.state == self.HALF_OPEN or self.consecutive_failures >= self.failure_threshold:
+                if self.state != self.OPEN:
+                    self.trips += 1
+                self.state = self.OPEN
+                self.opened_at = time.monotonic()
+                self._probe_in_flight = False
+
+    @property
+    def is_open(self):
+        with self._lock:
+            return self.state != self.CLOSED
+
+    def get_stats(self):
+        with self._lock:
+            return {
+                'state': self.state,
+                'trips': self.trips,
+                'consecutive_failures': self.consecutive_failures,
+                'open_for_seconds': round(time.monotonic() - self.opened_at, 1)
+                if self.state != self.CLOSED and self.opened_at else 0,
+                'rejected': self.rejected,
+                'successes': self.successes,
+                'failures': self.failures,
+            }
@@ -0,0 +1,177 @@
+"""
+Scroll snapshots for list endpoints
+TMDB rankings move between page requests, so plain ?page=N scrolling
+repeats or skips titles. Page 1 of a list now carries an opaque cursor; the
+pages behind it come from a snapshot kept in the shared cache, filled in
+order with titles already shown removed, and the next pages are prefetched
+in the background so scrolling reads them from the cache.
+
+A snapshot is named after the list and the IDs on its first page, so every
+visitor who saw the same page 1 shares one snapshot. If it has expired, the
+cursor still works: up to TMDB_SCROLL_MAX_BACKFILL missing pages are loaded
+again from TMDB, and past that the page is served as plain ?page=N would be.
+"""
+import hashlib
+import json
+import logging
+import threading
+
+from django.conf import settings
+from django.core import signing
+from django.core.cache import caches
+
+from .dispatch import PREFETCH
+
+
+logger = logging.getLogger(__name__)
+
+SALT = 'movies.scroll'
+KEY_PREFIX = 'scroll:'
+# TMDB never serves list pages past 500
+MAX_PAGES = 500
+
+# Service methods that may be scrolled, with the keyword arguments they accept
+SCROLLABLE = {
+    'get_trending_movies': {'time_window'},
+    'get_popular_movies': set(),
+    'get_top_rated_movies': set(),
+    'get_now_playing_movies': set(),
+    'get_upcoming_movies': set(),
+    'get_movies_by_genre': {'genre_id'},
+}
+
+
+class InvalidCursor(Exception):
+    """The cursor was not issued by this server"""
+
+
+def _movie_ids(results):
+    return {movie.get('id') for movie in results}
+
+
+class ScrollSnapshots:
+    """Creates and serves paged snapshots of TMDB list rankings"""
+
+    def __init__(self, service, ttl=None, prefetch_pages=None, max_backfill=None, alias=None):
+        self.service = service
+        self.ttl = ttl or getattr(settings, 'TMDB_SCROLL_SNAPSHOT_TTL', 30 * 60)
+        self.prefetch_pages = prefetch_pages or getattr(settings, 'TMDB_SCROLL_PREFETCH_PAGES', 2)
+        self.max_backfill = max_backfill or getattr(settings, 'TMDB_SCROLL_MAX_BACKFILL', 3)
+        self.alias = alias or getattr(settings, 'TMDB_CACHE_ALIAS', 'default')
+        self._lock = threading.Lock()
+        self.created = 0
+        self.pages_served = 0
+        self.pages_loaded = 0
+        self.duplicates_removed = 0
+        self.unsnapshotted_pages = 0
+
+    @property
+    def cache(self):
+        return caches[self.alias]
+
+    def _count(self, counter, amount=1):
+        with self._lock:
+            setattr(self, counter, getattr(self, counter) + amount)
+
+    @staticmethod
+    def _key(snapshot_id, page):
+        return f"{KEY_PREFIX}{snapshot_id}:{page}"
+
+    @staticmethod
+    def _cursor(token, page):
+        return signing.dumps(dict(token, p=page), salt=SALT, compress=True)
+
+    def first_page(self, method, kwargs, data):
+        """Add a cursor for page 2 to ``data``, the page 1 just served for ``method``"""
+        results = data.get('results', [])
+        total_pages = min(data.get('total_pages') or 1, MAX_PAGES)
+        snapshot_id = hashlib.blake2b(
+            json.dumps([method, kwargs, [movie.get('id') for movie in results]], sort_keys=True).encode(),
+            digest_size=12,
+        ).hexdigest()
+        token = {'s': snapshot_id, 'm': method, 'k': kwargs, 't': total_pages, 'r': data.get('total_results')}
+        try:
+            if self.cache.add(self._key(snapshot_id, 1), results, self.ttl):
+                self._count('created')
+                self._prefetch(token, 2)
+        except Exception as e:
+            logger.warning(f"Scroll snapshot not created: {e}")
+        data['cursor'] = self._cursor(token, 2) if total_pages > 1 else None
+        return data
+
+    def page(self, cursor):
+        """The page a cursor points to, as TMDB shapes it plus the next cursor; None if TMDB failed"""
+        try:
+            token = signing.loads(cursor, salt=SALT)
+            number, method, kwargs = int(token['p']), token['m'], token['k']
+        except (signing.BadSignature, KeyError, TypeError, ValueError):
+            raise InvalidCursor('Invalid cursor')
+        if method not in SCROLLABLE or set(kwargs) - SCROLLABLE[method] or not 1 < number <= MAX_PAGES:
+            raise InvalidCursor('Invalid cursor')
+
+        results = self._load(token, number)
+        if results is None:
+            return None
+        self._count('pages_served')
+        self._prefetch(token, number + 1)
+        return {
+            'page': number,
+            'results': results,
+            'total_pages': token['t'],
+            'total_results': token['r'],
+            'cursor': self._cursor(token, number + 1) if number < token['t'] else None,
+        }
+
+    def _load(self, token, number, fallback=True):
+        """Results of page ``number``, loading any missing earlier pages first so duplicates are dropped"""
+        keys = [self._key(token['s'], page) for page in range(1, number + 1)]
+        stored = self.cache.get_many(keys)
+        if keys[-1] in stored:
+            return stored[keys[-1]]
+
+        method = getattr(self.service, token['m'])
+        if len(keys) - len(stored) > self.max_backfill:
+            # Too much of the snapshot has expired to reload it page by page:
+            # serve the plain TMDB page, as ?page=N would
+            if not fallback:
+                return None
+            data = method(page=number, **token['k'])
+            if not data:
+                return None
+            self._count('unsnapshotted_pages')
+            return data.get('results', [])
+
+        seen = set()
+        for page, key in enumerate(keys, start=1):
+            if key not in stored:
+                data = method(page=page, **token['k'])
+                if not data:
+                    return None
+                results = [movie for movie in data.get('results', []) if movie.get('id') not in seen]
+                self._count('duplicates_removed', len(data.get('results', [])) - len(results))
+                self._count('pages_loaded')
+                # Another worker may have filled this page first; keep its copy so all agree
+                if not self.cache.add(key, results, self.ttl):
+                    results = self.cache.get(key) or results
+                stored[key] = results
+            seen |= _movie_ids(stored[key])
+        return stored[keys[-1]]
+
+    def _prefetch(self, token, start):
+        last = min(start + self.prefetch_pages - 1, token['t'])
+        if start <= last:
+            self.service.refresher.schedule(('scroll', token['s'], last), self._prefetch_pages, token, last)
+
+    def _prefetch_pages(self, token, last):
+        with self.service.priority(PREFETCH):
+            self._load(token, last, fallback=False)
+
+    def get_stats(self):
+        with self._lock:
+            return {
+                'created': self.created,
+                'pages_served': self.pages_served,
+                'pages_loaded': self.pages_loaded,
+                'duplicates_removed': self.duplicates_removed,
+                'unsnapshotted_pages': self.unsnapshotted_pages,
+            }
@@ -0,0 +1,352 @@
+"""
+Node-local shared-memory cache
+One mmap'd file (in /dev/shm by default) shared by every worker process on
+the node, so a TMDB page fetched by one gunicorn worker is a hit for all of
+them and is held in RAM once, zlib-compressed.
+
+Layout: a header, a 4-way set-associative index of fixed-size slots, and a
+data ring written log-style. New entries are appended at the ring head and
+the oldest bytes are overwritten first, which bounds the size. Writers
+serialise on an flock; readers take no lock and instead validate what they
+read: a per-slot sequence number (odd while a slot is being written) and
+the ring head (moved before any bytes are overwritten).
+"""
+import hashlib
+import logging
+import mmap
+import os
+import struct
+import tempfile
+import threading
+import time
+import zlib
+
+from django.conf import settings
+
+try:
+    import fcntl
+except ImportError:  # Not available on Windows; the tier is disabled there
+    fcntl = None
+
+
+logger = logging.getLogger(__name__)
+
+MAGIC = b'MVSHM001'
+HEADER = struct.Struct('<8sIIQQ')  # magic, ways, slots, data size, ring head
+HEADER_SIZE = 64
+HEAD_OFFSET = 24
+SLOT = struct.Struct('<QQQIIdd')  # seq, key hash, ring position, length, pad, fresh_until, expires_at
+SLOT_FIELDS = struct.Struct('<QQIIdd')  # SLOT without the leading seq
+EMPTY_SLOT = (0, 0, 0, 0, 0.0, 0.0)
+WAYS = 4
+ENTRY_PREFIX = struct.Struct('<H')  # key length
+
+
+def _hash(key):
+    return int.from_bytes(hashlib.blake2b(key.encode(), digest_size=8).digest(), 'little') or 1
+
+
+class SharedMemoryCache:
+    """Size-bounded cache of compressed bodies shared by processes on one node"""
+
+    def __init__(self, path=None, size_mb=None, slots=None, compress_level=3):
+        self.size = int((size_mb or getattr(settings, 'TMDB_SHM_CACHE_SIZE_MB', 64)) * 1024 * 1024)
+        self.slots = slots or getattr(settings, 'TMDB_SHM_CACHE_SLOTS', 16384)
+        self.slots -= self.slots % WAYS
+        base = path or getattr(settings, 'TMDB_SHM_CACHE_PATH', None) or self._default_path()
+        # Geometry is part of the name so a config change never reads an old layout
+        self.path = f"{base}-{self.slots}-{self.size}"
+        self.compress_level = compress_level
+        self.data_offset = HEADER_SIZE + self.slots * SLOT.size
+        self.max_entry = self.size // 8
+        self._pid = None
+        self._map = None
+        self._fd = None
+        self._failed = False
+        self._open_lock = threading.Lock()
+        self._write_lock = threading.Lock()
+        self.on_evict = None  # Called with the key of each live entry displaced from its slot
+        self.hits = 0
+        self.misses = 0
+        self.writes = 0
+        self.torn_reads = 0
+        self.too_large = 0
+
+    @staticmethod
+    def _default_path():
+        directory = '/dev/shm' if os.path.isdir('/dev/shm') else tempfile.gettempdir()
+        return os.path.join(directory, 'movies_vault_tmdb_cache')
+
+    @property
+    def available(self):
+        return fcntl is not None and not self._failed
+
+    def _mapping(self):
+        """The mmap for this process, (re)opened after a fork so flock stays per process"""
+        if self._pid == os.getpid():
+            return self._map
+        if not self.available:
+            return None
+        with self._open_lock:
+            if self._pid != os.getpid():
+                try:
+                    self._open()
+                except OSError as e:
+                    logger.warning(f"Shared-memory TMDB cache disabled: {e}")
+                    self._failed = True
+                    return None
+        return self._map
+
+    def _open(self):
+        total = self.data_offset + self.size
+        fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o600)
+        fcntl.flock(fd, fcntl.LOCK_EX)
+        try:
+            if os.fstat(fd).st_size != total:
+                os.ftruncate(fd, total)
+            mapping = mmap.mmap(fd, total)
+            magic, ways, slots, size, _ = HEADER.unpack_from(mapping, 0)
+            if (magic, ways, slots, size) != (MAGIC, WAYS, self.slots, self.size):
+                mapping[:self.data_offset] = bytes(self.data_offset)
+                HEADER.pack_into(mapping, 0, MAGIC, WAYS, self.slots, self.size, 0)
+        finally:
+            fcntl.flock(fd, fcntl.LOCK_UN)
+        self._fd, self._map, self._pid = fd, mapping, os.getpid()
+
+    def _head(self, mapping):
+        return struct.unpack_from('<Q', mapping, HEAD_OFFSET)[0]
+
+    def _bucket(self, key_hash):
+        first = (key_hash % (self.slots // WAYS)) * WAYS
+        return range(first, first + WAYS)
+
+    def _slot_offset(self, index):
+        return HEADER_SIZE + index * SLOT.size
+
+    def _write_slot(self, mapping, index, *fields):
+        """Rewrite a slot; the odd sequence number marks it busy for readers meanwhile"""
+        offset = self._slot_offset(index)
+        seq = struct.unpack_from('<Q', mapping, offset)[0]
+        struct.pack_into('<Q', mapping, offset, seq + 1)
+        SLOT_FIELDS.pack_into(mapping, offset + 8, *fields)
+        struct.pack_into('<Q', mapping, offset, seq + 2)
+
+    def get(self, key, allow_expired=False):
+        """(body, fresh_until, expires_at) for ``key``, or None"""
+        mapping = self._mapping()
+        if mapping is None:
+            return None
+        key_hash = _hash(key)
+        encoded_key = key.encode()
+        for index in self._bucket(key_hash):
+            offset = self._slot_offset(index)
+            seq, slot_hash, pos, length, _, fresh_until, expires_at = SLOT.unpack_from(mapping, offset)
+            if slot_hash != key_hash or seq & 1 or not length:
+                continue
+            if expires_at <= time.time() and not allow_expired:
+                break
+            start = self.data_offset + pos % self.size
+            entry = memoryview(mapping)[start:start + length]
+            try:
+                (key_length,) = ENTRY_PREFIX.unpack_from(entry, 0)
+                body_start = ENTRY_PREFIX.size + key_length
+                if entry[ENTRY_PREFIX.size:body_start] != encoded_key:
+                    break
+                body = zlib.decompress(entry[body_start:])
+            except (struct.error, zlib.error):
+                body = None
+            finally:
+                entry.release()
+            # Valid only if neither the slot nor the ring bytes changed while we read
+            if (body is None or SLOT.unpack_from(mapping, offset)[0] != seq
+                    or self._head(mapping) > pos + self.size):
+                self.torn_reads += 1
+                break
+            self.hits += 1
+            return body, fresh_until, expires_at
+        self.misses += 1
+        return None
+
+    def peek(self, key):
+        """(fresh_until, expires_at) for ``key`` without reading its body, or None"""
+        mapping = self._mapping()
+        if mapping is None:
+            return None
+        key_hash = _hash(key)
+        encoded_key = key.encode()
+        for index in self._bucket(key_hash):
+            offset = self._slot_offset(index)
+            seq, slot_hash, pos, length, _, fresh_until, expires_at = SLOT.unpack_from(mapping, offset)
+            if slot_hash != key_hash or seq & 1 or not length:
+                continue
+            start = self.data_offset + pos % self.size + ENTRY_PREFIX.size
+            matches = mapping[start:start + len(encoded_key)] == encoded_key
+            if (not matches or SLOT.unpack_from(mapping, offset)[0] != seq
+                    or self._head(mapping) > pos + self.size):
+                return None
+            return fresh_until, expires_at
+        return None
+
+    def keys(self):
+        """Yield (key, fresh_until, expires_at) for every unexpired entry, without reading bodies"""
+        mapping = self._mapping()
+        if mapping is None:
+            return
+        now = time.time()
+        for index in range(self.slots):
+            offset = self._slot_offset(index)
+            seq, _, pos, length, _, fresh_until, expires_at = SLOT.unpack_from(mapping, offset)
+            if seq & 1 or not length or expires_at <= now:
+                continue
+            key = self._read_key(mapping, pos)
+            if key is None or SLOT.unpack_from(mapping, offset)[0] != seq or self._head(mapping) > pos + self.size:
+                continue
+            yield key, fresh_until, expires_at
+
+    def _read_key(self, mapping, pos):
+        start = self.data_offset + pos % self.size
+        try:
+            (key_length,) = ENTRY_PREFIX.unpack_from(mapping, start)
+            return bytes(mapping[start + ENTRY_PREFIX.size:start + ENTRY_PREFIX.size + key_length]).decode()
+        except (struct.error, UnicodeDecodeError):
+            return None
+
+    def items(self):
+        """Yield (key, body, fresh_until, expires_at) for every unexpired entry"""
+        mapping = self._mapping()
+        if mapping is None:
+            return
+        now = time.time()
+        for index in range(self.slots):
+            seq, _, pos, length, _, fresh_until, expires_at = SLOT.unpack_from(mapping, self._slot_offset(index))
+            if seq & 1 or not length or expires_at <= now:
+                continue
+            start = self.data_offset + pos % self.size
+            entry = bytes(mapping[start:start + length])
+            if SLOT.unpack_from(mapping, self._slot_offset(index))[0] != seq or self._head(mapping) > pos + self.size:
+                continue
+            try:
+                (key_length,) = ENTRY_PREFIX.unpack_from(entry, 0)
+                body_start = ENTRY_PREFIX.size + key_length
+                key = entry[ENTRY_PREFIX.size:body_start].decode()
+                yield key, zlib.decompress(entry[body_start:]), fresh_until, expires_at
+            except (struct.error, UnicodeDecodeError, zlib.error):
+                continue
+
+    def set(self, key, value, fresh_until, expires_at):
+        mapping = self._mapping()
+        if mapping is None:
+            return False
+        encoded_key = key.encode()
+        entry = (ENTRY_PREFIX.pack(len(encoded_key)) + encoded_key
+                 + zlib.compress(value, self.compress_level))
+        if len(entry) > self.max_entry:
+            self.too_large += 1
+            return False
+        key_hash = _hash(key)
+        evicted = None
+        with self._write_lock:
+            fcntl.flock(self._fd, fcntl.LOCK_EX)
+            try:
+                victim = self._victim(mapping, key_hash)
+                _, victim_hash, victim_pos, victim_length, _, _, victim_expires = SLOT.unpack_from(
+                    mapping, self._slot_offset(victim))
+                if (self.on_evict is not None and victim_length and victim_hash != key_hash
+                        and victim_expires > time.time() and self._head(mapping) <= victim_pos + self.size):
+                    evicted = self._read_key(mapping, victim_pos)
+
+                pos = self._head(mapping)
+                if pos % self.size + len(entry) > self.size:
+                    pos += self.size - pos % self.size  # Entries never wrap around the ring end
+                # Publish the new head before overwriting, so readers can detect it
+                struct.pack_into('<Q', mapping, HEAD_OFFSET, pos + len(entry))
+                start = self.data_offset + pos % self.size
+                mapping[start:start + len(entry)] = entry
+
+                self._write_slot(mapping, victim, key_hash, pos, len(entry), 0, fresh_until, expires_at)
+            finally:
+                fcntl.flock(self._fd, fcntl.LOCK_UN)
+        self.writes += 1
+        if evicted is not None:
+            self.on_evict(evicted)
+        return True
+
+    def _victim(self, mapping, key_hash):
+        """Slot for ``key_hash``: its current slot, else an empty or the oldest one"""
+        head = self._head(mapping)
+        best, best_pos = None, None
+        for index in self._bucket(key_hash):
+            _, slot_hash, pos, length, _, _, _ = SLOT.unpack_from(mapping, self._slot_offset(index))
+            if slot_hash == key_hash:
+                return index
+            if not length or head > pos + self.size:
+                pos = -1  # Empty, or its bytes are already overwritten
+            if best is None or pos < best_pos:
+                best, best_pos = index, pos
+        return best
+
+    def delete(self, key):
+        mapping = self._mapping()
+        if mapping is None:
+            return False
+        key_hash = _hash(key)
+        with self._write_lock:
+            fcntl.flock(self._fd, fcntl.LOCK_EX)
+            try:
+                for index in self._bucket(key_hash):
+                    if struct.unpack_from('<Q', mapping, self._slot_offset(index) + 8)[0] == key_hash:
+                        self._write_slot(mapping, index, *EMPTY_SLOT)
+                        return True
+            finally:
+                fcntl.flock(self._fd, fcntl.LOCK_UN)
+        return False
+
+    def clear(self):
+        mapping = self._mapping()
+        if mapping is None:
+            return
+        with self._write_lock:
+            fcntl.flock(self._fd, fcntl.LOCK_EX)
+            try:
+                for index in range(self.slots):
+                    self._write_slot(mapping, index, *EMPTY_SLOT)
+            finally:
+                fcntl.flock(self._fd, fcntl.LOCK_UN)
+
+    def get_memory(self):
+        """Bytes reserved for the ring and held by live (compressed) entries"""
+        memory = {'size_bytes': self.size, 'live_entries': 0, 'live_bytes': 0}
+        mapping = self._mapping()
+        if mapping is None:
+            return memory
+        head = self._head(mapping)
+        now = time.time()
+        for index in range(self.slots):
+            _, _, pos, length, _, _, expires_at = SLOT.unpack_from(mapping, self._slot_offset(index))
+            if length and expires_at > now and head <= pos + self.size:
+                memory['live_entries'] += 1
+                memory['live_bytes'] += length
+        return memory
+
+    def get_stats(self):
+        stats = {
+            'enabled': self.available,
+            'path': self.path,
+            'size_mb': round(self.size / 1024 / 1024, 1),
+            'hits': self.hits,
+            'misses': self.misses,
+            'writes': self.writes,
+            'torn_reads': self.torn_reads,
+            'too_large': self.too_large,
+        }
+        mapping = self._mapping()
+        if mapping is not None:
+            head = self._head(mapping)
+            now = time.time()
+            live = 0
+            for index in range(self.slots):
+                _, _, pos, length, _, _, expires_at = SLOT.unpack_from(mapping, self._slot_offset(index))
+                live += bool(length) and expires_at > now and head <= pos + self.size
+            stats['live_entries'] = live
+            stats['bytes_written'] = head
+        return stats
@@ -0,0 +1,69 @@
+"""
+Request coalescing for TMDB calls
+Concurrent callers asking for the same key wait on one in-flight call and
+share its result instead of each hitting the upstream API.
+"""
+import threading
+
+
+class _Call:
+    __slots__ = ('done', 'result', 'error', 'waiters')
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+        self.waiters = 0
+
+
+class SingleFlight:
+    """Duplicate call suppression keyed by an arbitrary hashable"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._calls = {}
+        self.executed = 0
+        self.coalesced = 0
+
+    def do(self, key, func, *args, **kwargs):
+        """Run ``func`` once per concurrent ``key`` and hand every caller its result"""
+        with self._lock:
+            call = self._calls.get(key)
+            if call is not None:
+                call.waiters += 1
+                self.coalesced += 1
+                leader = False
+            else:
+                call = self._calls[key] = _Call()
+                self.executed += 1
+                leader = True
+
+        if not leader:
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result
+
+        try:
+            call.result = func(*args, **kwargs)
+        except BaseException as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.done.set()
+        return call.result
+
+    def record_coalesced(self):
+        """Count a caller that was coalesced outside of ``do`` (e.g. on an event loop)"""
+        with self._lock:
+            self.coalesced += 1
+
+    def get_stats(self):
+        with self._lock:
+            return {
+                'in_flight': len(self._calls),
+                'executed': self.executed,
+                'coalesced': self.coalesced,
+            }
@@ -0,0 +1,140 @@
+"""
+TMDB cache snapshots
+The node-local cache tiers are written to a compact file at intervals and
+on graceful shutdown, and read back at startup, so a restarted or
+re-deployed process answers its first requests from cache. Entries keep
+their absolute deadlines, so anything that expired while the process was
+down is skipped on load.
+"""
+import atexit
+import logging
+import os
+import struct
+import threading
+import time
+import zlib
+
+from django.conf import settings
+
+from .cache import CacheEntry
+
+
+logger = logging.getLogger(__name__)
+
+MAGIC = b'MVSNAP01'
+RECORD = struct.Struct('<HIdd')  # key length, value length, fresh_until, expires_at
+
+
+class CacheSnapshot:
+    """Saves and restores the entries of a TMDBResponseCache held on this node"""
+
+    def __init__(self, cache, path=None, interval=None, max_entries=None):
+        self.cache = cache
+        self.path = str(path or getattr(settings, 'TMDB_CACHE_SNAPSHOT_PATH', 'tmdb_cache.snapshot'))
+        self.interval = interval or getattr(settings, 'TMDB_CACHE_SNAPSHOT_INTERVAL', 300)
+        self.max_entries = max_entries or getattr(settings, 'TMDB_CACHE_SNAPSHOT_MAX_ENTRIES', 5000)
+        self._started_pid = None
+        self._stop = threading.Event()
+        self._lock = threading.Lock()
+        self.loaded = 0
+        self.skipped_expired = 0
+        self.load_seconds = None
+        self.saved = 0
+        self.last_saved_at = None
+        self.save_seconds = None
+
+    def save(self):
+        """Write the live local entries atomically; returns how many were written"""
+        started = time.monotonic()
+        compressor = zlib.compressobj(6)
+        chunks = [MAGIC]
+        count = 0
+        for key, entry in self.cache.local_items():
+            if count >= self.max_entries:
+                break
+            encoded_key = key.encode()
+            chunks.append(compressor.compress(
+                RECORD.pack(len(encoded_key), len(entry.value), entry.fresh_until, entry.expires_at)
+                + encoded_key + entry.value
+            ))
+            count += 1
+        chunks.append(compressor.flush())
+
+        temp_path = f"{self.path}.{os.getpid()}.tmp"
+        with self._lock:
+            try:
+                with open(temp_path, 'wb') as f:
+                    for chunk in chunks:
+                        f.write(chunk)
+                os.replace(temp_path, self.path)
+            except OSError as e:
+                logger.warning(f"TMDB cache snapshot not saved: {e}")
+                return 0
+            self.saved = count
+            self.last_saved_at = time.time()
+            self.save_seconds = time.monotonic() - started
+        return count
+
+    def load(self):
+        """Restore unexpired entries into the local tiers; returns how many were loaded"""
+        started = time.monotonic()
+        try:
+            with open(self.path, 'rb') as f:
+                data = f.read()
+        except FileNotFoundError:
+            return 0
+        except OSError as e:
+            logger.warning(f"TMDB cache snapshot not loaded: {e}")
+            return 0
+        if not data.startswith(MAGIC):
+            logger.warning(f"TMDB cache snapshot {self.path} has an unknown format")
+            return 0
+        try:
+            payload = zlib.decompress(data[len(MAGIC):])
+        except zlib.error as e:
+            logger.warning(f"TMDB cache snapshot {self.path} is corrupt: {e}")
+            return 0
+
+        now = time.time()
+        offset = loaded = skipped = 0
+        while offset + RECORD.size <= len(payload):
+            key_length, value_length, fresh_until, expires_at = RECORD.unpack_from(payload, offset)
+            offset += RECORD.size
+            key = payload[offset:offset + key_length].decode()
+            offset += key_length
+            value = payload[offset:offset + value_length]
+            offset += value_length
+            if expires_at <= now:
+                skipped += 1
+                continue
+            self.cache.restore(key, CacheEntry(value, fresh_until, expires_at))
+            loaded += 1
+        self.loaded, self.skipped_expired = loaded, skipped
+        self.load_seconds = time.monotonic() - started
+        return loaded
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            self.save()
+
+    def start(self):
+        """Load the snapshot, then save at intervals and at exit (once per process)"""
+        if self._started_pid == os.getpid():
+            return
+        self._started_pid = os.getpid()
+        count = self.load()
+        if count:
+            logger.info(f"Restored {count} TMDB cache entries from {self.path} in {1000 * self.load_seconds:.0f}ms")
+        threading.Thread(target=self._run, name='tmdb-cache-snapshot', daemon=True).start()
+        atexit.register(self.save)
+
+    def get_stats(self):
+        return {
+            'path': self.path,
+            'loaded': self.loaded,
+            'skipped_expired': self.skipped_expired,
+            'load_ms': round(1000 * self.load_seconds, 1) if self.load_seconds is not None else None,
+            'saved': self.saved,
+            'last_saved_at': self.last_saved_at,
+            'save_ms': round(1000 * self.save_seconds, 1) if self.save_seconds is not None else None,
+        }
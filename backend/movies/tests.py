@@ -1,4 +1,1108 @@
-from django.test import TestCase
+import asyncio
+import json
+import os
+import struct
+import tempfile
+import threading
+import time
+import unittest
+import zlib
+from contextlib import ExitStack, contextmanager, nullcontext
+from datetime import date, datetime, timedelta, timezone
+from concurrent.futures import ThreadPoolExecutor
+from types import SimpleNamespace
+from unittest import mock
 
-# Create your tests here.
+import mongoengine
+from django.core import signing
+from django.http import JsonResponse
+from django.test import RequestFactory, SimpleTestCase, override_settings
 
+from . import shm_cache
+from .cache import make_cache_key
+from .cache_admin import CacheAdmin
+from .change_feed import ChangeFeed, movie_endpoints
+from .dispatch import BULK, INTERACTIVE, PREFETCH, PriorityDispatcher
+from .middleware import ResponseCache, ResponseCacheMiddleware
+from .hedging import HedgePolicy
+from .mongo_models import TMDBCachePurge, TMDBLastKnownGood, TMDBMovieDocument
+from .mongo_store import LastKnownGoodStore, MovieStore, StoreWriter
+from .peer_cache import HashRing, PeerCache
+from .prewarm import PrewarmScheduler
+from .rate_limit import LocalTokenBucket, SharedRateLimiter
+from . import fieldsets, middleware, rate_limit, scroll
+from .adaptive_ttl import GROW, AdaptiveTTL
+from .resilience import MIN_ATTEMPT_SECONDS, CircuitBreaker, Deadline
+from .scroll import InvalidCursor, ScrollSnapshots
+from .shm_cache import HEAD_OFFSET, SharedMemoryCache
+from .singleflight import SingleFlight
+from .tmdb_service import TMDBService, record_dependency, tmdb_service
+
+try:
+    import mongomock
+except ImportError:  # Optional, only the MongoDB-backed tests use it
+    mongomock = None
+
+
+class FakeMovieStore:
+    def __init__(self):
+        self.expired = []
+
+    def expire(self, movie_ids):
+        self.expired.append(sorted(movie_ids))
+        return len(movie_ids)
+
+
+class FakeCacheAdmin:
+    def __init__(self):
+        self.invalidated = []
+
+    def invalidate(self, keys, requested_by=''):
+        self.invalidated.append(sorted(keys))
+        return True
+
+
+class RecordedChangesService:
+    """Answers movie/changes calls from recorded IDs per day"""
+
+    def __init__(self, changes=None, cache=None):
+        self.changes = dict(changes or {})
+        self.cache = cache
+        self.cache_admin = FakeCacheAdmin()
+        self.movie_store = FakeMovieStore()
+
+    @staticmethod
+    def priority(lane):
+        return nullcontext()
+
+    @staticmethod
+    def refreshing():
+        return nullcontext()
+
+    def _fetch(self, endpoint, params=None):
+        start, end = date.fromisoformat(params['start_date']), date.fromisoformat(params['end_date'])
+        ids = set()
+        for day, day_ids in self.changes.items():
+            if start <= day <= end:
+                ids |= day_ids
+        return json.dumps({
+            'page': 1,
+            'total_pages': 1,
+            'results': [{'id': movie_id, 'adult': False} for movie_id in ids],
+        }).encode()
+
+
+class ChangeFeedTests(SimpleTestCase):
+    def test_poll_applies_each_of_todays_ids_once(self):
+        service = RecordedChangesService({date(2024, 5, 1): {550}})
+        feed = ChangeFeed(service, refresh=False)
+
+        self.assertEqual(feed.poll(today=date(2024, 5, 1)), 1)
+        service.changes[date(2024, 5, 1)] = {550, 600}
+        self.assertEqual(feed.poll(today=date(2024, 5, 1)), 1)
+        self.assertEqual(feed.poll(today=date(2024, 5, 1)), 0)
+
+        self.assertEqual(service.movie_store.expired, [[550], [600]])
+
+    def test_ended_day_is_applied_in_full_once_more(self):
+        service = RecordedChangesService({date(2024, 5, 1): {550, 600}})
+        feed = ChangeFeed(service, refresh=False)
+        feed.poll(today=date(2024, 5, 1))
+        service.changes[date(2024, 5, 2)] = {700}
+
+        feed.poll(today=date(2024, 5, 2))
+        feed.poll(today=date(2024, 5, 2))
+
+        self.assertEqual(service.movie_store.expired, [[550, 600], [550, 600, 700]])
+
+    def test_invalidation_is_broadcast_to_every_worker(self):
+        cache = SimpleNamespace(lookup_expired=lambda key: None)
+        service = RecordedChangesService(cache=cache)
+        feed = ChangeFeed(service, refresh=False)
+
+        feed.replay([{'results': [{'id': 550}]}])
+
+        self.assertEqual(service.cache_admin.invalidated, [sorted(
+            make_cache_key(endpoint, params) for endpoint, params in movie_endpoints(550)
+        )])
+        self.assertEqual(feed.dropped, 4)
+
+    def test_failed_poll_keeps_the_cursor(self):
+        service = RecordedChangesService()
+        service._fetch = lambda endpoint, params=None: None
+        feed = ChangeFeed(service, refresh=False)
+
+        self.assertIsNone(feed.poll(today=date(2024, 5, 1)))
+        self.assertIsNone(feed.cursor)
+        self.assertEqual(feed.failed_polls, 1)
+
+    def test_replay_applies_recorded_pages(self):
+        service = RecordedChangesService()
+        feed = ChangeFeed(service, refresh=False)
+        pages = [
+            {'page': 1, 'results': [{'id': 550}, {'id': 600}]},
+            {'page': 2, 'results': [{'id': 600}, {'id': None}]},
+        ]
+
+        self.assertEqual(feed.replay(pages), 2)
+        self.assertEqual(service.movie_store.expired, [[550, 600]])
+        self.assertEqual(feed.replay([{'results': [{'id': 550}]}]), 1)
+        self.assertEqual(service.movie_store.expired, [[550, 600], [550]])
+
+
+@unittest.skipUnless(shm_cache.fcntl, 'flock is not available')
+class SharedMemoryCacheTests(SimpleTestCase):
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        # Four slots are a single 4-way bucket, so every key collides
+        self.cache = SharedMemoryCache(os.path.join(directory.name, 'cache'), size_mb=1 / 16, slots=4)
+        self.expires = time.time() + 60
+
+    def set(self, key, value=b'body'):
+        return self.cache.set(key, value, self.expires, self.expires)
+
+    def slot_offset(self, key):
+        mapping = self.cache._mapping()
+        for index in range(self.cache.slots):
+            offset = self.cache._slot_offset(index)
+            if struct.unpack_from('<Q', mapping, offset + 8)[0] == shm_cache._hash(key):
+                return offset
+        self.fail(f"{key} has no slot")
+
+    def test_colliding_keys_share_a_bucket(self):
+        for key in ('a', 'b', 'c', 'd'):
+            self.set(key, key.encode())
+
+        for key in ('a', 'b', 'c', 'd'):
+            self.assertEqual(self.cache.get(key)[0], key.encode())
+
+    def test_full_bucket_evicts_the_oldest_entry(self):
+        evicted = []
+        self.cache.on_evict = evicted.append
+        for key in ('a', 'b', 'c', 'd', 'e'):
+            self.set(key)
+
+        self.assertEqual(evicted, ['a'])
+        self.assertIsNone(self.cache.get('a'))
+        self.assertIsNotNone(self.cache.get('e'))
+
+    def test_rewriting_a_key_reuses_its_slot(self):
+        evicted = []
+        self.cache.on_evict = evicted.append
+        for key in ('a', 'b', 'c', 'd'):
+            self.set(key)
+        self.set('a', b'new')
+
+        self.assertEqual(evicted, [])
+        self.assertEqual(self.cache.get('a')[0], b'new')
+        self.assertIsNotNone(self.cache.get('b'))
+
+    def test_hash_collision_does_not_return_another_key(self):
+        with mock.patch.object(shm_cache, '_hash', return_value=7):
+            self.set('a', b'first')
+            self.set('b', b'second')
+
+            self.assertIsNone(self.cache.get('a'))
+            self.assertEqual(self.cache.get('b')[0], b'second')
+
+    def test_slot_written_during_read_is_a_torn_read(self):
+        self.set('a')
+        offset = self.slot_offset('a')
+        decompress = zlib.decompress
+
+        def concurrent_write(data):
+            # A writer takes the slot between the reader's two sequence checks
+            mapping = self.cache._mapping()
+            seq = struct.unpack_from('<Q', mapping, offset)[0]
+            struct.pack_into('<Q', mapping, offset, seq + 2)
+            return decompress(data)
+
+        with mock.patch.object(zlib, 'decompress', side_effect=concurrent_write):
+            self.assertIsNone(self.cache.get('a'))
+        self.assertEqual(self.cache.torn_reads, 1)
+
+    def test_overwritten_ring_bytes_are_a_torn_read(self):
+        self.set('a')
+        struct.pack_into('<Q', self.cache._mapping(), HEAD_OFFSET, self.cache.size + 1)
+
+        self.assertIsNone(self.cache.get('a'))
+        self.assertEqual(self.cache.torn_reads, 1)
+
+    def test_slot_being_written_is_skipped(self):
+        self.set('a')
+        mapping = self.cache._mapping()
+        offset = self.slot_offset('a')
+        seq = struct.unpack_from('<Q', mapping, offset)[0]
+        struct.pack_into('<Q', mapping, offset, seq + 1)
+
+        self.assertIsNone(self.cache.get('a'))
+        self.assertEqual(self.cache.torn_reads, 0)
+        self.assertEqual(self.cache.misses, 1)
+
+    def test_entry_larger_than_an_eighth_of_the_ring_is_refused(self):
+        self.assertFalse(self.set('a', os.urandom(self.cache.max_entry)))
+        self.assertEqual(self.cache.too_large, 1)
+        self.assertIsNone(self.cache.get('a'))
+
+
+class CircuitBreakerTests(SimpleTestCase):
+    def setUp(self):
+        self.breaker = CircuitBreaker(failure_threshold=3, recovery_timeout=30)
+
+    def trip(self):
+        for _ in range(self.breaker.failure_threshold):
+            self.breaker.record_failure()
+
+    def wait_out_recovery(self):
+        self.breaker.opened_at -= self.breaker.recovery_timeout
+
+    def test_opens_after_consecutive_failures(self):
+        self.breaker.record_failure()
+        self.breaker.record_failure()
+        self.breaker.record_success()
+        self.breaker.record_failure()
+        self.assertEqual(self.breaker.state, CircuitBreaker.CLOSED)
+
+        self.trip()
+        self.assertEqual(self.breaker.state, CircuitBreaker.OPEN)
+        self.assertEqual(self.breaker.trips, 1)
+
+    def test_open_breaker_rejects(self):
+        self.trip()
+
+        self.assertFalse(self.breaker.allow_request())
+        self.assertEqual(self.breaker.rejected, 1)
+
+    def test_half_open_lets_a_single_probe_through(self):
+        self.trip()
+        self.wait_out_recovery()
+
+        self.assertTrue(self.breaker.allow_request())
+        self.assertEqual(self.breaker.state, CircuitBreaker.HALF_OPEN)
+        self.assertFalse(self.breaker.allow_request())
+
+    def test_successful_probe_closes(self):
+        self.trip()
+        self.wait_out_recovery()
+        self.breaker.allow_request()
+        self.breaker.record_success()
+
+        self.assertEqual(self.breaker.state, CircuitBreaker.CLOSED)
+        self.assertTrue(self.breaker.allow_request())
+        self.assertTrue(self.breaker.allow_request())
+
+    def test_failed_probe_reopens(self):
+        self.trip()
+        self.wait_out_recovery()
+        self.breaker.allow_request()
+        self.breaker.record_failure()
+
+        self.assertEqual(self.breaker.state, CircuitBreaker.OPEN)
+        self.assertEqual(self.breaker.trips, 2)
+        self.assertFalse(self.breaker.allow_request())
+
+    def test_released_probe_lets_the_next_request_probe(self):
+        self.trip()
+        self.wait_out_recovery()
+        self.assertTrue(self.breaker.allow_request())
+
+        self.breaker.release_probe()
+        self.assertTrue(self.breaker.allow_request())
+        self.assertEqual(self.breaker.state, CircuitBreaker.HALF_OPEN)
+
+    def test_release_probe_is_a_no_op_when_closed(self):
+        self.breaker.release_probe()
+
+        self.assertEqual(self.breaker.state, CircuitBreaker.CLOSED)
+        self.assertTrue(self.breaker.allow_request())
+
+
+class DeadlineTests(SimpleTestCase):
+    def setUp(self):
+        self.service = SimpleNamespace(pool=SimpleNamespace(connect_timeout=3.0, read_timeout=10.0))
+
+    def test_spent_budget_allows_no_attempt(self):
+        self.assertFalse(Deadline(0).allows_attempt())
+        self.assertFalse(Deadline(MIN_ATTEMPT_SECONDS / 2).allows_attempt())
+        self.assertTrue(Deadline(5).allows_attempt())
+
+    def test_attempt_timeout_is_capped_by_the_budget(self):
+        connect, read = TMDBService._attempt_timeout(self.service, Deadline(5))
+
+        self.assertEqual(connect, 3.0)
+        self.assertLessEqual(read, 5)
+        self.assertGreater(read, 4)
+
+    def test_attempt_timeout_is_never_below_the_floor(self):
+        self.assertEqual(
+            TMDBService._attempt_timeout(self.service, Deadline(0)),
+            (MIN_ATTEMPT_SECONDS, MIN_ATTEMPT_SECONDS),
+        )
+
+
+class RankedListService:
+    """Serves get_popular_movies pages from a ranking the test can change"""
+
+    def __init__(self, ranking, per_page=3):
+        self.ranking = ranking
+        self.per_page = per_page
+        self.calls = []
+        self.refresher = SimpleNamespace(schedule=lambda *args: None)
+
+    @staticmethod
+    def priority(lane):
+        return nullcontext()
+
+    def get_popular_movies(self, page=1):
+        self.calls.append(page)
+        start = (page - 1) * self.per_page
+        return {
+            'page': page,
+            'results': [{'id': movie_id} for movie_id in self.ranking[start:start + self.per_page]],
+            'total_pages': 3,
+            'total_results': 9,
+        }
+
+
+@override_settings(CACHES={'scroll-tests': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}})
+class ScrollSnapshotTests(SimpleTestCase):
+    def setUp(self):
+        self.service = RankedListService([1, 2, 3, 4, 5, 6, 7, 8, 9])
+        self.snapshots = ScrollSnapshots(self.service, alias='scroll-tests')
+        self.addCleanup(self.snapshots.cache.clear)
+
+    def first_cursor(self):
+        data = self.service.get_popular_movies(page=1)
+        return self.snapshots.first_page('get_popular_movies', {}, data)['cursor']
+
+    def test_pages_follow_the_cursor(self):
+        page = self.snapshots.page(self.first_cursor())
+
+        self.assertEqual(page['page'], 2)
+        self.assertEqual([movie['id'] for movie in page['results']], [4, 5, 6])
+        self.assertEqual(self.snapshots.page(page['cursor'])['page'], 3)
+
+    def test_tampered_cursor_is_rejected(self):
+        cursor = self.first_cursor()
+        tampered = cursor[:-1] + ('A' if cursor[-1] != 'A' else 'B')
+
+        with self.assertRaises(InvalidCursor):
+            self.snapshots.page(tampered)
+        with self.assertRaises(InvalidCursor):
+            self.snapshots.page('not-a-cursor')
+
+    def test_signed_cursor_for_another_method_or_page_is_rejected(self):
+        token = {'s': 'snapshot', 'm': 'get_popular_movies', 'k': {}, 't': 3, 'r': 9, 'p': 2}
+        for bad in ({'m': 'get_movie_details'}, {'k': {'api_key': 'x'}}, {'p': 1}, {'p': scroll.MAX_PAGES + 1}):
+            cursor = signing.dumps({**token, **bad}, salt=scroll.SALT, compress=True)
+            with self.subTest(bad=bad), self.assertRaises(InvalidCursor):
+                self.snapshots.page(cursor)
+
+    def test_expired_snapshot_reloads_pages_without_duplicates(self):
+        cursor = self.first_cursor()
+        self.snapshots.cache.clear()
+        # Title 3 slipped to page 2 after page 1 was served
+        self.service.ranking = [1, 2, 3, 3, 4, 5, 6, 7, 8]
+        self.service.calls.clear()
+
+        page = self.snapshots.page(cursor)
+
+        self.assertEqual(self.service.calls, [1, 2])
+        self.assertEqual([movie['id'] for movie in page['results']], [4, 5])
+        self.assertEqual(self.snapshots.duplicates_removed, 1)
+
+    def test_long_expired_snapshot_serves_the_plain_page(self):
+        self.snapshots.max_backfill = 1
+        cursor = self.snapshots.page(self.first_cursor())['cursor']
+        self.snapshots.cache.clear()
+        self.service.calls.clear()
+
+        page = self.snapshots.page(cursor)
+
+        self.assertEqual(self.service.calls, [3])
+        self.assertEqual([movie['id'] for movie in page['results']], [7, 8, 9])
+        self.assertIsNone(page['cursor'])
+        self.assertEqual(self.snapshots.unsnapshotted_pages, 1)
+
+    def test_loaded_pages_are_served_from_the_snapshot(self):
+        cursor = self.first_cursor()
+        first = self.snapshots.page(cursor)
+        self.service.ranking = list(reversed(self.service.ranking))
+        self.service.calls.clear()
+
+        self.assertEqual(self.snapshots.page(cursor)['results'], first['results'])
+        self.assertEqual(self.service.calls, [])
+
+
+class ResponseCacheMiddlewareTests(SimpleTestCase):
+    def setUp(self):
+        self.versions = {'popular': time.time() + 600}
+        self.views = 0
+        fake_cache = SimpleNamespace(version=self.versions.get)
+        for patcher in (mock.patch.object(tmdb_service, 'cache', fake_cache),
+                        mock.patch.object(middleware, 'response_cache', ResponseCache(prefixes=['/api/movies/']))):
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        self.middleware = ResponseCacheMiddleware(self.view)
+        self.factory = RequestFactory()
+
+    def view(self, request):
+        self.views += 1
+        record_dependency('popular', self.versions.get('popular'))
+        return JsonResponse({'results': [{'id': movie_id, 'title': f'Movie {movie_id}'} for movie_id in range(20)]})
+
+    def get(self, **headers):
+        return self.middleware(self.factory.get('/api/movies/popular/', **headers))
+
+    def test_matching_if_none_match_is_answered_with_304(self):
+        first = self.get()
+        self.assertEqual(first.status_code, 200)
+        self.assertEqual(first['X-Response-Cache'], 'MISS')
+
+        response = self.get(HTTP_IF_NONE_MATCH=first['ETag'])
+
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response.content, b'')
+        self.assertEqual(response['ETag'], first['ETag'])
+        self.assertEqual(response['X-Response-Cache'], 'HIT')
+        self.assertTrue(response['Cache-Control'].startswith('public, max-age='))
+        self.assertEqual(middleware.response_cache.not_modified, 1)
+        self.assertEqual(self.views, 1)
+
+    def test_tag_of_another_encoding_still_matches(self):
+        etag = self.get(HTTP_ACCEPT_ENCODING='gzip')['ETag']
+        self.assertTrue(etag.endswith('-gzip"'))
+
+        self.assertEqual(self.get(HTTP_IF_NONE_MATCH=f'W/{etag}').status_code, 304)
+
+    def test_mismatched_tag_gets_the_body(self):
+        self.get()
+
+        response = self.get(HTTP_IF_NONE_MATCH='"0123abcd", "feed"')
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['X-Response-Cache'], 'HIT')
+        self.assertEqual(len(json.loads(response.content)['results']), 20)
+
+    def test_response_built_from_a_stale_entry_is_not_stored(self):
+        self.versions['popular'] = None
+
+        response = self.get()
+
+        self.assertEqual(response.status_code, 200)
+        self.assertNotIn('X-Response-Cache', response)
+        self.assertEqual(response['Cache-Control'], 'no-cache')
+        self.assertEqual(len(middleware.response_cache.entries), 0)
+        self.assertEqual(middleware.response_cache.uncacheable, 1)
+
+        revalidated = self.get(HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(revalidated.status_code, 304)
+        self.assertEqual(self.views, 2)
+
+    def test_refreshed_dependency_invalidates_the_stored_response(self):
+        self.get()
+        self.versions['popular'] += 60
+
+        self.assertEqual(self.get()['X-Response-Cache'], 'MISS')
+        self.assertEqual(middleware.response_cache.invalidated, 1)
+        self.assertEqual(self.views, 2)
+
+    def test_authenticated_response_is_private(self):
+        response = self.get(HTTP_AUTHORIZATION='Bearer token')
+
+        self.assertEqual(response['Cache-Control'], 'private, no-cache')
+        self.assertEqual(len(middleware.response_cache.entries), 0)
+
+
+class StoreWriterTests(SimpleTestCase):
+    def setUp(self):
+        self.writer = StoreWriter(max_pending=2)
+        self.writes = []
+        # Pending writes stay queued until drain() while the process looks already started
+        self.writer._pid = os.getpid()
+
+    def test_newer_body_replaces_the_pending_write(self):
+        self.writer.submit(('last_good', 'k'), self.writes.append, b'old')
+        self.writer.submit(('last_good', 'k'), self.writes.append, b'new')
+        self.writer.drain()
+
+        self.assertEqual(self.writes, [b'new'])
+        self.assertEqual(self.writer.get_stats()['replaced'], 1)
+
+    def test_full_queue_drops_writes(self):
+        self.assertTrue(self.writer.submit('a', self.writes.append, 'a'))
+        self.assertTrue(self.writer.submit('b', self.writes.append, 'b'))
+        self.assertFalse(self.writer.submit('c', self.writes.append, 'c'))
+        self.writer.drain()
+
+        self.assertEqual(self.writes, ['a', 'b'])
+        self.assertEqual(self.writer.dropped, 1)
+
+    def test_failed_write_is_counted(self):
+        def fail():
+            raise RuntimeError('store down')
+
+        self.writer.submit('a', fail)
+        with self.assertLogs('movies.mongo_store', 'WARNING'):
+            self.writer.drain()
+        self.assertEqual(self.writer.failed, 1)
+
+
+class RecordingCache:
+    def __init__(self):
+        self.purged = []
+        self.deleted = []
+
+    def purge(self, pattern):
+        self.purged.append(pattern)
+        return {'local': 0, 'l2': None}
+
+    def purge_local(self, pattern):
+        self.purged.append(pattern)
+
+    def delete_local(self, keys):
+        self.deleted.append(list(keys))
+
+
+@unittest.skipUnless(mongomock, 'mongomock is not installed')
+class CacheAdminTests(SimpleTestCase):
+    alias = 'cache-admin-tests'
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        mongoengine.connect('cache_admin_tests', alias=cls.alias, host='mongodb://localhost',
+                            mongo_client_class=mongomock.MongoClient)
+
+    @classmethod
+    def tearDownClass(cls):
+        mongoengine.disconnect(alias=cls.alias)
+        super().tearDownClass()
+
+    def setUp(self):
+        stack = ExitStack()
+        self.addCleanup(stack.close)
+        for document in (TMDBCachePurge, TMDBMovieDocument, TMDBLastKnownGood):
+            # As switch_db, without first opening the default connection
+            stack.enter_context(mock.patch.dict(document._meta, {'db_alias': self.alias}))
+            stack.enter_context(mock.patch.object(document, '_collection', None))
+            document.objects.delete()
+        self.cache = RecordingCache()
+        self.admin = CacheAdmin(self.cache, MovieStore(), LastKnownGoodStore())
+        self.now = datetime.now(timezone.utc)
+        self.admin._purges_after = self.now
+
+    def record_purge(self, created_at, **target):
+        TMDBCachePurge(origin='other:1', created_at=created_at, **target).save()
+
+    def test_purge_expires_the_durable_copies(self):
+        for movie_id in (550, 5501, 600):
+            self.admin.movie_store.save(movie_id, b'{}', {'title': 'Movie'})
+        for key in ('movie/550/credits', 'movie/600/credits'):
+            self.admin.last_good.save(make_cache_key(key), key, b'{}')
+
+        result = self.admin.purge('movie/550*', requested_by='staff')
+
+        self.assertEqual(result['movie_store'], 2)
+        self.assertEqual(result['last_known_good'], 1)
+        self.assertTrue(result['broadcast'])
+        self.assertFalse(self.admin.movie_store.get(550)[1])
+        self.assertFalse(self.admin.movie_store.get(5501)[1])
+        self.assertTrue(self.admin.movie_store.get(600)[1])
+        self.assertEqual([doc.key for doc in TMDBLastKnownGood.objects], [make_cache_key('movie/600/credits')])
+
+    def test_purges_are_applied_once(self):
+        self.record_purge(self.now + timedelta(seconds=1), pattern='movie/550*')
+        self.record_purge(self.now + timedelta(seconds=1), keys=['tmdb:movie/600'])
+
+        self.assertEqual(self.admin.apply_purges(), 2)
+        self.assertEqual(self.admin.apply_purges(), 0)
+        self.assertEqual(self.cache.purged, ['movie/550*'])
+        self.assertEqual(self.cache.deleted, [['tmdb:movie/600']])
+
+    def test_purge_from_a_clock_behind_is_still_applied(self):
+        self.record_purge(self.now + timedelta(seconds=10), pattern='movie/550*')
+        self.admin.apply_purges()
+        self.record_purge(self.now - timedelta(minutes=1), pattern='movie/600*')
+
+        self.assertEqual(self.admin.apply_purges(), 1)
+        self.assertEqual(self.cache.purged, ['movie/550*', 'movie/600*'])
+
+    def test_own_purges_are_not_replayed(self):
+        admin = CacheAdmin(self.cache)
+        admin._purges_after = self.now
+        admin.purge('movie/550*')
+
+        self.assertEqual(admin.apply_purges(), 0)
+        self.assertEqual(self.cache.purged, ['movie/550*'])
+
+
+class LaneRecordingService:
+    """Records the lane and refresh mode each call ran in"""
+
+    def __init__(self):
+        self.lane = None
+        self.is_refreshing = False
+        self.calls = []
+
+    @contextmanager
+    def priority(self, lane):
+        previous, self.lane = self.lane, lane
+        try:
+            yield
+        finally:
+            self.lane = previous
+
+    @contextmanager
+    def refreshing(self):
+        self.is_refreshing = True
+        try:
+            yield
+        finally:
+            self.is_refreshing = False
+
+    def get_genres(self):
+        self.calls.append(('get_genres', self.lane, self.is_refreshing))
+        return {'genres': [{'id': 28}, {'id': 35}]}
+
+    def get_movies_by_genre(self, genre_id, page=1):
+        self.calls.append((genre_id, self.lane, self.is_refreshing))
+        return {'results': []}
+
+
+class PrewarmTests(SimpleTestCase):
+    def test_genre_list_is_reloaded_in_the_prefetch_lane(self):
+        service = LaneRecordingService()
+        prewarm = PrewarmScheduler(service, targets={
+            'genre_movies': {'method': 'get_movies_by_genre', 'per_genre': True, 'pages': [1], 'interval': 60},
+        })
+
+        self.assertEqual(prewarm.run_target(prewarm.targets[0]), (2, 0, 0))
+        self.assertEqual(service.calls, [
+            ('get_genres', PREFETCH, True), (28, PREFETCH, True), (35, PREFETCH, True),
+        ])
+
+
+def wait_until(condition, timeout=2.0):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        if time.monotonic() > deadline:
+            raise AssertionError('condition not met in time')
+        time.sleep(0.001)
+
+
+class SingleFlightTests(SimpleTestCase):
+    callers = 8
+
+    def setUp(self):
+        self.flights = SingleFlight()
+        self.release = threading.Event()
+        self.upstream_calls = 0
+
+    def fetch(self, result):
+        self.upstream_calls += 1
+        self.release.wait(2)
+        if isinstance(result, Exception):
+            raise result
+        return result
+
+    def run_callers(self, result):
+        outcomes = []
+
+        def call():
+            try:
+                outcomes.append(self.flights.do('movie/550', self.fetch, result))
+            except Exception as e:
+                outcomes.append(e)
+
+        threads = [threading.Thread(target=call) for _ in range(self.callers)]
+        for thread in threads:
+            thread.start()
+        wait_until(lambda: self.flights.coalesced == self.callers - 1)
+        self.release.set()
+        for thread in threads:
+            thread.join(2)
+        return outcomes
+
+    def test_concurrent_callers_share_one_upstream_call(self):
+        outcomes = self.run_callers(b'body')
+
+        self.assertEqual(self.upstream_calls, 1)
+        self.assertEqual(outcomes, [b'body'] * self.callers)
+        self.assertEqual(self.flights.get_stats(), {'in_flight': 0, 'executed': 1, 'coalesced': self.callers - 1})
+
+    def test_every_caller_gets_the_error(self):
+        error = ConnectionError('TMDB unreachable')
+
+        outcomes = self.run_callers(error)
+
+        self.assertEqual(self.upstream_calls, 1)
+        self.assertEqual(outcomes, [error] * self.callers)
+
+    def test_later_calls_run_again(self):
+        self.release.set()
+        self.flights.do('movie/550', self.fetch, b'first')
+        self.flights.do('movie/550', self.fetch, b'second')
+
+        self.assertEqual(self.upstream_calls, 2)
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+class LocalTokenBucketTests(SimpleTestCase):
+    def setUp(self):
+        self.clock = FakeClock()
+        patcher = mock.patch.object(rate_limit.time, 'monotonic', self.clock)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.bucket = LocalTokenBucket(rate=10, capacity=2)
+
+    def test_bucket_refills_at_its_rate_up_to_capacity(self):
+        self.assertTrue(self.bucket.take()[0])
+        self.assertTrue(self.bucket.take()[0])
+        self.assertFalse(self.bucket.take()[0])
+
+        self.clock.now += 0.1
+        self.assertTrue(self.bucket.take()[0])
+        self.assertFalse(self.bucket.take()[0])
+
+        self.clock.now += 60
+        self.assertEqual(self.bucket.take()[1], 1)
+
+    def test_reserve_is_left_for_other_callers(self):
+        self.assertTrue(self.bucket.take(reserve=1)[0])
+        self.assertFalse(self.bucket.take(reserve=1)[0])
+        self.assertTrue(self.bucket.take()[0])
+
+    def test_drain_puts_the_bucket_in_debt(self):
+        self.bucket.drain(1.0)
+
+        self.clock.now += 0.5
+        self.assertFalse(self.bucket.take()[0])
+        self.clock.now += 0.6
+        self.assertTrue(self.bucket.take()[0])
+
+
+class SharedRateLimiterTests(SimpleTestCase):
+    def setUp(self):
+        self.limiter = SharedRateLimiter(name='tests', rate=200, capacity=4, max_wait=0)
+        # MongoDB is backing off: the limiter uses its local bucket
+        self.limiter.guard._retry_at = float('inf')
+
+    def test_interactive_lane_keeps_the_reserve(self):
+        # The prefetch lane must leave half the burst
+        self.assertTrue(self.limiter.acquire(reserve=0.5))
+        self.assertTrue(self.limiter.acquire(reserve=0.5))
+        self.assertFalse(self.limiter.acquire(reserve=0.5))
+
+        self.assertTrue(self.limiter.acquire())
+        self.assertEqual(self.limiter.rejected, 1)
+
+    def test_waits_for_a_refill_within_max_wait(self):
+        for _ in range(4):
+            self.limiter.acquire()
+
+        self.assertTrue(self.limiter.acquire(max_wait=1))
+        self.assertEqual(self.limiter.queued, 1)
+
+    def test_async_acquire_waits_on_the_event_loop(self):
+        for _ in range(4):
+            self.limiter.acquire()
+
+        with mock.patch.object(rate_limit.time, 'sleep', side_effect=AssertionError('blocked the loop')):
+            self.assertTrue(asyncio.run(self.limiter.acquire_async(max_wait=1)))
+            self.assertFalse(asyncio.run(self.limiter.acquire_async(max_wait=0)))
+
+    def test_upstream_429_rejects_until_retry_after(self):
+        self.limiter.throttled(retry_after=5)
+
+        self.assertFalse(self.limiter.acquire(max_wait=1))
+        self.assertEqual(self.limiter.upstream_throttled, 1)
+
+
+class PriorityDispatcherTests(SimpleTestCase):
+    def setUp(self):
+        self.dispatcher = PriorityDispatcher(capacity=1, async_capacity=2, lanes={PREFETCH: {'cap': 1}})
+        self.admitted = []
+
+    def wait_in_thread(self, lane):
+        def wait():
+            if self.dispatcher.acquire(lane, timeout=2):
+                self.admitted.append(lane)
+        thread = threading.Thread(target=wait)
+        thread.start()
+        self.addCleanup(thread.join, 2)
+        wait_until(lambda: self.dispatcher.get_stats()[lane]['waiting'] == 1)
+        return thread
+
+    def test_waiting_higher_lane_goes_first(self):
+        self.assertTrue(self.dispatcher.acquire(INTERACTIVE))
+        bulk = self.wait_in_thread(BULK)
+        interactive = self.wait_in_thread(INTERACTIVE)
+
+        self.dispatcher.release(INTERACTIVE)
+        interactive.join(2)
+        self.assertEqual(self.admitted, [INTERACTIVE])
+
+        self.dispatcher.release(INTERACTIVE)
+        bulk.join(2)
+        self.assertEqual(self.admitted, [INTERACTIVE, BULK])
+
+    def test_lane_cap_leaves_capacity_for_other_lanes(self):
+        dispatcher = PriorityDispatcher(capacity=3, lanes={PREFETCH: {'cap': 1}})
+
+        self.assertTrue(dispatcher.acquire(PREFETCH))
+        self.assertFalse(dispatcher.acquire(PREFETCH, timeout=0.01))
+        self.assertTrue(dispatcher.acquire(INTERACTIVE))
+        self.assertEqual(dispatcher.get_stats()[PREFETCH]['timed_out'], 1)
+
+    def test_async_admission_is_sized_separately(self):
+        async def scenario():
+            self.assertTrue(self.dispatcher.acquire(INTERACTIVE))
+            self.assertTrue(await self.dispatcher.acquire_async(INTERACTIVE))
+            self.assertTrue(await self.dispatcher.acquire_async(INTERACTIVE))
+            self.assertFalse(await self.dispatcher.acquire_async(INTERACTIVE, timeout=0.01))
+
+            waiter = asyncio.ensure_future(self.dispatcher.acquire_async(INTERACTIVE, timeout=2))
+            await asyncio.sleep(0)
+            self.assertFalse(waiter.done())
+            self.dispatcher.release_async(INTERACTIVE)
+            return await waiter
+
+        self.assertTrue(asyncio.run(scenario()))
+        self.assertEqual(self.dispatcher.get_stats()[INTERACTIVE]['async_in_flight'], 2)
+
+
+class HedgePolicyTests(SimpleTestCase):
+    def test_no_hedge_until_enough_samples(self):
+        policy = HedgePolicy(enabled=True, percentile=95, min_samples=3, min_delay=0.01)
+        policy.latency.record('details', 0.2)
+        policy.latency.record('details', 0.3)
+
+        self.assertIsNone(policy.delay_for('details'))
+        policy.latency.record('details', 0.4)
+        self.assertEqual(policy.delay_for('details'), 0.4)
+        self.assertIsNone(HedgePolicy(enabled=False).delay_for('details'))
+
+    def test_delay_is_never_below_the_minimum(self):
+        policy = HedgePolicy(enabled=True, min_samples=1, min_delay=0.05)
+        policy.latency.record('details', 0.001)
+
+        self.assertEqual(policy.delay_for('details'), 0.05)
+
+
+class HedgedSendTests(SimpleTestCase):
+    delay = 0.05
+
+    def setUp(self):
+        self.primary_done = threading.Event()
+        self.addCleanup(self.primary_done.set)
+        self.slow_primary = False
+        self.sent_at = []
+        self.hedging = HedgePolicy(enabled=True, min_samples=1, min_delay=self.delay)
+        self.hedging.latency.record('details', self.delay)
+        executor = ThreadPoolExecutor(max_workers=2)
+        self.addCleanup(executor.shutdown, wait=False)
+        self.service = SimpleNamespace(
+            hedging=self.hedging,
+            hedge_executor=executor,
+            rate_limiter=SimpleNamespace(acquire=lambda max_wait=None: True),
+            _timed_get=self.get,
+        )
+
+    def get(self, url, query, timeout, family):
+        self.sent_at.append(time.monotonic())
+        if len(self.sent_at) == 1 and self.slow_primary:
+            self.primary_done.wait(2)
+            return 'primary'
+        return 'primary' if len(self.sent_at) == 1 else 'hedge'
+
+    def send(self, lane=INTERACTIVE):
+        started = time.monotonic()
+        response = TMDBService._send(self.service, 'url', {}, 1, 'details', lane)
+        return response, started
+
+    def test_fast_response_is_not_hedged(self):
+        self.assertEqual(self.send()[0], 'primary')
+        self.assertEqual(len(self.sent_at), 1)
+        self.assertEqual(self.hedging.fired, 0)
+
+    def test_hedge_fires_only_after_the_delay(self):
+        self.slow_primary = True
+
+        response, started = self.send()
+
+        self.assertEqual(response, 'hedge')
+        self.assertEqual(len(self.sent_at), 2)
+        self.assertGreaterEqual(self.sent_at[1] - started, self.delay)
+        self.assertEqual((self.hedging.fired, self.hedging.won), (1, 1))
+
+    def test_no_hedge_without_a_spare_token(self):
+        self.slow_primary = True
+        self.service.rate_limiter = SimpleNamespace(acquire=lambda max_wait=None: False)
+        threading.Timer(2 * self.delay, self.primary_done.set).start()
+
+        self.assertEqual(self.send()[0], 'primary')
+        self.assertEqual(len(self.sent_at), 1)
+        self.assertEqual(self.hedging.skipped, 1)
+
+    def test_background_lanes_are_not_hedged(self):
+        self.send(lane=PREFETCH)
+
+        self.assertEqual(self.hedging.requests, 0)
+
+
+class HashRingTests(SimpleTestCase):
+    nodes = ['http://a:8000', 'http://b:8000', 'http://c:8000']
+    keys = [make_cache_key(f'movie/{movie_id}') for movie_id in range(2000)]
+
+    def owners(self, ring):
+        return {key: ring.owner(key) for key in self.keys}
+
+    def test_adding_a_node_only_moves_keys_to_it(self):
+        before = self.owners(HashRing(self.nodes))
+        after = self.owners(HashRing(self.nodes + ['http://d:8000']))
+
+        moved = [key for key in self.keys if before[key] != after[key]]
+        self.assertEqual({after[key] for key in moved}, {'http://d:8000'})
+        self.assertLess(abs(len(moved) / len(self.keys) - 0.25), 0.1)
+
+    def test_removing_a_node_only_moves_its_keys(self):
+        before = self.owners(HashRing(self.nodes))
+        after = self.owners(HashRing(self.nodes[:2]))
+
+        for key in self.keys:
+            if before[key] != 'http://c:8000':
+                self.assertEqual(after[key], before[key])
+
+    def test_owner_does_not_depend_on_node_order(self):
+        self.assertEqual(self.owners(HashRing(self.nodes)), self.owners(HashRing(reversed(self.nodes))))
+
+    def test_empty_ring_has_no_owner(self):
+        self.assertIsNone(HashRing([]).owner('tmdb:movie/550'))
+
+
+class PeerCacheTests(SimpleTestCase):
+    def setUp(self):
+        self.peers = PeerCache(nodes=HashRingTests.nodes, self_url='http://a:8000', secret='s3cret')
+
+    def key_owned_by(self, node):
+        return next(key for key in HashRingTests.keys if self.peers.ring.owner(key) == node)
+
+    def test_own_keys_are_loaded_locally(self):
+        self.assertIsNone(self.peers.owner_for(self.key_owned_by('http://a:8000')))
+        self.assertEqual(self.peers.owner_for(self.key_owned_by('http://b:8000')), 'http://b:8000')
+
+    def test_failed_owner_is_skipped_until_retry_after(self):
+        key = self.key_owned_by('http://b:8000')
+        with self.assertLogs('movies.peer_cache', 'WARNING'):
+            self.peers._peer_failed('http://b:8000', 'connection refused')
+
+        self.assertIsNone(self.peers.owner_for(key))
+        self.peers._down_until['http://b:8000'] = 0
+        self.assertEqual(self.peers.owner_for(key), 'http://b:8000')
+
+    def test_requests_from_peers_are_never_forwarded(self):
+        with self.peers.serving():
+            self.assertIsNone(self.peers.owner_for(self.key_owned_by('http://b:8000')))
+
+    def test_peer_requests_are_validated(self):
+        self.assertTrue(self.peers.valid_request('movie/550/credits', {'page': 1}))
+        self.assertFalse(self.peers.valid_request('../admin', {}))
+        self.assertFalse(self.peers.valid_request('movie/550', {'nested': {'a': 1}}))
+        self.assertTrue(self.peers.check_token('s3cret'))
+        self.assertFalse(self.peers.check_token('guess'))
+
+
+class AdaptiveTTLTests(SimpleTestCase):
+    endpoint = 'trending/movie/day'
+    key = make_cache_key(endpoint)
+
+    def setUp(self):
+        self.cache = SimpleNamespace(ttls={'trending': 900, 'other': 3600}, ttl_for=lambda endpoint: 3600)
+        self.ttls = AdaptiveTTL(self.cache, bounds={'trending': (300, 3600)}, max_keys=100)
+
+    def refresh(self, body, times=1, key=None):
+        for _ in range(times):
+            ttl = self.ttls.ttl_for(key or self.key, self.endpoint, body)
+        return ttl
+
+    def test_unchanged_content_stretches_up_to_the_maximum(self):
+        self.assertEqual(self.refresh(b'same'), 900)
+        self.assertEqual(self.refresh(b'same'), 900 * GROW)
+        self.assertEqual(self.refresh(b'same', times=10), 3600)
+
+    def test_changing_content_shrinks_down_to_the_minimum(self):
+        self.refresh(b'v0')
+        for version in range(1, 10):
+            ttl = self.refresh(f'v{version}'.encode())
+
+        self.assertEqual(ttl, 300)
+
+    def test_new_keys_start_from_what_the_family_learned(self):
+        self.refresh(b'same', times=20)
+
+        self.assertGreater(self.refresh(b'other', key=make_cache_key('trending/tv/day')), 900)
+
+    def test_default_bounds_clamp_the_configured_ttl(self):
+        self.cache.ttls['genres'] = 60
+        ttls = AdaptiveTTL(self.cache, max_keys=100)
+
+        self.assertEqual(ttls.ttl_for(make_cache_key('genre/movie/list'), 'genre/movie/list', b'{}'), 24 * 60 * 60)
+
+    def test_families_without_bounds_keep_their_fixed_ttl(self):
+        self.assertEqual(self.ttls.ttl_for(make_cache_key('search/movie'), 'search/movie', b'{}'), 3600)
+
+
+class FieldsetTests(SimpleTestCase):
+    page = {
+        'page': 1,
+        'total_pages': 3,
+        'cursor': 'abc',
+        'results': [
+            {'id': 550, 'title': 'Fight Club', 'overview': '...', 'budget': 63000000},
+            {'id': 600, 'title': 'Full Metal Jacket', 'overview': '...', 'budget': 17000000},
+        ],
+    }
+
+    def select(self, fields, data=None, items=fieldsets.RESULTS):
+        request = RequestFactory().get('/api/movies/popular/', {'fields': fields} if fields is not None else {})
+        return fieldsets.select_fields(request, data or self.page, items)
+
+    def test_presets_expand_and_mix_with_field_names(self):
+        fields = fieldsets.parse(' video , budget,')
+
+        self.assertEqual(fields, frozenset(fieldsets.PRESETS['video']) | {'budget'})
+        self.assertIsNone(fieldsets.parse(''))
+        self.assertIsNone(fieldsets.parse(' , '))
+
+    def test_items_are_projected_and_the_envelope_kept(self):
+        data = self.select('id,title')
+
+        self.assertEqual(data['results'], [{'id': 550, 'title': 'Fight Club'}, {'id': 600, 'title': 'Full Metal Jacket'}])
+        self.assertEqual((data['page'], data['total_pages'], data['cursor']), (1, 3, 'abc'))
+        self.assertIn('budget', self.page['results'][0])
+
+    def test_unknown_names_are_ignored(self):
+        self.assertEqual(self.select('id,no_such_field')['results'], [{'id': 550}, {'id': 600}])
+        self.assertEqual(self.select('crad'), self.page)
+        self.assertEqual(self.select('crad', data={'id': 550, 'title': 'Fight Club'}, items=fieldsets.DOCUMENT),
+                         {'id': 550, 'title': 'Fight Club'})
+
+    def test_no_fields_leaves_the_data_as_is(self):
+        self.assertIs(self.select(None), self.page)
+        self.assertIs(self.select(''), self.page)
+
+    def test_document_and_credits_projection(self):
+        details = {'id': 550, 'title': 'Fight Club', 'budget': 63000000, 'tagline': 'Mischief.'}
+        credits = {'id': 550, 'cast': [{'id': 819, 'name': 'Edward Norton', 'order': 0}], 'crew': []}
+
+        self.assertEqual(self.select('id,tagline', details, fieldsets.DOCUMENT), {'id': 550, 'tagline': 'Mischief.'})
+        self.assertEqual(self.select('person', credits, fieldsets.CREDITS)['cast'], [{'id': 819, 'name': 'Edward Norton'}])
@@ -0,0 +1,250 @@
+"""
+Async TMDB API Service
+Same method surface as TMDBService, but every call returns an awaitable and
+upstream I/O runs on a pooled httpx.AsyncClient so one ASGI worker can hold
+many concurrent TMDB waits. The response cache is shared with the sync
+service of the same process.
+"""
+import asyncio
+import json
+import logging
+import weakref
+
+import httpx
+from asgiref.sync import sync_to_async
+from django.conf import settings
+
+from .cache import endpoint_family, make_cache_key
+from .dispatch import INTERACTIVE, current_lane
+from .resilience import Deadline, parse_retry_after
+from .tmdb_service import TMDBService, _bypass_cache, record_dependency, tmdb_service
+
+
+logger = logging.getLogger(__name__)
+
+
+# Components of the sync service that the async one uses as they are: one
+# cache, quota, breaker, dispatcher and set of stores per process. Stale
+# entries are refreshed by the sync service's worker pool, and scroll
+# snapshots page through the sync service from a worker thread.
+SHARED_COMPONENTS = (
+    'api_key', 'base_url', 'image_base_url', 'cache', 'refresher', 'flights', 'breaker',
+    'retry_policy', 'rate_limiter', 'dispatcher', 'hedging', 'movie_store', 'last_good', 'store_writer', 'peers',
+    'adaptive_ttl', 'cache_admin', 'scroll', 'snapshot', 'request_deadline',
+)
+
+
+class AsyncTMDBService(TMDBService):
+    def __init__(self, sync_service=None, max_connections=None):
+        # TMDBService.__init__ is not called: it would build a second set of components
+        sync_service = sync_service or tmdb_service
+        for name in SHARED_COMPONENTS:
+            setattr(self, name, getattr(sync_service, name))
+        self._pool = sync_service.pool
+        self._sync_service = sync_service
+        self.max_connections = max_connections or getattr(settings, 'TMDB_ASYNC_MAX_CONNECTIONS', 100)
+        self._clients = weakref.WeakKeyDictionary()
+        self._async_flights = weakref.WeakKeyDictionary()
+
+    @property
+    def served_stale(self):
+        return self._sync_service.served_stale
+
+    @property
+    def client(self):
+        """httpx client bound to the running event loop"""
+        loop = asyncio.get_running_loop()
+        client = self._clients.get(loop)
+        if client is None:
+            client = httpx.AsyncClient(
+                limits=httpx.Limits(
+                    max_connections=self.max_connections,
+                    max_keepalive_connections=self.pool.pool_size,
+                ),
+                timeout=httpx.Timeout(self.pool.read_timeout, connect=self.pool.connect_timeout),
+                headers={'Accept': 'application/json'},
+            )
+            self._clients[loop] = client
+        return client
+
+    async def _make_request(self, endpoint, params=None):
+        """Make a request to TMDB API, answering from cache when possible"""
+        if not self.api_key:
+            raise ValueError("TMDB API key not configured")
+
+        key = make_cache_key(endpoint, params)
+        if self.cache is None:
+            record_dependency(key, None)
+            body = await self._coalesce(key, self._fetch_async(endpoint, params))
+            return json.loads(body) if body else None
+
+        entry = None
+        if not _bypass_cache.get():
+            # The node-local tiers are cheap; only the shared L2 needs a thread
+            entry = self.cache.lookup_local(key)
+            if entry is None:
+                entry = await sync_to_async(self.cache.lookup, thread_sensitive=False)(key)
+        if entry is not None:
+            if not entry.is_fresh:
+                self.refresher.schedule(key, self._sync_service._background_load, key, endpoint, params)
+            record_dependency(key, entry.fresh_until if entry.is_fresh else None)
+            return json.loads(entry.value)
+
+        body = await self._coalesce(key, self._refresh_async(key, endpoint, params))
+        if body is None:
+            record_dependency(key, None)
+            body = await sync_to_async(self._last_known_good, thread_sensitive=False)(key, endpoint, params)
+            if body is None:
+                return None
+            self._sync_service.served_stale += 1
+            return self._mark_stale(json.loads(body))
+        record_dependency(key, self.cache.version(key))
+        return json.loads(body)
+
+    async def _coalesce(self, key, coro):
+        """Await one shared task per key on this event loop"""
+        flights = self._async_flights.setdefault(asyncio.get_running_loop(), {})
+        task = flights.get(key)
+        if task is None:
+            task = flights[key] = asyncio.ensure_future(coro)
+            task.add_done_callback(lambda _: flights.pop(key, None))
+        else:
+            coro.close()
+            self.flights.record_coalesced()
+        return await asyncio.shield(task)
+
+    async def _refresh_async(self, key, endpoint, params=None):
+        owner = self._peer_owner(key)
+        if owner is not None:
+            entry = await sync_to_async(self.peers.fetch, thread_sensitive=False)(owner, endpoint, params)
+            if entry is not None:
+                self.cache.set_local(key, entry)
+                return entry.value
+        
+        movie_id = self._stored_movie_id(endpoint, params)
+        stored = None
+        if movie_id is not None and not (self.breaker.is_open and self.cache.lookup_expired(key)):
+            stored, is_fresh = await sync_to_async(self.movie_store.get, thread_sensitive=False)(movie_id)
+            if stored and is_fresh:
+                await sync_to_async(self.cache.set, thread_sensitive=False)(
+                    key, stored, self.cache.ttl_for(endpoint)
+                )
+                return stored
+
+        body = await self._fetch_async(endpoint, params)
+        if body:
+            await sync_to_async(self.cache.set, thread_sensitive=False)(
+                key, body, self._ttl_for(key, endpoint, body), self.cache.stale_ttl_for(endpoint)
+            )
+            self._save_last_good(key, endpoint, params, body)
+            return body
+        if stored:
+            self.cache.set_fallback(key, stored)
+        return None
+
+    async def _fetch_async(self, endpoint, params=None):
+        """Fetch raw JSON bytes from TMDB, or None on failure"""
+        lane = current_lane()
+        if not await self.dispatcher.acquire_async(lane):
+            return None
+        try:
+            return await self._fetch_with_retries_async(endpoint, params, lane)
+        finally:
+            self.dispatcher.release_async(lane)
+
+    async def _fetch_with_retries_async(self, endpoint, params, lane):
+        lane_config = self.dispatcher.config(lane)
+        family = endpoint_family(endpoint)
+        if not self.breaker.allow_request():
+            return None
+        acquire = self.rate_limiter.acquire_async
+        if not await acquire(lane_config['token_wait'], lane_config['token_reserve']):
+            self.breaker.release_probe()
+            return None
+
+        url, query = self._request_args(endpoint, params)
+        deadline = Deadline(self.request_deadline)
+        for attempt in range(self.retry_policy.attempts + 1):
+            retry_after = None
+            if attempt and not await acquire(min(lane_config['token_wait'], deadline.remaining()),
+                                             lane_config['token_reserve']):
+                break
+            # The token wait may have used up the rest of the budget
+            if not deadline.allows_attempt():
+                break
+            connect_timeout, read_timeout = self._attempt_timeout(deadline)
+            try:
+                response = await self._send_async(
+                    url, query, httpx.Timeout(read_timeout, connect=connect_timeout), family, lane
+                )
+            except httpx.HTTPError as e:
+                logger.warning(f"TMDB API Error: {e}")
+            else:
+                if response.is_success:
+                    self.breaker.record_success()
+                    return response.content
+                if not self.retry_policy.is_retryable_status(response.status_code):
+                    self.breaker.record_success()
+                    logger.warning(f"TMDB API Error: {response.status_code} for {endpoint}")
+                    return None
+                retry_after = parse_retry_after(response.headers.get('Retry-After'))
+                if response.status_code == 429:
+                    await sync_to_async(self.rate_limiter.throttled, thread_sensitive=False)(retry_after)
+                logger.warning(f"TMDB API Error: {response.status_code} for {endpoint}")
+
+            delay = self.retry_policy.backoff(attempt, retry_after)
+            if attempt == self.retry_policy.attempts or delay >= deadline.remaining():
+                break
+            self.retry_policy.record_retry()
+            await asyncio.sleep(delay)
+
+        self.retry_policy.record_exhausted()
+        self.breaker.record_failure()
+        return None
+
+    async def _timed_get_async(self, url, query, timeout, family):
+        started = asyncio.get_running_loop().time()
+        response = await self.client.get(url, params=query, timeout=timeout)
+        if response.is_success:
+            self.hedging.latency.record(family, asyncio.get_running_loop().time() - started)
+        return response
+
+    async def _send_async(self, url, query, timeout, family, lane):
+        """One upstream attempt, hedged with a second request if it runs long"""
+        delay = self.hedging.delay_for(family) if lane == INTERACTIVE else None
+        if delay is None:
+            return await self._timed_get_async(url, query, timeout, family)
+
+        self.hedging.record_request()
+        primary = asyncio.ensure_future(self._timed_get_async(url, query, timeout, family))
+        done, _ = await asyncio.wait({primary}, timeout=delay)
+        if done:
+            return primary.result()
+
+        if not await self.rate_limiter.acquire_async(0):
+            self.hedging.record_skipped()
+            return await primary
+        self.hedging.record_fired()
+        hedge = asyncio.ensure_future(self._timed_get_async(url, query, timeout, family))
+
+        pending, error = {primary, hedge}, None
+        while pending:
+            done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                if task.exception() is None:
+                    for other in pending:
+                        other.cancel()
+                    if task is hedge:
+                        self.hedging.record_won()
+                    return task.result()
+                error = error or task.exception()
+        raise error
+
+    async def aclose(self):
+        for client in list(self._clients.values()):
+            await client.aclose()
+        self._clients.clear()
+
+
+# Global instance
+async_tmdb_service = AsyncTMDBService()
@@ -4,33 +4,417 @@ Handles all communication with The Movie Database API
 """
 import requests
 from django.conf import settings
+import contextvars
 import json
+import logging
+import os
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from concurrent.futures import TimeoutError as FutureTimeoutError
+from contextlib import contextmanager
+
+from .adaptive_ttl import AdaptiveTTL
+from .cache_admin import CacheAdmin
+from .cache import TMDBResponseCache, endpoint_family, make_cache_key
+from .dispatch import INTERACTIVE, PREFETCH, PriorityDispatcher, current_lane, priority
+from .hedging import HedgePolicy
+from .http_pool import get_connection_pool
+from .mongo_store import LastKnownGoodStore, MovieStore, StoreWriter
+from .peer_cache import PeerCache
+from .rate_limit import SharedRateLimiter
+from .refresh import RefreshScheduler
+from .scroll import ScrollSnapshots
+from .resilience import MIN_ATTEMPT_SECONDS, CircuitBreaker, Deadline, RetryPolicy, parse_retry_after
+from .singleflight import SingleFlight
+from .snapshot import CacheSnapshot
+
+
+logger = logging.getLogger(__name__)
+
+_bypass_cache = contextvars.ContextVar('tmdb_bypass_cache', default=False)
+_dependencies = contextvars.ContextVar('tmdb_cache_dependencies', default=None)
+
+
+def record_dependency(key, version):
+    """Note that the current response was built from cache entry ``key`` at ``version``"""
+    dependencies = _dependencies.get()
+    if dependencies is not None:
+        dependencies.append((key, version))
 
 
 class TMDBService:
-    def __init__(self):
+    def __init__(self, pool=None, cache=None):
         self.api_key = settings.TMDB_API_KEY
         self.base_url = settings.TMDB_BASE_URL
         self.image_base_url = "https://image.tmdb.org/t/p/"
+        self._pool = pool
+        if cache is None and getattr(settings, 'TMDB_CACHE_ENABLED', True):
+            cache = TMDBResponseCache()
+        self.cache = cache
+        self.refresher = RefreshScheduler()
+        self.flights = SingleFlight()
+        self.breaker = CircuitBreaker()
+        self.retry_policy = RetryPolicy()
+        self.rate_limiter = SharedRateLimiter()
+        self.dispatcher = PriorityDispatcher()
+        self.hedging = HedgePolicy()
+        self.movie_store = MovieStore() if getattr(settings, 'TMDB_MOVIE_STORE_ENABLED', True) else None
+        self.last_good = LastKnownGoodStore() if getattr(settings, 'TMDB_LAST_KNOWN_GOOD_ENABLED', True) else None
+        self.store_writer = StoreWriter()
+        self.peers = self._build_peers()
+        self.adaptive_ttl = None
+        if self.cache is not None and getattr(settings, 'TMDB_ADAPTIVE_TTL_ENABLED', True):
+            self.adaptive_ttl = AdaptiveTTL(self.cache)
+        self.cache_admin = CacheAdmin(self.cache, self.movie_store, self.last_good) if self.cache is not None else None
+        self.scroll = ScrollSnapshots(self) if getattr(settings, 'TMDB_SCROLL_ENABLED', True) else None
+        self.snapshot = None
+        if self.cache is not None and getattr(settings, 'TMDB_CACHE_SNAPSHOT_ENABLED', True):
+            self.snapshot = CacheSnapshot(self.cache)
+        self._hedge_executor = None
+        self._hedge_lock = threading.Lock()
+        self._background_pid = None
+        self._background_lock = threading.Lock()
+        self.request_deadline = getattr(settings, 'TMDB_REQUEST_DEADLINE', 8.0)
+        self.served_stale = 0
+    
+    @staticmethod
+    def _build_peers():
+        if not getattr(settings, 'TMDB_PEER_CACHE_ENABLED', False):
+            return None
+        peers = PeerCache()
+        if not peers.configured:
+            logger.warning("Peer cache disabled: TMDB_PEER_SELF must be one of TMDB_PEER_NODES "
+                           "and TMDB_PEER_SECRET must be set")
+            return None
+        return peers
+    
+    def start_background(self, **kwargs):
+        """
+        Start the cache snapshot and cache admin threads, once per process.
+        Connected to request_started by wsgi.py and asgi.py: under gunicorn
+        --preload those modules run in the master, whose threads forked
+        workers do not inherit.
+        """
+        pid = os.getpid()
+        if self._background_pid == pid:
+            return
+        with self._background_lock:
+            if self._background_pid == pid:
+                return
+            if self.snapshot is not None:
+                self.snapshot.start()
+            if self.cache_admin is not None:
+                self.cache_admin.start()
+            self._background_pid = pid
+    
+    @property
+    def pool(self):
+        """Connection pool shared by every service instance in this process"""
+        if self._pool is None:
+            self._pool = get_connection_pool()
+        return self._pool
         
     def _make_request(self, endpoint, params=None):
-        """Make a request to TMDB API"""
+        """Make a request to TMDB API, answering from cache when possible"""
         if not self.api_key:
             raise ValueError("TMDB API key not configured")
         
+        key = make_cache_key(endpoint, params)
+        if self.cache is None:
+            record_dependency(key, None)
+            body = self.flights.do(key, self._fetch, endpoint, params)
+            return json.loads(body) if body else None
+        
+        entry = None if _bypass_cache.get() else self.cache.lookup(key)
+        if entry is not None:
+            if not entry.is_fresh:
+                # Serve the stale copy now and refresh it off the request path
+                self.refresher.schedule(key, self._background_load, key, endpoint, params)
+            record_dependency(key, entry.fresh_until if entry.is_fresh else None)
+            return json.loads(entry.value)
+        
+        body = self._load(key, endpoint, params)
+        if body is None:
+            record_dependency(key, None)
+            # Upstream failed or the circuit is open: fall back to the last good copy
+            body = self._last_known_good(key, endpoint, params)
+            if body is None:
+                return None
+            self.served_stale += 1
+            return self._mark_stale(json.loads(body))
+        record_dependency(key, self.cache.version(key))
+        return json.loads(body)
+    
+    def _load(self, key, endpoint, params=None):
+        """Refresh ``key``, coalescing with any identical request already in flight"""
+        # Interactive callers never queue behind a lower-priority leader
+        lane = current_lane()
+        flight_key = key if lane == INTERACTIVE else (key, lane)
+        return self.flights.do(flight_key, self._refresh, key, endpoint, params)
+    
+    def _background_load(self, key, endpoint, params=None):
+        with priority(PREFETCH):
+            return self._load(key, endpoint, params)
+    
+    # Usage: with tmdb_service.priority('bulk'): ...
+    priority = staticmethod(priority)
+    
+    @staticmethod
+    @contextmanager
+    def refreshing():
+        """Reload the enclosed calls from upstream and rewrite their cache entries"""
+        token = _bypass_cache.set(True)
+        try:
+            yield
+        finally:
+            _bypass_cache.reset(token)
+    
+    @staticmethod
+    @contextmanager
+    def track_dependencies():
+        """Collect (cache key, version) for every TMDB response read in the block"""
+        dependencies = []
+        token = _dependencies.set(dependencies)
+        try:
+            yield dependencies
+        finally:
+            _dependencies.reset(token)
+    
+    def _refresh(self, key, endpoint, params=None):
+        """Fetch ``endpoint`` (through the movie store for details) and cache it under ``key``"""
+        owner = self._peer_owner(key)
+        if owner is not None:
+            entry = self.peers.fetch(owner, endpoint, params)
+            if entry is not None:
+                self.cache.set_local(key, entry)
+                return entry.value
+            # Owner unreachable: load it ourselves
+        
+        movie_id = self._stored_movie_id(endpoint, params)
+        stored = None
+        # While TMDB is down and a fallback is already in memory, skip the store
+        if movie_id is not None and not (self.breaker.is_open and self.cache.lookup_expired(key)):
+            stored, is_fresh = self.movie_store.get(movie_id)
+            if stored and is_fresh:
+                self.cache.set(key, stored, self.cache.ttl_for(endpoint))
+                return stored
+        
+        body = self._fetch(endpoint, params)
+        if body:
+            self.cache.set(key, body, self._ttl_for(key, endpoint, body), self.cache.stale_ttl_for(endpoint))
+            self._save_last_good(key, endpoint, params, body)
+            return body
+        if stored:
+            # TMDB is failing: keep the outdated stored copy for _last_known_good
+            self.cache.set_fallback(key, stored)
+        return None
+    
+    def _ttl_for(self, key, endpoint, body):
+        """Fresh seconds for a body just fetched from TMDB"""
+        if self.adaptive_ttl is None:
+            return self.cache.ttl_for(endpoint)
+        return self.adaptive_ttl.ttl_for(key, endpoint, body)
+    
+    def _peer_owner(self, key):
+        """Peer node that owns ``key``, or None to load it here"""
+        # Prewarm reloads go upstream; the owner would answer from its cache
+        if self.peers is None or _bypass_cache.get():
+            return None
+        return self.peers.owner_for(key)
+    
+    def get_for_peer(self, endpoint, params=None):
+        """CacheEntry served to a peer node: our copy, else loaded here (never forwarded)"""
+        key = make_cache_key(endpoint, params)
+        with self.peers.serving():
+            entry = self.cache.lookup(key)
+            if entry is not None:
+                if not entry.is_fresh:
+                    self.refresher.schedule(key, self._background_load, key, endpoint, params)
+                return entry
+            if self._load(key, endpoint, params) is None:
+                return None
+            return self.cache.lookup(key)
+    
+    def _stored_movie_id(self, endpoint, params=None):
+        """Movie ID if ``endpoint`` is a plain details lookup kept in the movie store"""
+        if self.movie_store is None or params or endpoint_family(endpoint) != 'details':
+            return None
+        return int(endpoint.rsplit('/', 1)[1])
+    
+    def _store_movie(self, movie_id, body):
+        self.movie_store.save(movie_id, body, json.loads(body))
+    
+    def _save_last_good(self, key, endpoint, params, body):
+        """Persist a successful body off the request path"""
+        movie_id = self._stored_movie_id(endpoint, params)
+        if movie_id is not None:
+            self.store_writer.submit(('store', movie_id), self._store_movie, movie_id, body)
+        elif self.last_good is not None and self.last_good.accepts(endpoint):
+            self.store_writer.submit(('last_good', key), self.last_good.save, key, endpoint, body)
+    
+    def _last_known_good(self, key, endpoint, params=None):
+        """Body of the last successful response for ``key``, or None"""
+        expired = self.cache.lookup_expired(key)
+        if expired is not None:
+            return expired.value
+        if (self.last_good is None or self._stored_movie_id(endpoint, params) is not None
+                or not self.last_good.accepts(endpoint)):
+            return None
+        body = self.last_good.get(key)
+        if body is not None:
+            # Later requests during the outage are answered from memory
+            self.cache.set_fallback(key, body)
+        return body
+    
+    @staticmethod
+    def _mark_stale(data):
+        if isinstance(data, dict):
+            data['stale'] = True
+        return data
+    
+    def _request_args(self, endpoint, params=None):
         url = f"{self.base_url}/{endpoint}"
         default_params = {'api_key': self.api_key}
         
         if params:
             default_params.update(params)
+        return url, default_params
+    
+    def _attempt_timeout(self, deadline):
+        """(connect, read) timeout for one attempt, capped by the remaining budget (never zero)"""
+        remaining = max(deadline.remaining(), MIN_ATTEMPT_SECONDS)
+        return (min(self.pool.connect_timeout, remaining), min(self.pool.read_timeout, remaining))
+    
+    def _fetch(self, endpoint, params=None):
+        """Fetch raw JSON bytes from TMDB, or None on failure"""
+        lane = current_lane()
+        with self.dispatcher.slot(lane) as admitted:
+            if not admitted:
+                return None
+            return self._fetch_with_retries(endpoint, params, lane)
+    
+    def _fetch_with_retries(self, endpoint, params, lane):
+        lane_config = self.dispatcher.config(lane)
+        family = endpoint_family(endpoint)
+        # While the circuit is open, don't spend a store round trip or shared quota
+        if not self.breaker.allow_request():
+            return None
+        # Over the shared budget: let the caller degrade to cache instead of burning quota
+        if not self.rate_limiter.acquire(lane_config['token_wait'], lane_config['token_reserve']):
+            self.breaker.release_probe()
+            return None
+        
+        url, query = self._request_args(endpoint, params)
+        deadline = Deadline(self.request_deadline)
+        for attempt in range(self.retry_policy.attempts + 1):
+            retry_after = None
+            if attempt and not self.rate_limiter.acquire(
+                    min(lane_config['token_wait'], deadline.remaining()), lane_config['token_reserve']):
+                break
+            # The token wait may have used up the rest of the budget
+            if not deadline.allows_attempt():
+                break
+            try:
+                response = self._send(url, query, self._attempt_timeout(deadline), family, lane)
+            except requests.exceptions.RequestException as e:
+                logger.warning(f"TMDB API Error: {e}")
+            else:
+                if response.ok:
+                    self.breaker.record_success()
+                    return response.content
+                if not self.retry_policy.is_retryable_status(response.status_code):
+                    # 4xx such as 404: TMDB is healthy, the resource just doesn't exist
+                    self.breaker.record_success()
+                    logger.warning(f"TMDB API Error: {response.status_code} for {endpoint}")
+                    return None
+                retry_after = parse_retry_after(response.headers.get('Retry-After'))
+                if response.status_code == 429:
+                    self.rate_limiter.throttled(retry_after)
+                logger.warning(f"TMDB API Error: {response.status_code} for {endpoint}")
+            
+            delay = self.retry_policy.backoff(attempt, retry_after)
+            if attempt == self.retry_policy.attempts or delay >= deadline.remaining():
+                break
+            self.retry_policy.record_retry()
+            time.sleep(delay)
+        
+        self.retry_policy.record_exhausted()
+        self.breaker.record_failure()
+        return None
+    
+    @property
+    def hedge_executor(self):
+        if self._hedge_executor is None:
+            with self._hedge_lock:
+                if self._hedge_executor is None:
+                    self._hedge_executor = ThreadPoolExecutor(
+                        max_workers=2 * self.pool.pool_size,
+                        thread_name_prefix='tmdb-hedge',
+                    )
+        return self._hedge_executor
+    
+    def _timed_get(self, url, query, timeout, family):
+        started = time.monotonic()
+        response = self.pool.get(url, params=query, timeout=timeout)
+        if response.ok:
+            self.hedging.latency.record(family, time.monotonic() - started)
+        return response
+    
+    def _send(self, url, query, timeout, family, lane):
+        """One upstream attempt, hedged with a second request if it runs long"""
+        delay = self.hedging.delay_for(family) if lane == INTERACTIVE else None
+        if delay is None:
+            return self._timed_get(url, query, timeout, family)
         
+        self.hedging.record_request()
+        primary = self.hedge_executor.submit(self._timed_get, url, query, timeout, family)
         try:
-            response = requests.get(url, params=default_params)
-            response.raise_for_status()
-            return response.json()
-        except requests.exceptions.RequestException as e:
-            print(f"TMDB API Error: {e}")
-            return None
+            return primary.result(timeout=delay)
+        except FutureTimeoutError:
+            pass
+        
+        # The hedge spends quota like any other call, but never waits for it
+        if not self.rate_limiter.acquire(0):
+            self.hedging.record_skipped()
+            return primary.result()
+        self.hedging.record_fired()
+        hedge = self.hedge_executor.submit(self._timed_get, url, query, timeout, family)
+        
+        pending, error = {primary, hedge}, None
+        while pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                if future.exception() is None:
+                    if future is hedge:
+                        self.hedging.record_won()
+                    return future.result()
+                error = error or future.exception()
+        raise error
+    
+    def get_stats(self):
+        """Operational counters for the TMDB client"""
+        return {
+            'pool': self.pool.get_stats(),
+            'shared_memory': self.cache.shm.get_stats() if self.cache and self.cache.shm else None,
+            'refresh': self.refresher.get_stats(),
+            'coalescing': self.flights.get_stats(),
+            'circuit': self.breaker.get_stats(),
+            'retries': self.retry_policy.get_stats(),
+            'rate_limit': self.rate_limiter.get_stats(),
+            'lanes': self.dispatcher.get_stats(),
+            'hedging': self.hedging.get_stats(),
+            'movie_store': self.movie_store.get_stats() if self.movie_store else None,
+            'last_known_good': self.last_good.get_stats() if self.last_good else None,
+            'store_writes': self.store_writer.get_stats(),
+            'peers': self.peers.get_stats() if self.peers else None,
+            'snapshot': self.snapshot.get_stats() if self.snapshot else None,
+            'adaptive_ttl': self.adaptive_ttl.get_stats() if self.adaptive_ttl else None,
+            'scroll': self.scroll.get_stats() if self.scroll else None,
+            'first_cache_hit_ms': round(1000 * self.cache.first_hit_seconds, 1)
+            if self.cache and self.cache.first_hit_seconds is not None else None,
+            'served_stale': self.served_stale,
+        }
     
     def search_movies(self, query, page=1):
         """Search for movies"""
@@ -72,6 +456,12 @@ class TMDBService:
         """Get videos (trailers, etc.) for a movie"""
         return self._make_request(f'movie/{movie_id}/videos')
     
+    def get_movie_page(self, movie_id):
+        """Get details, credits, videos and similar movies in one call"""
+        return self._make_request(f'movie/{movie_id}', {
+            'append_to_response': 'credits,videos,similar'
+        })
+    
     def get_similar_movies(self, movie_id, page=1):
         """Get movies similar to a specific movie"""
         return self._make_request(f'movie/{movie_id}/similar', {'page': page})
@@ -1,23 +1,34 @@
+from django.conf import settings
 from django.urls import path
 from . import views
 
 
+def movie_view(view_class, async_view_name):
+    """Use the async view under ASGI (settings.MOVIES_ASYNC_VIEWS), the APIView otherwise"""
+    if getattr(settings, 'MOVIES_ASYNC_VIEWS', False):
+        from . import async_views
+        return getattr(async_views, async_view_name)
+    return view_class.as_view()
+
+
 urlpatterns = [
     # Movie search and discovery
-    path('search/', views.SearchMoviesView.as_view(), name='search_movies'),
-    path('trending/', views.TrendingMoviesView.as_view(), name='trending_movies'),
-    path('popular/', views.PopularMoviesView.as_view(), name='popular_movies'),
-    path('top-rated/', views.TopRatedMoviesView.as_view(), name='top_rated_movies'),
-    path('now-playing/', views.NowPlayingMoviesView.as_view(), name='now_playing_movies'),
-    path('upcoming/', views.UpcomingMoviesView.as_view(), name='upcoming_movies'),
+    path('search/', movie_view(views.SearchMoviesView, 'search_movies'), name='search_movies'),
+    path('trending/', movie_view(views.TrendingMoviesView, 'trending_movies'), name='trending_movies'),
+    path('popular/', movie_view(views.PopularMoviesView, 'popular_movies'), name='popular_movies'),
+    path('top-rated/', movie_view(views.TopRatedMoviesView, 'top_rated_movies'), name='top_rated_movies'),
+    path('now-playing/', movie_view(views.NowPlayingMoviesView, 'now_playing_movies'), name='now_playing_movies'),
+    path('upcoming/', movie_view(views.UpcomingMoviesView, 'upcoming_movies'), name='upcoming_movies'),
     
     # Movie details
-    path('<int:movie_id>/', views.MovieDetailView.as_view(), name='movie_detail'),
-    path('<int:movie_id>/credits/', views.MovieCreditsView.as_view(), name='movie_credits'),
-    path('<int:movie_id>/videos/', views.MovieVideosView.as_view(), name='movie_videos'),
-    path('<int:movie_id>/similar/', views.SimilarMoviesView.as_view(), name='similar_movies'),
+    path('<int:movie_id>/', movie_view(views.MovieDetailView, 'movie_detail'), name='movie_detail'),
+    path('<int:movie_id>/credits/', movie_view(views.MovieCreditsView, 'movie_credits'), name='movie_credits'),
+    path('<int:movie_id>/videos/', movie_view(views.MovieVideosView, 'movie_videos'), name='movie_videos'),
+    path('<int:movie_id>/similar/', movie_view(views.SimilarMoviesView, 'similar_movies'), name='similar_movies'),
+    # Details, credits, videos and similar movies in one response
+    path('<int:movie_id>/page/', movie_view(views.MoviePageView, 'movie_page'), name='movie_page'),
     
     # Genre endpoints
-    path('genres/', views.GenresView.as_view(), name='genres'),
-    path('genres/<int:genre_id>/', views.MoviesByGenreView.as_view(), name='movies_by_genre'),
+    path('genres/', movie_view(views.GenresView, 'genres'), name='genres'),
+    path('genres/<int:genre_id>/', movie_view(views.MoviesByGenreView, 'movies_by_genre'), name='movies_by_genre'),
 ]
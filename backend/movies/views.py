@@ -3,9 +3,25 @@ from rest_framework.response import Response
 from rest_framework.permissions import IsAuthenticated, AllowAny
 from rest_framework import status
 from django.conf import settings
+from . import fieldsets
+from .enrichment import enricher
+from .scroll import InvalidCursor
 from .tmdb_service import tmdb_service
 import requests
 
+
+def _list_page(request, method, **kwargs):
+    """A page of a TMDB list: from its scroll snapshot for ?cursor=, else ?page= (page 1 gets a cursor)"""
+    cursor = request.GET.get('cursor')
+    if cursor and tmdb_service.scroll is not None:
+        return tmdb_service.scroll.page(cursor)
+    page = request.GET.get('page', 1)
+    data = getattr(tmdb_service, method)(page=page, **kwargs)
+    if data and str(page) == '1' and tmdb_service.scroll is not None:
+        data = tmdb_service.scroll.first_page(method, kwargs, data)
+    return data
+
+
 class SearchMoviesView(APIView):
     permission_classes = [AllowAny]  # Temporarily allow all for testing
     
@@ -21,12 +37,8 @@ class SearchMoviesView(APIView):
         try:
             data = tmdb_service.search_movies(query, page)
             if data:
-                # Process the results to add full image URLs
-                for movie in data.get('results', []):
-                    movie['poster_url'] = tmdb_service.get_full_image_url(movie.get('poster_path'))
-                    movie['backdrop_url'] = tmdb_service.get_full_image_url(movie.get('backdrop_path'), 'w1280')
-                
-                return Response(data)
+                enricher.list_page(data)
+                return Response(fieldsets.select_fields(request, data))
             else:
                 return Response({'error': 'Failed to fetch data from TMDB'}, 
                               status=status.HTTP_503_SERVICE_UNAVAILABLE)
@@ -40,20 +52,17 @@ class TrendingMoviesView(APIView):
     
     def get(self, request):
         time_window = request.GET.get('time_window', 'day')  # day or week
-        page = request.GET.get('page', 1)  # Add page parameter support
         
         try:
-            data = tmdb_service.get_trending_movies(time_window, page)
+            data = _list_page(request, 'get_trending_movies', time_window=time_window)
             if data:
-                # Process the results to add full image URLs
-                for movie in data.get('results', []):
-                    movie['poster_url'] = tmdb_service.get_full_image_url(movie.get('poster_path'))
-                    movie['backdrop_url'] = tmdb_service.get_full_image_url(movie.get('backdrop_path'), 'w1280')
-                
-                return Response(data)
+                enricher.list_page(data)
+                return Response(fieldsets.select_fields(request, data))
             else:
                 return Response({'error': 'Failed to fetch trending movies'}, 
                               status=status.HTTP_503_SERVICE_UNAVAILABLE)
+        except InvalidCursor as e:
+            return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
         except Exception as e:
             return Response({'error': str(e)}, 
                           status=status.HTTP_500_INTERNAL_SERVER_ERROR)
@@ -62,20 +71,16 @@ class PopularMoviesView(APIView):
     permission_classes = [AllowAny]  # Temporarily allow all for testing
     
     def get(self, request):
-        page = request.GET.get('page', 1)
-        
         try:
-            data = tmdb_service.get_popular_movies(page)
+            data = _list_page(request, 'get_popular_movies')
             if data:
-                # Process the results to add full image URLs
-                for movie in data.get('results', []):
-                    movie['poster_url'] = tmdb_service.get_full_image_url(movie.get('poster_path'))
-                    movie['backdrop_url'] = tmdb_service.get_full_image_url(movie.get('backdrop_path'), 'w1280')
-                
-                return Response(data)
+                enricher.list_page(data)
+                return Response(fieldsets.select_fields(request, data))
             else:
                 return Response({'error': 'Failed to fetch popular movies'}, 
                               status=status.HTTP_503_SERVICE_UNAVAILABLE)
+        except InvalidCursor as e:
+            return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
         except Exception as e:
             return Response({'error': str(e)}, 
                           status=status.HTTP_500_INTERNAL_SERVER_ERROR)
@@ -84,20 +89,16 @@ class TopRatedMoviesView(APIView):
     permission_classes = [AllowAny]  # Temporarily allow all for testing
     
     def get(self, request):
-        page = request.GET.get('page', 1)
-        
         try:
-            data = tmdb_service.get_top_rated_movies(page)
+            data = _list_page(request, 'get_top_rated_movies')
             if data:
-                # Process the results to add full image URLs
-                for movie in data.get('results', []):
-                    movie['poster_url'] = tmdb_service.get_full_image_url(movie.get('poster_path'))
-                    movie['backdrop_url'] = tmdb_service.get_full_image_url(movie.get('backdrop_path'), 'w1280')
-                
-                return Response(data)
+                enricher.list_page(data)
+                return Response(fieldsets.select_fields(request, data))
             else:
                 return Response({'error': 'Failed to fetch top rated movies'}, 
                               status=status.HTTP_503_SERVICE_UNAVAILABLE)
+        except InvalidCursor as e:
+            return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
         except Exception as e:
             return Response({'error': str(e)}, 
                           status=status.HTTP_500_INTERNAL_SERVER_ERROR)
@@ -106,20 +107,16 @@ class NowPlayingMoviesView(APIView):
     permission_classes = [AllowAny]  # Temporarily allow all for testing
     
     def get(self, request):
-        page = request.GET.get('page', 1)
-        
         try:
-            data = tmdb_service.get_now_playing_movies(page)
+            data = _list_page(request, 'get_now_playing_movies')
             if data:
-                # Process the results to add full image URLs
-                for movie in data.get('results', []):
-                    movie['poster_url'] = tmdb_service.get_full_image_url(movie.get('poster_path'))
-                    movie['backdrop_url'] = tmdb_service.get_full_image_url(movie.get('backdrop_path'), 'w1280')
-                
-                return Response(data)
+                enricher.list_page(data)
+                return Response(fieldsets.select_fields(request, data))
             else:
                 return Response({'error': 'Failed to fetch now playing movies'}, 
                               status=status.HTTP_503_SERVICE_UNAVAILABLE)
+        except InvalidCursor as e:
+            return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
         except Exception as e:
             return Response({'error': str(e)}, 
                           status=status.HTTP_500_INTERNAL_SERVER_ERROR)
@@ -128,20 +125,16 @@ class UpcomingMoviesView(APIView):
     permission_classes = [AllowAny]  # Temporarily allow all for testing
     
     def get(self, request):
-        page = request.GET.get('page', 1)
-        
         try:
-            data = tmdb_service.get_upcoming_movies(page)
+            data = _list_page(request, 'get_upcoming_movies')
             if data:
-                # Process the results to add full image URLs
-                for movie in data.get('results', []):
-                    movie['poster_url'] = tmdb_service.get_full_image_url(movie.get('poster_path'))
-                    movie['backdrop_url'] = tmdb_service.get_full_image_url(movie.get('backdrop_path'), 'w1280')
-                
-                return Response(data)
+                enricher.list_page(data)
+                return Response(fieldsets.select_fields(request, data))
             else:
                 return Response({'error': 'Failed to fetch upcoming movies'}, 
                               status=status.HTTP_503_SERVICE_UNAVAILABLE)
+        except InvalidCursor as e:
+            return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
         except Exception as e:
             return Response({'error': str(e)}, 
                           status=status.HTTP_500_INTERNAL_SERVER_ERROR)
@@ -153,11 +146,8 @@ class MovieDetailView(APIView):
         try:
             data = tmdb_service.get_movie_details(movie_id)
             if data:
-                # Add full image URLs
-                data['poster_url'] = tmdb_service.get_full_image_url(data.get('poster_path'))
-                data['backdrop_url'] = tmdb_service.get_full_image_url(data.get('backdrop_path'), 'w1280')
-                
-                return Response(data)
+                enricher.details(data)
+                return Response(fieldsets.select_fields(request, data, fieldsets.DOCUMENT))
             else:
                 return Response({'error': 'Movie not found'}, 
                               status=status.HTTP_404_NOT_FOUND)
@@ -172,14 +162,8 @@ class MovieCreditsView(APIView):
         try:
             data = tmdb_service.get_movie_credits(movie_id)
             if data:
-                # Add full image URLs for cast profiles
-                for cast_member in data.get('cast', []):
-                    cast_member['profile_url'] = tmdb_service.get_full_image_url(cast_member.get('profile_path'))
-                
-                for crew_member in data.get('crew', []):
-                    crew_member['profile_url'] = tmdb_service.get_full_image_url(crew_member.get('profile_path'))
-                
-                return Response(data)
+                enricher.credits(data)
+                return Response(fieldsets.select_fields(request, data, fieldsets.CREDITS))
             else:
                 return Response({'error': 'Credits not found'}, 
                               status=status.HTTP_404_NOT_FOUND)
@@ -194,7 +178,7 @@ class MovieVideosView(APIView):
         try:
             data = tmdb_service.get_movie_videos(movie_id)
             if data:
-                return Response(data)
+                return Response(fieldsets.select_fields(request, data))
             else:
                 return Response({'error': 'Videos not found'}, 
                               status=status.HTTP_404_NOT_FOUND)
@@ -211,12 +195,8 @@ class SimilarMoviesView(APIView):
         try:
             data = tmdb_service.get_similar_movies(movie_id, page)
             if data:
-                # Process the results to add full image URLs
-                for movie in data.get('results', []):
-                    movie['poster_url'] = tmdb_service.get_full_image_url(movie.get('poster_path'))
-                    movie['backdrop_url'] = tmdb_service.get_full_image_url(movie.get('backdrop_path'), 'w1280')
-                
-                return Response(data)
+                enricher.list_page(data)
+                return Response(fieldsets.select_fields(request, data))
             else:
                 return Response({'error': 'Similar movies not found'}, 
                               status=status.HTTP_404_NOT_FOUND)
@@ -224,6 +204,22 @@ class SimilarMoviesView(APIView):
             return Response({'error': str(e)}, 
                           status=status.HTTP_500_INTERNAL_SERVER_ERROR)
 
+class MoviePageView(APIView):
+    permission_classes = [AllowAny]  # Temporarily allow all for testing
+    
+    def get(self, request, movie_id):
+        try:
+            data = tmdb_service.get_movie_page(movie_id)
+            if data:
+                enricher.movie_page(data)
+                return Response(fieldsets.select_fields(request, data, fieldsets.DOCUMENT))
+            else:
+                return Response({'error': 'Movie not found'}, 
+                              status=status.HTTP_404_NOT_FOUND)
+        except Exception as e:
+            return Response({'error': str(e)}, 
+                          status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+
 class GenresView(APIView):
     permission_classes = [AllowAny]  # Temporarily allow all for testing
     
@@ -231,7 +227,7 @@ class GenresView(APIView):
         try:
             data = tmdb_service.get_genres()
             if data:
-                return Response(data)
+                return Response(fieldsets.select_fields(request, data, fieldsets.GENRES))
             else:
                 return Response({'error': 'Failed to fetch genres'}, 
                               status=status.HTTP_503_SERVICE_UNAVAILABLE)
@@ -243,20 +239,16 @@ class MoviesByGenreView(APIView):
     permission_classes = [AllowAny]  # Temporarily allow all for testing
     
     def get(self, request, genre_id):
-        page = request.GET.get('page', 1)
-        
         try:
-            data = tmdb_service.get_movies_by_genre(genre_id, page)
+            data = _list_page(request, 'get_movies_by_genre', genre_id=genre_id)
             if data:
-                # Process the results to add full image URLs
-                for movie in data.get('results', []):
-                    movie['poster_url'] = tmdb_service.get_full_image_url(movie.get('poster_path'))
-                    movie['backdrop_url'] = tmdb_service.get_full_image_url(movie.get('backdrop_path'), 'w1280')
-                
-                return Response(data)
+                enricher.list_page(data)
+                return Response(fieldsets.select_fields(request, data))
             else:
                 return Response({'error': 'Failed to fetch movies by genre'}, 
                               status=status.HTTP_503_SERVICE_UNAVAILABLE)
+        except InvalidCursor as e:
+            return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
         except Exception as e:
             return Response({'error': str(e)}, 
                           status=status.HTTP_500_INTERNAL_SERVER_ERROR)
@@ -13,5 +13,15 @@ import os
 from django.core.asgi import get_asgi_application
 
 os.environ.setdefault("DJANGO_SETTINGS_MODULE", "movies_vault.settings")
+# Serve the movie endpoints as async views so TMDB waits don't pin threads
+os.environ.setdefault("MOVIES_ASYNC_VIEWS", "True")
 
 application = get_asgi_application()
+
+# Start each worker with the TMDB cache it had before the last restart, and
+# let the cache admin API see and purge it. Done on the worker's first
+# request, not here, so it also happens in workers forked after --preload.
+from django.core.signals import request_started  # noqa: E402
+from movies.tmdb_service import tmdb_service  # noqa: E402
+
+request_started.connect(tmdb_service.start_background, dispatch_uid='tmdb_service.start_background')
@@ -81,6 +81,9 @@ CORS_ALLOW_CREDENTIALS = True
 TMDB_API_KEY = os.getenv('TMDB_API_KEY')
 TMDB_BASE_URL = 'https://api.themoviedb.org/3'
 
+# TMDB client, caches and movie responses (see movies_vault/tmdb_settings.py)
+from .tmdb_settings import *  # noqa: E402,F401,F403
+
 # Custom User Model
 AUTH_USER_MODEL = 'authentication.User'
 
@@ -117,6 +120,7 @@ MIDDLEWARE = [
     "django.contrib.auth.middleware.AuthenticationMiddleware",
     "django.contrib.messages.middleware.MessageMiddleware",
     "django.middleware.clickjacking.XFrameOptionsMiddleware",
+    "movies.middleware.ResponseCacheMiddleware",
 ]
 
 ROOT_URLCONF = "movies_vault.urls"
@@ -151,6 +155,19 @@ mongoengine.connect(
     w='majority'
 )
 
+# Django cache shared by every worker on every node, stored in the same MongoDB
+CACHES = {
+    'default': {
+        'BACKEND': 'core.mongo_cache.MongoCache',
+        'LOCATION': os.getenv('DJANGO_CACHE_COLLECTION', 'django_cache'),
+        'TIMEOUT': 300,
+        'OPTIONS': {
+            'OPERATION_TIMEOUT': float(os.getenv('DJANGO_CACHE_OPERATION_TIMEOUT', '0.25')),
+            'RETRY_AFTER': float(os.getenv('DJANGO_CACHE_RETRY_AFTER', '10')),
+        },
+    }
+}
+
 # Django still needs a database configuration for admin and auth
 # Using persistent SQLite for Django's built-in apps only
 DATABASES = {
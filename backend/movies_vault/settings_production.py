@@ -81,6 +81,7 @@ MIDDLEWARE = [
     "django.contrib.auth.middleware.AuthenticationMiddleware",
     "django.contrib.messages.middleware.MessageMiddleware",
     "django.middleware.clickjacking.XFrameOptionsMiddleware",
+    "movies.middleware.ResponseCacheMiddleware",
 ]
 
 ROOT_URLCONF = "movies_vault.urls"
@@ -231,6 +232,9 @@ if not TMDB_API_KEY:
 
 TMDB_BASE_URL = 'https://api.themoviedb.org/3'
 
+# TMDB client, caches and movie responses (see movies_vault/tmdb_settings.py)
+from .tmdb_settings import *  # noqa: E402,F401,F403
+
 # Security Settings for Production
 # ================================
 SECURE_BROWSER_XSS_FILTER = True
@@ -267,11 +271,16 @@ LOGGING = {
     },
 }
 
-# Cache (optional - for better performance)
+# Cache shared by all workers and nodes, stored in MongoDB
 CACHES = {
     'default': {
-        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
-        'LOCATION': 'unique-snowflake',
+        'BACKEND': 'core.mongo_cache.MongoCache',
+        'LOCATION': os.getenv('DJANGO_CACHE_COLLECTION', 'django_cache'),
+        'TIMEOUT': 300,
+        'OPTIONS': {
+            'OPERATION_TIMEOUT': float(os.getenv('DJANGO_CACHE_OPERATION_TIMEOUT', '0.25')),
+            'RETRY_AFTER': float(os.getenv('DJANGO_CACHE_RETRY_AFTER', '10')),
+        },
     }
 }
 
@@ -0,0 +1,115 @@
+"""
+TMDB client, cache and movie response settings
+Shared by settings.py and settings_production.py, which star-import this
+module; every value can be overridden from the environment.
+"""
+import os
+from pathlib import Path
+
+_BASE_DIR = Path(__file__).resolve().parent.parent
+
+# TMDB HTTP client (one keep-alive pool per process)
+TMDB_HTTP_POOL_SIZE = int(os.getenv('TMDB_HTTP_POOL_SIZE', '10'))
+TMDB_HTTP_CONNECT_TIMEOUT = float(os.getenv('TMDB_HTTP_CONNECT_TIMEOUT', '3.05'))
+TMDB_HTTP_READ_TIMEOUT = float(os.getenv('TMDB_HTTP_READ_TIMEOUT', '10'))
+
+# TMDB failure handling: retries, total time budget per request, circuit breaker
+TMDB_RETRY_ATTEMPTS = int(os.getenv('TMDB_RETRY_ATTEMPTS', '2'))
+TMDB_RETRY_BACKOFF_BASE = float(os.getenv('TMDB_RETRY_BACKOFF_BASE', '0.2'))
+TMDB_RETRY_BACKOFF_MAX = float(os.getenv('TMDB_RETRY_BACKOFF_MAX', '2.0'))
+TMDB_REQUEST_DEADLINE = float(os.getenv('TMDB_REQUEST_DEADLINE', '8.0'))
+TMDB_CIRCUIT_FAILURE_THRESHOLD = int(os.getenv('TMDB_CIRCUIT_FAILURE_THRESHOLD', '5'))
+TMDB_CIRCUIT_RECOVERY_TIMEOUT = float(os.getenv('TMDB_CIRCUIT_RECOVERY_TIMEOUT', '30'))
+
+# TMDB quota shared by every worker through a token bucket in MongoDB
+TMDB_RATE_LIMIT_PER_SECOND = float(os.getenv('TMDB_RATE_LIMIT_PER_SECOND', '35'))
+TMDB_RATE_LIMIT_BURST = float(os.getenv('TMDB_RATE_LIMIT_BURST', '40'))
+TMDB_RATE_LIMIT_MAX_WAIT = float(os.getenv('TMDB_RATE_LIMIT_MAX_WAIT', '0.5'))
+TMDB_RATE_LIMIT_STORE_TIMEOUT = float(os.getenv('TMDB_RATE_LIMIT_STORE_TIMEOUT', '0.25'))
+# Per-lane overrides for interactive / prefetch / bulk TMDB calls, e.g. {'bulk': {'cap': 1}}
+TMDB_PRIORITY_LANES = {}
+
+# Hedged requests: resend an interactive GET that is slower than this
+# percentile of recent latency for its endpoint family
+TMDB_HEDGE_ENABLED = os.getenv('TMDB_HEDGE_ENABLED', 'False').lower() == 'true'
+TMDB_HEDGE_PERCENTILE = float(os.getenv('TMDB_HEDGE_PERCENTILE', '95'))
+TMDB_HEDGE_MIN_SAMPLES = int(os.getenv('TMDB_HEDGE_MIN_SAMPLES', '20'))
+TMDB_HEDGE_MIN_DELAY = float(os.getenv('TMDB_HEDGE_MIN_DELAY', '0.05'))
+
+# MongoDB tiers behind the response cache (short timeouts, back off after errors)
+TMDB_STORE_TIMEOUT = float(os.getenv('TMDB_STORE_TIMEOUT', '0.25'))
+TMDB_STORE_BACKOFF = float(os.getenv('TMDB_STORE_BACKOFF', '30'))
+# Durable writes queue on their own thread; a newer body for a key replaces the pending one
+TMDB_STORE_WRITE_MAX_PENDING = int(os.getenv('TMDB_STORE_WRITE_MAX_PENDING', '500'))
+TMDB_MOVIE_STORE_ENABLED = os.getenv('TMDB_MOVIE_STORE_ENABLED', 'True').lower() == 'true'
+TMDB_MOVIE_STORE_REFRESH_AFTER = int(os.getenv('TMDB_MOVIE_STORE_REFRESH_AFTER', str(24 * 60 * 60)))
+# Durable copy of the last good response per key, served with "stale": true when TMDB is down
+TMDB_LAST_KNOWN_GOOD_ENABLED = os.getenv('TMDB_LAST_KNOWN_GOOD_ENABLED', 'True').lower() == 'true'
+
+# Peer cache: each cache key is owned by one node (consistent hashing); the
+# others fetch it from the owner's /api/core/peer-cache/ instead of from TMDB
+TMDB_PEER_CACHE_ENABLED = os.getenv('TMDB_PEER_CACHE_ENABLED', 'False').lower() == 'true'
+TMDB_PEER_NODES = [node for node in os.getenv('TMDB_PEER_NODES', '').split(',') if node]  # base URLs
+TMDB_PEER_SELF = os.getenv('TMDB_PEER_SELF', '')  # this node's entry in TMDB_PEER_NODES
+TMDB_PEER_SECRET = os.getenv('TMDB_PEER_SECRET', '')
+TMDB_PEER_TIMEOUT = (float(os.getenv('TMDB_PEER_CONNECT_TIMEOUT', '0.2')),
+                     float(os.getenv('TMDB_PEER_READ_TIMEOUT', '2.0')))
+TMDB_PEER_REPLICA_TTL = int(os.getenv('TMDB_PEER_REPLICA_TTL', '30'))
+TMDB_PEER_RETRY_AFTER = int(os.getenv('TMDB_PEER_RETRY_AFTER', '10'))
+TMDB_PEER_VNODES = 100
+
+# TMDB response cache: in-process LRU (L1) in front of the Django cache (L2)
+TMDB_CACHE_ENABLED = os.getenv('TMDB_CACHE_ENABLED', 'True').lower() == 'true'
+TMDB_CACHE_L1_MAX_ENTRIES = int(os.getenv('TMDB_CACHE_L1_MAX_ENTRIES', '2048'))
+# Node-local tier in an mmap'd file shared by all workers on the host (Linux/macOS)
+TMDB_SHM_CACHE_ENABLED = os.getenv('TMDB_SHM_CACHE_ENABLED', 'True').lower() == 'true'
+TMDB_SHM_CACHE_PATH = os.getenv('TMDB_SHM_CACHE_PATH', '')  # default: /dev/shm/movies_vault_tmdb_cache
+TMDB_SHM_CACHE_SIZE_MB = int(os.getenv('TMDB_SHM_CACHE_SIZE_MB', '64'))
+TMDB_SHM_CACHE_SLOTS = int(os.getenv('TMDB_SHM_CACHE_SLOTS', '16384'))
+# Node-local cache entries saved at intervals and on shutdown, restored at startup
+TMDB_CACHE_SNAPSHOT_ENABLED = os.getenv('TMDB_CACHE_SNAPSHOT_ENABLED', 'True').lower() == 'true'
+TMDB_CACHE_SNAPSHOT_PATH = os.getenv('TMDB_CACHE_SNAPSHOT_PATH', str(_BASE_DIR / 'tmdb_cache.snapshot'))
+TMDB_CACHE_SNAPSHOT_INTERVAL = int(os.getenv('TMDB_CACHE_SNAPSHOT_INTERVAL', '300'))
+TMDB_CACHE_SNAPSHOT_MAX_ENTRIES = int(os.getenv('TMDB_CACHE_SNAPSHOT_MAX_ENTRIES', '5000'))
+TMDB_CACHE_ALIAS = 'default'
+# How often each worker publishes its cache stats and replays purges (/api/core/tmdb-cache/)
+TMDB_CACHE_ADMIN_INTERVAL = int(os.getenv('TMDB_CACHE_ADMIN_INTERVAL', '10'))
+# Per-family TTL overrides in seconds, e.g. {'trending': 300}
+TMDB_CACHE_TTLS = {}
+# Stale-while-revalidate grace per family in seconds, e.g. {'trending': 3600}
+TMDB_CACHE_STALE_TTLS = {}
+# Stretch or shrink each key's TTL by whether its content changed between refreshes,
+# within per-family bounds (see movies/adaptive_ttl.py), e.g. {'trending': (300, 1800)}
+TMDB_ADAPTIVE_TTL_ENABLED = os.getenv('TMDB_ADAPTIVE_TTL_ENABLED', 'True').lower() == 'true'
+TMDB_ADAPTIVE_TTL_BOUNDS = {}
+TMDB_REFRESH_WORKERS = int(os.getenv('TMDB_REFRESH_WORKERS', '2'))
+TMDB_REFRESH_MAX_PENDING = int(os.getenv('TMDB_REFRESH_MAX_PENDING', '100'))
+# Overrides for the lists reloaded by `manage.py prewarm_tmdb` (see
+# movies/prewarm.py), e.g. {'trending': {'interval': 120}, 'genre_movies': None}
+TMDB_PREWARM_TARGETS = {}
+# Invalidate changed movies from TMDB's movie/changes feed (python manage.py sync_tmdb_changes).
+# Only enable it with that job running: details, credits and videos are then cached for days.
+TMDB_CHANGE_FEED_ENABLED = os.getenv('TMDB_CHANGE_FEED_ENABLED', 'False').lower() == 'true'
+TMDB_CHANGE_FEED_INTERVAL = int(os.getenv('TMDB_CHANGE_FEED_INTERVAL', '600'))
+TMDB_CHANGE_FEED_TTL = int(os.getenv('TMDB_CHANGE_FEED_TTL', str(3 * 24 * 60 * 60)))
+TMDB_CHANGE_FEED_REFRESH = True  # Reload changed entries held on this node; otherwise only drop them
+TMDB_CHANGE_FEED_MAX_PAGES = 50
+# Page 1 of list endpoints returns a cursor; later pages come from a snapshot of the ranking
+TMDB_SCROLL_ENABLED = os.getenv('TMDB_SCROLL_ENABLED', 'True').lower() == 'true'
+TMDB_SCROLL_SNAPSHOT_TTL = int(os.getenv('TMDB_SCROLL_SNAPSHOT_TTL', '1800'))
+TMDB_SCROLL_PREFETCH_PAGES = 2
+# Expired snapshot pages reloaded on the request path; past this a page is loaded without de-duplication
+TMDB_SCROLL_MAX_BACKFILL = int(os.getenv('TMDB_SCROLL_MAX_BACKFILL', '3'))
+
+# Async movie views (enabled by movies_vault/asgi.py); their httpx pool size also caps
+# concurrent async upstream calls, separately from TMDB_HTTP_POOL_SIZE
+MOVIES_ASYNC_VIEWS = os.getenv('MOVIES_ASYNC_VIEWS', 'False').lower() == 'true'
+TMDB_ASYNC_MAX_CONNECTIONS = int(os.getenv('TMDB_ASYNC_MAX_CONNECTIONS', '100'))
+
+# Rendered responses (plain, gzip, br) of anonymous GETs, per process; see movies/middleware.py
+MOVIES_RESPONSE_CACHE_ENABLED = os.getenv('MOVIES_RESPONSE_CACHE_ENABLED', 'True').lower() == 'true'
+MOVIES_RESPONSE_CACHE_MAX_ENTRIES = int(os.getenv('MOVIES_RESPONSE_CACHE_MAX_ENTRIES', '512'))
+MOVIES_RESPONSE_CACHE_MAX_AGE = int(os.getenv('MOVIES_RESPONSE_CACHE_MAX_AGE', '3600'))
+MOVIES_RESPONSE_CACHE_PREFIXES = ['/api/movies/']
+# Cache-Control max-age of cached movie responses for browsers and CDNs (capped by TMDB freshness)
+MOVIES_HTTP_MAX_AGE = int(os.getenv('MOVIES_HTTP_MAX_AGE', '60'))